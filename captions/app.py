@@ -1,3 +1,4 @@
+import sys
 import json
 import re
 import base64
@@ -7,6 +8,8 @@ import requests
 from pathlib import Path
 
 from openai_service import OpenAIService
+sys.path.append(str(Path(__file__).resolve().parents[1]))  # repository root with the shared package
+from shared.tokenizer_registry import preload
 from prompts import (
     extract_image_context_system_message,
     refine_description_system_message,
@@ -24,6 +27,7 @@ class Image:
         self.name = name
 
 openai_service = OpenAIService()
+preload()
 
 async def extract_images(article: str) -> List[Image]:
     image_regex = r'!\[([^\]]*)\]\(([^)]+)\)'
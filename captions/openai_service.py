@@ -1,26 +1,33 @@
+import sys
+from pathlib import Path
 from openai import OpenAI
 from typing import List, Dict, Any
 import tiktoken
+sys.path.append(str(Path(__file__).resolve().parents[1]))  # repository root with the shared package
+from shared.tokenizer_registry import get_tokenizer
 
 class OpenAIService:
     def __init__(self):
         self.client = OpenAI()
-        self.tokenizers: Dict[str, tiktoken.Encoding] = {}
         self.IM_START = "<|im_start|>"
         self.IM_END = "<|im_end|>"
         self.IM_SEP = "<|im_sep|>"
     
     def _get_tokenizer(self, model_name: str) -> tiktoken.Encoding:
-        if model_name not in self.tokenizers:
-            try:
-                encoding = tiktoken.encoding_for_model(model_name)
-            except KeyError:
-                encoding = tiktoken.get_encoding("cl100k_base")
-            self.tokenizers[model_name] = encoding
-        return self.tokenizers[model_name]
+        return get_tokenizer(model_name)
     
     def count_tokens(self, messages: List[Dict[str, Any]], model: str = 'gpt-4o') -> int:
         tokenizer = self._get_tokenizer(model)
+        formatted_content = self._format_messages(messages)
+        tokens = tokenizer.encode(formatted_content)
+        return len(tokens)
+    
+    def count_tokens_batch(self, message_lists: List[List[Dict[str, Any]]], model: str = 'gpt-4o') -> List[int]:
+        tokenizer = self._get_tokenizer(model)
+        encoded = tokenizer.encode_batch([self._format_messages(messages) for messages in message_lists])
+        return [len(tokens) for tokens in encoded]
+    
+    def _format_messages(self, messages: List[Dict[str, Any]]) -> str:
         formatted_content = ''
         
         for message in messages:
@@ -36,8 +43,7 @@ class OpenAIService:
             formatted_content += f"{self.IM_START}{message['role']}{self.IM_SEP}{content}{self.IM_END}"
         
         formatted_content += f"{self.IM_START}assistant{self.IM_SEP}"
-        tokens = tokenizer.encode(formatted_content)
-        return len(tokens)
+        return formatted_content
     
     def completion(
         self,
@@ -1,7 +1,11 @@
+import sys
+from pathlib import Path
 from flask import Flask, request, jsonify
 import json
 import os
 from openai_service import OpenAIService
+sys.path.append(str(Path(__file__).resolve().parents[1]))  # repository root with the shared package
+from shared.tokenizer_registry import preload
 from prompts import verification_prompt
 from dotenv import load_dotenv
 
@@ -13,6 +17,7 @@ app = Flask(__name__)
 port = 3000
 
 openai_service = OpenAIService(api_key=os.getenv('OPENAI_API_KEY'))
+preload()
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
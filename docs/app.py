@@ -1,48 +1,69 @@
+import sys
+from pathlib import Path
 import os
 import asyncio
 from file_service import FileService
 from text_service import TextService
 from openai_service import OpenAIService
 from vector_service import VectorService
+from local_vector_service import LocalVectorService
 from search_service import SearchService
 from database_service import DatabaseService
 from document_service import DocumentService
+from dedup_service import ChunkDeduplicator
+sys.path.append(str(Path(__file__).resolve().parents[1]))  # repository root with the shared package
+from shared.tokenizer_registry import preload
 
 from dotenv import load_dotenv
 load_dotenv()
 
 async def main():
+    preload()
     file_service = FileService()
     text_service = TextService()
     openai_service = OpenAIService()
-    vector_service = VectorService(openai_service)
+    # VECTOR_BACKEND=local keeps vectors in an embedded index instead of Qdrant
+    vector_service = LocalVectorService(openai_service) if os.getenv('VECTOR_BACKEND') == 'local' else VectorService(openai_service)
     search_service = SearchService(
         os.getenv('ALGOLIA_APP_ID', ''),
         os.getenv('ALGOLIA_API_KEY', '')
     )
     database_service = DatabaseService('docs/database.db', search_service, vector_service)
+    database_service.start_sync()
     document_service = DocumentService(openai_service, database_service, text_service)
 
-    # Process file from URL
-    url = 'https://cloud.overment.com/S04E03-1732688101.md'
-    docs_result = await file_service.process(url, 2500)
-    docs = docs_result['docs']
+    try:
+        # Process file from URL
+        url = 'https://cloud.overment.com/S04E03-1732688101.md'
+        docs_result = await file_service.process(url, 2500)
+        docs = docs_result['docs']
 
-    # Insert documents into the database
-    for doc in docs:
-        await database_service.insert_document(doc, True)
+        # Link near-duplicate chunks (repeated footers, navigation) to their first copy
+        docs, _ = ChunkDeduplicator().deduplicate(docs)
 
-    # Translate documents
-    translated_docs = await document_service.translate(docs, 'Polish', 'English')
-    merged_translation = '\n'.join(
-        text_service.restore_placeholders(doc).text.strip() for doc in translated_docs
-    )
+        # Insert documents into the database, duplicates are stored without being embedded or indexed
+        await database_service.insert_documents([doc for doc in docs if 'duplicate_of' not in doc.metadata], True)
+        await database_service.insert_documents([doc for doc in docs if 'duplicate_of' in doc.metadata])
+
+        # Translate documents
+        translated_docs = await document_service.translate(docs, 'Polish', 'English')
+        merged_translation = '\n'.join(
+            doc.text.strip() for doc in text_service.restore_many(translated_docs)
+        )
+
+        # Save translation result to result.md
+        result_path = os.path.join(os.path.dirname(__file__), 'result.md')
+        with open(result_path, 'w', encoding='utf-8') as f:
+            f.write(merged_translation)
+        print(f'Translation saved to {result_path}')
 
-    # Save translation result to result.md
-    result_path = os.path.join(os.path.dirname(__file__), 'result.md')
-    with open(result_path, 'w', encoding='utf-8') as f:
-        f.write(merged_translation)
-    print(f'Translation saved to {result_path}')
+        # Sync what is left in the outbox before exiting
+        await database_service.stop_sync()
+    finally:
+        # Stop the tokenize threads of every TextService the app created
+        text_service.close()
+        file_service.close()
+        openai_service.close()
 
 if __name__ == '__main__':
     asyncio.run(main())
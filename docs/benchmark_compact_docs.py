@@ -0,0 +1,67 @@
+import gc
+import json
+import random
+import tracemalloc
+from typing import Any, Callable, Dict, List
+from text_service import IDoc
+from compact_doc import DocInterner
+
+CHUNKS = 100_000
+SOURCES = 500
+
+def synthetic_rows(count: int = CHUNKS, sources: int = SOURCES) -> List[Dict[str, str]]:
+    # Rows shaped like the documents table: every source is split into chunks that repeat its metadata
+    rng = random.Random(0)
+    per_source = count // sources
+    rows = []
+    for source_index in range(sources):
+        source = {
+            'source': f'https://example.com/articles/{source_index}.md',
+            'mimeType': 'text/markdown',
+            'name': f'article-{source_index}.md',
+            'source_uuid': f'{source_index:08x}-0000-4000-8000-000000000000',
+            'conversation_uuid': 'c0ffee00-0000-4000-8000-000000000000',
+            'total_chunks': per_source
+        }
+        for chunk_index in range(per_source):
+            section = chunk_index // 10
+            metadata = {
+                'tokens': rng.randint(150, 250),
+                'headers': {'h1': [f'Article {source_index}'], 'h2': [f'Section {section}']},
+                'urls': [],
+                'images': [],
+                **source,
+                'uuid': f'{source_index:08x}-{chunk_index:04x}-4000-8000-000000000000',
+                'chunk_index': chunk_index
+            }
+            rows.append({'text': f'Chunk {chunk_index} of article {source_index}. ' * 8, 'metadata': json.dumps(metadata)})
+    return rows
+
+def measure(build: Callable[[List[Dict[str, str]]], List[Any]], rows: List[Dict[str, str]]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    docs = build(rows)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del docs
+    return size
+
+def build_idocs(rows: List[Dict[str, str]]) -> List[IDoc]:
+    return [IDoc(text=row['text'], metadata=json.loads(row['metadata'])) for row in rows]
+
+def build_compact(rows: List[Dict[str, str]]) -> List[Any]:
+    interner = DocInterner()
+    return [interner.compact(row['text'], json.loads(row['metadata'])) for row in rows]
+
+if __name__ == "__main__":
+    rows = synthetic_rows()
+    # The chunk texts are the same strings in both variants and are not counted
+    idoc_bytes = measure(build_idocs, rows)
+    compact_bytes = measure(build_compact, rows)
+    print(json.dumps({
+        'chunks': len(rows),
+        'sources': SOURCES,
+        'idoc_mb': round(idoc_bytes / 2**20, 1),
+        'compact_mb': round(compact_bytes / 2**20, 1),
+        'saved': round(1 - compact_bytes / idoc_bytes, 3)
+    }))
@@ -0,0 +1,38 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import tempfile
+from text_service import IDoc
+from database_service import DatabaseService
+
+# Compares the per-document get_document_by_uuid loop DocumentService.answer used to run
+# with one get_existing_uuids call, half of the looked up documents exist in the database
+SIZES = [1000, 10000]
+
+async def measure(size: int, directory: str) -> dict:
+    database_service = DatabaseService(os.path.join(directory, f'existing_{size}.db'))
+    docs = [IDoc(text=f'chunk {index}', metadata={'uuid': str(uuid.uuid4()), 'source_uuid': 'benchmark'}) for index in range(size)]
+    await database_service.insert_documents(docs[::2])
+    uuids = [doc.metadata['uuid'] for doc in docs]
+
+    start = time.perf_counter()
+    missing = [document_uuid for document_uuid in uuids if not await database_service.get_document_by_uuid(document_uuid)]
+    per_document = time.perf_counter() - start
+
+    start = time.perf_counter()
+    existing = await database_service.get_existing_uuids(uuids)
+    bulk = time.perf_counter() - start
+
+    assert len(missing) == size - len(existing)
+    database_service.db.close()
+    return {'documents': size, 'per_document_seconds': round(per_document, 4), 'bulk_seconds': round(bulk, 4), 'speedup': round(per_document / bulk, 1)}
+
+async def main():
+    with tempfile.TemporaryDirectory() as directory:
+        for size in SIZES:
+            print(json.dumps(await measure(size, directory)))
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from pathlib import Path
+from typing import Any, Optional, Union
+
+CHUNK_CACHE_PATH = os.getenv('CHUNK_CACHE_PATH', os.path.join(os.path.dirname(__file__), 'storage', 'chunk_cache.db'))
+CHUNK_CACHE_MAX_BYTES = int(os.getenv('CHUNK_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class ChunkCache:
+    # Persistent cache of split/document results keyed by the content hash of the text,
+    # least recently used entries are evicted once the stored JSON exceeds max_bytes
+    def __init__(self, db_path: str = CHUNK_CACHE_PATH, max_bytes: int = CHUNK_CACHE_MAX_BYTES):
+        self.absolute_path = Path(db_path).resolve()
+        self.absolute_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self.conn = sqlite3.connect(str(self.absolute_path))
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS chunk_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS chunk_cache_last_used ON chunk_cache(last_used)')
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(text: str, kind: str, model: str, version: str, limit: Union[int, str] = '') -> str:
+        return f"{kind}:{version}:{model}:{limit}:{content_hash(text)}"
+
+    def get(self, key: str) -> Optional[Any]:
+        row = self.conn.execute('SELECT value FROM chunk_cache WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.conn.execute('UPDATE chunk_cache SET last_used = ? WHERE key = ?', (time.time(), key))
+        self.conn.commit()
+        return json.loads(row[0])
+
+    def __contains__(self, key: str) -> bool:
+        # Membership test without touching the hit/miss counters or the LRU order
+        return self.conn.execute('SELECT 1 FROM chunk_cache WHERE key = ?', (key,)).fetchone() is not None
+
+    def put(self, key: str, value: Any) -> None:
+        data = json.dumps(value, ensure_ascii=False)
+        size = len(data.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+
+        self.conn.execute(
+            'INSERT OR REPLACE INTO chunk_cache (key, value, size, last_used) VALUES (?, ?, ?, ?)',
+            (key, data, size, time.time())
+        )
+        self._evict()
+        self.conn.commit()
+
+    def _evict(self) -> None:
+        total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM chunk_cache').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        expired = []
+        for key, size in self.conn.execute('SELECT key, size FROM chunk_cache ORDER BY last_used'):
+            if total <= self.max_bytes:
+                break
+            expired.append((key,))
+            total -= size
+        self.conn.executemany('DELETE FROM chunk_cache WHERE key = ?', expired)
+
+    def clear(self) -> None:
+        self.conn.execute('DELETE FROM chunk_cache')
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,205 @@
+import sys
+import json
+from types import MappingProxyType
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+from text_service import IDoc
+
+# Metadata describing the source a chunk was cut from, identical for every chunk of that source
+SOURCE_METADATA_KEYS = frozenset({
+    'source', 'mimeType', 'mime_type', 'name', 'source_uuid', 'conversation_uuid',
+    'duration', 'screenshots', 'total_chunks'
+})
+
+_DELETED = object()
+
+def _freeze(value: Any) -> Any:
+    # Hashable form of a JSON value, used to find metadata that was already interned
+    if isinstance(value, (dict, MappingProxyType)):
+        return tuple((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+def _thaw(value: Any) -> Any:
+    # Plain dict/list copy of an interned read-only value, the form an IDoc built from JSON has
+    if isinstance(value, MappingProxyType):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+def metadata_to_dict(metadata: Mapping[str, Any]) -> Dict[str, Any]:
+    # Metadata of an IDoc, CompactDoc or LazyDoc as a plain dict, ready for json.dumps
+    return metadata.to_dict() if isinstance(metadata, ChunkMetadata) else metadata
+
+class ChunkMetadata(MutableMapping):
+    # Dict-style metadata of a chunk: its own fields on top of the source-level metadata shared
+    # by all chunks of the source. Writes and deletes only touch the chunk's own fields.
+    # Shared lists and dicts are stored read-only, reading one gives the chunk its own plain copy.
+    __slots__ = ('shared', 'fields')
+
+    def __init__(self, shared: Mapping[str, Any], fields: Dict[str, Any]):
+        self.shared = shared
+        self.fields = fields
+
+    def _raw(self, key: str) -> Any:
+        if key in self.fields:
+            value = self.fields[key]
+            if value is _DELETED:
+                raise KeyError(key)
+            return value
+        return self.shared[key]
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._raw(key)
+        if isinstance(value, (MappingProxyType, tuple)):
+            value = _thaw(value)
+            self.fields[key] = value
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.fields[sys.intern(key)] = value
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self:
+            raise KeyError(key)
+        if key in self.shared:
+            self.fields[key] = _DELETED
+        else:
+            del self.fields[key]
+
+    def __contains__(self, key: object) -> bool:
+        if key in self.fields:
+            return self.fields[key] is not _DELETED
+        return key in self.shared
+
+    def __iter__(self) -> Iterator[str]:
+        for key, value in self.fields.items():
+            if value is not _DELETED:
+                yield key
+        for key in self.shared:
+            if key not in self.fields:
+                yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return repr(self.to_dict())
+
+    def copy(self) -> Dict[str, Any]:
+        return self.to_dict()
+
+    def to_dict(self) -> Dict[str, Any]:
+        # Plain dict with the same values as an IDoc built from JSON, ready for json.dumps
+        return {key: _thaw(self._raw(key)) for key in self}
+
+class CompactDoc:
+    # Slotted counterpart of IDoc for large chunk sets, supports doc.text / doc['text'] and the same for metadata
+    __slots__ = ('text', 'metadata')
+
+    def __init__(self, text: str, metadata: ChunkMetadata):
+        self.text = text
+        self.metadata = metadata
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, (CompactDoc, IDoc)):
+            return NotImplemented
+        other_metadata = other.metadata.to_dict() if isinstance(other, CompactDoc) else other.metadata
+        return self.text == other.text and self.metadata.to_dict() == other_metadata
+
+    def __repr__(self) -> str:
+        return f"CompactDoc(text={self.text!r}, metadata={self.metadata!r})"
+
+    def to_idoc(self) -> IDoc:
+        return IDoc(text=self.text, metadata=self.metadata.to_dict())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'text': self.text, 'metadata': self.metadata.to_dict()}
+
+class LazyDoc:
+    # Row as read by DatabaseService.iter_documents: the metadata JSON is only parsed on first access,
+    # so jobs that need the text alone never decode it. uuid is the documents.uuid column.
+    __slots__ = ('text', 'raw_metadata', 'uuid', '_metadata')
+
+    def __init__(self, text: str, raw_metadata: str, uuid: Optional[str] = None):
+        self.text = text
+        self.raw_metadata = raw_metadata
+        self.uuid = uuid
+        self._metadata = None
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        if self._metadata is None:
+            self._metadata = json.loads(self.raw_metadata)
+        return self._metadata
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in ('text', 'metadata'):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __repr__(self) -> str:
+        return f"LazyDoc(text={self.text!r}, metadata={self.raw_metadata})"
+
+    def to_idoc(self) -> IDoc:
+        return IDoc(text=self.text, metadata=self.metadata)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'text': self.text, 'metadata': self.metadata}
+
+class DocInterner:
+    # Builds CompactDocs that share one read-only copy of every distinct source-level metadata
+    # and headers dict, with interned keys and repeated string values. Lists and dicts in the
+    # shared copies become tuples and MappingProxyTypes, so no chunk can change them for its siblings.
+    def __init__(self):
+        self.sources: Dict[Tuple, Mapping[str, Any]] = {}
+        self.headers: Dict[Tuple, Mapping[str, Any]] = {}
+
+    def _intern_value(self, value: Any) -> Any:
+        if isinstance(value, str):
+            return sys.intern(value)
+        if isinstance(value, list):
+            return tuple(self._intern_value(item) for item in value)
+        if isinstance(value, dict):
+            return MappingProxyType({sys.intern(key): self._intern_value(item) for key, item in value.items()})
+        return value
+
+    def _intern_headers(self, headers: Dict[str, List[str]]) -> Mapping[str, Any]:
+        key = _freeze(headers)
+        shared = self.headers.get(key)
+        if shared is None:
+            shared = self._intern_value(headers)
+            self.headers[key] = shared
+        return shared
+
+    def compact(self, text: str, metadata: Dict[str, Any]) -> CompactDoc:
+        source = {}
+        fields = {}
+        for key, value in metadata.items():
+            key = sys.intern(key)
+            if key in SOURCE_METADATA_KEYS:
+                source[key] = self._intern_value(value)
+            elif key == 'headers' and isinstance(value, dict):
+                fields[key] = self._intern_headers(value)
+            else:
+                fields[key] = value
+
+        source_key = _freeze(source)
+        shared = self.sources.get(source_key)
+        if shared is None:
+            shared = MappingProxyType(source)
+            self.sources[source_key] = shared
+        return CompactDoc(text, ChunkMetadata(shared, fields))
+
+    def compact_doc(self, doc: IDoc) -> CompactDoc:
+        return self.compact(doc.text, doc.metadata)
+
+    def compact_many(self, docs: List[IDoc]) -> List[CompactDoc]:
+        return [self.compact(doc.text, doc.metadata) for doc in docs]
@@ -0,0 +1,20 @@
+import pytest
+from sqlite_pool import AsyncSQLite
+from schema_migrations import migrate
+
+@pytest.fixture
+def db(tmp_path):
+    # Temporary database with the base documents table and every schema migration applied
+    database = AsyncSQLite(str(tmp_path / 'documents.db'), readers=2)
+    database.write_sync(lambda conn: conn.execute('''
+        CREATE TABLE documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            uuid TEXT UNIQUE,
+            source_uuid TEXT,
+            text TEXT,
+            metadata TEXT
+        )
+    '''))
+    database.write_sync(migrate)
+    yield database
+    database.close()
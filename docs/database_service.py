@@ -1,28 +1,52 @@
 import os
 import json
-import sqlite3
-from typing import List, Dict, Any, Optional, Union
+import asyncio
+from typing import List, Dict, Any, AsyncIterator, Iterable, Optional, Set, Tuple, Union
 from pathlib import Path
 from search_service import SearchService
 from vector_service import VectorService
 from text_service import IDoc
+from compact_doc import CompactDoc, DocInterner, LazyDoc, metadata_to_dict
+from sqlite_pool import AsyncSQLite, SQLITE_MAX_VARIABLES
+from schema_migrations import migrate, build_filters
+from sync_outbox import OutboxWorker, enqueue, UPSERT, DELETE
+from embedding_store import EmbeddingStore
+from fulltext_backend import FullTextBackend, FTS5Backend
+
+# Full-text side of hybrid_search: 'algolia' (the search service) or 'fts5' (local documents_search table)
+FULLTEXT_BACKEND = os.getenv('FULLTEXT_BACKEND', 'algolia')
+# Rows read per query by iter_documents
+DOCUMENT_PAGE_SIZE = int(os.getenv('DOCUMENT_PAGE_SIZE', '1000'))
+# Searches in flight at once across all legs of hybrid_search_many
+HYBRID_SEARCH_CONCURRENCY = int(os.getenv('HYBRID_SEARCH_CONCURRENCY', '8'))
 
 class DatabaseService:
     def __init__(
         self,
         db_path: str = 'hybrid/database.db',
         search_service: SearchService = None,
-        vector_service: VectorService = None
+        vector_service: VectorService = None,
+        fulltext_backend: Optional[FullTextBackend] = None
     ):
         self.absolute_path = Path(db_path).resolve()
         print(f"Using database at: {self.absolute_path}")
 
         self.db_exists = self.absolute_path.exists()
-        self.conn = sqlite3.connect(str(self.absolute_path))
-        self.conn.row_factory = sqlite3.Row
+        self.db = AsyncSQLite(str(self.absolute_path))
 
         self.search_service = search_service
         self.vector_service = vector_service
+        if fulltext_backend is None:
+            fulltext_backend = search_service if FULLTEXT_BACKEND == 'algolia' and search_service else FTS5Backend(self.db)
+        self.fulltext_backend = fulltext_backend
+
+        # Embeddings are stored next to the documents and reused while the text is unchanged
+        self.embedding_store = EmbeddingStore(self.db, vector_service.openai_service) if vector_service else None
+
+        # Document changes are synced to Algolia and Qdrant through the outbox, see start_sync
+        self.syncs_remote = bool(search_service and vector_service)
+        self.outbox_worker = OutboxWorker(self.db, search_service, vector_service, self.embedding_store) if self.syncs_remote else None
+        self.warned_not_syncing = False
 
         if not self.db_exists:
             print('Database does not exist. Initializing...')
@@ -32,7 +56,11 @@ class DatabaseService:
             self.initialize_database()
 
     def initialize_database(self):
-        cursor = self.conn.cursor()
+        self.db.write_sync(self._create_schema)
+        self.db.write_sync(migrate)
+
+    def _create_schema(self, conn) -> None:
+        cursor = conn.cursor()
 
         # Create main documents table
         cursor.execute('''
@@ -78,41 +106,54 @@ class DatabaseService:
             END
         ''')
 
-        self.conn.commit()
-
-    async def insert_document(self, document: IDoc, for_search: bool = False) -> Any:
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            INSERT INTO documents (uuid, source_uuid, text, metadata, created_at, updated_at)
-            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-        ''', (
-            document.metadata.get('uuid', ''),
-            document.metadata.get('source_uuid', ''),
-            document.text,
-            json.dumps(document.metadata)
-        ))
-        self.conn.commit()
-
-        if for_search and self.search_service and self.vector_service:
-            # Sync to Algolia
-            await self.search_service.save_object('documents', {
-                'objectID': document.metadata.get('uuid'),
-                'text': document.text,
-                **document.metadata
-            })
-
-            # Sync to Qdrant
-            await self.vector_service.add_points('documents', [{
-                'id': document.metadata.get('uuid'),
-                'text': document.text,
-                'metadata': {'text': document.text, **document.metadata}
-            }])
+    async def insert_document(self, document: Union[IDoc, CompactDoc], for_search: bool = False) -> Any:
+        def insert(conn) -> Any:
+            cursor = conn.execute('''
+                INSERT INTO documents (uuid, source_uuid, text, metadata, created_at, updated_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+            ''', (
+                document.metadata.get('uuid', ''),
+                document.metadata.get('source_uuid', ''),
+                document.text,
+                json.dumps(metadata_to_dict(document.metadata))
+            ))
+            if for_search and self.syncs_remote:
+                enqueue(conn, [(document.metadata.get('uuid', ''), UPSERT)])
+            return cursor.lastrowid
+
+        row_id = await self.db.write(insert)
+        if for_search:
+            self._warn_if_not_syncing()
+        return row_id
+
+    async def insert_documents(self, documents: List[Union[IDoc, CompactDoc]], for_search: bool = False) -> int:
+        # All rows and their outbox entries are written in one transaction,
+        # the outbox worker syncs them to Algolia and Qdrant in batches
+        if not documents:
+            return 0
 
-        return cursor.lastrowid
+        def insert(conn) -> None:
+            conn.executemany('''
+                INSERT INTO documents (uuid, source_uuid, text, metadata, created_at, updated_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+            ''', [
+                (
+                    document.metadata.get('uuid', ''),
+                    document.metadata.get('source_uuid', ''),
+                    document.text,
+                    json.dumps(metadata_to_dict(document.metadata))
+                )
+                for document in documents
+            ])
+            if for_search and self.syncs_remote:
+                enqueue(conn, [(document.metadata.get('uuid', ''), UPSERT) for document in documents])
+
+        await self.db.write(insert)
+        if for_search:
+            self._warn_if_not_syncing()
+        return len(documents)
 
     async def update_document(self, uuid: str, document: Dict[str, Any]) -> Any:
-        cursor = self.conn.cursor()
-
         # Only update fields that are provided
         update_fields = []
         params = []
@@ -123,7 +164,7 @@ class DatabaseService:
 
         if document.get('metadata') is not None:
             update_fields.append('metadata = ?')
-            params.append(json.dumps(document['metadata']))
+            params.append(json.dumps(metadata_to_dict(document['metadata'])))
 
         if document.get('uuid') is not None:
             update_fields.append('uuid = ?')
@@ -141,46 +182,61 @@ class DatabaseService:
             WHERE uuid = ?
         '''
 
-        cursor.execute(query, params)
-        self.conn.commit()
-
-        if self.search_service and self.vector_service:
-            # Sync to Algolia
-            if document.get('text') or document.get('metadata'):
-                await self.search_service.partial_update_object('documents', uuid, {
-                    'text': document.get('text'),
-                    **(document.get('metadata', {}))
-                })
-
-            # Sync to Qdrant
-            await self.vector_service.add_points('documents', [{
-                'id': document.get('metadata', {}).get('uuid', uuid),
-                'text': document.get('text', 'no text'),
-                'metadata': {
-                    'text': document.get('text', 'no text'),
-                    **(document.get('metadata', {}))
-                }
-            }])
+        def update(conn) -> int:
+            cursor = conn.execute(query, params)
+            if cursor.rowcount and self.syncs_remote:
+                new_uuid = document.get('uuid') or uuid
+                # A changed uuid removes the old objects and indexes the row under the new one
+                enqueue(conn, ([(uuid, DELETE)] if new_uuid != uuid else []) + [(new_uuid, UPSERT)])
+            return cursor.rowcount
 
-        return cursor.rowcount
+        updated = await self.db.write(update)
+        if updated:
+            self._warn_if_not_syncing()
+        return updated
 
     async def delete_document(self, uuid: str) -> Any:
-        cursor = self.conn.cursor()
-        cursor.execute('DELETE FROM documents WHERE uuid = ?', (uuid,))
-        self.conn.commit()
-
-        if self.search_service and self.vector_service:
-            # Sync to Algolia
-            await self.search_service.delete_object('documents', uuid)
-            # Sync to Qdrant
-            await self.vector_service.delete_point('documents', uuid)
-
-        return cursor.rowcount
+        def delete(conn) -> int:
+            cursor = conn.execute('DELETE FROM documents WHERE uuid = ?', (uuid,))
+            if cursor.rowcount and self.syncs_remote:
+                enqueue(conn, [(uuid, DELETE)])
+            return cursor.rowcount
+
+        deleted = await self.db.write(delete)
+        if deleted:
+            self._warn_if_not_syncing()
+        return deleted
+
+    def start_sync(self) -> None:
+        # Drains the outbox in the background, needs a running event loop
+        if self.outbox_worker:
+            self.outbox_worker.start()
+
+    async def stop_sync(self, flush: bool = True) -> None:
+        if self.outbox_worker:
+            await self.outbox_worker.stop()
+            if flush:
+                await self.outbox_worker.flush()
+
+    async def flush_sync(self) -> None:
+        # Syncs every due outbox entry now, for callers that search right after writing
+        if self.outbox_worker:
+            await self.outbox_worker.flush()
+
+    def _warn_if_not_syncing(self) -> None:
+        # Without start_sync() nothing drains the outbox, changes only reach Algolia and Qdrant on flush_sync()
+        if self.outbox_worker and not self.outbox_worker.running and not self.warned_not_syncing:
+            print('Warning: the outbox worker is not running, call start_sync() so document changes reach Algolia and Qdrant')
+            self.warned_not_syncing = True
+
+    async def sync_metrics(self) -> Dict[str, Any]:
+        # Outbox lag: pending entries, age of the oldest one, retries and totals since start
+        if not self.outbox_worker:
+            return {}
+        return await self.outbox_worker.metrics()
 
     async def get_document_by_uuid(self, uuid: str) -> Optional[IDoc]:
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT * FROM documents WHERE uuid = ?', (uuid,))
-        result = cursor.fetchone()
+        result = await self.db.fetchone('SELECT * FROM documents WHERE uuid = ?', (uuid,))
 
         if result:
             return IDoc(
@@ -189,10 +245,32 @@ class DatabaseService:
             )
         return None
 
+    async def get_existing_uuids(self, uuids: Iterable[str]) -> Set[str]:
+        # One IN query per SQLITE_MAX_VARIABLES uuids instead of a lookup per document
+        unique = list(dict.fromkeys(uuid for uuid in uuids if uuid))
+
+        def lookup(conn) -> Set[str]:
+            existing = set()
+            for start in range(0, len(unique), SQLITE_MAX_VARIABLES):
+                chunk = unique[start:start + SQLITE_MAX_VARIABLES]
+                placeholders = ', '.join('?' * len(chunk))
+                existing.update(row[0] for row in conn.execute(f'SELECT uuid FROM documents WHERE uuid IN ({placeholders})', chunk))
+            return existing
+
+        return await self.db.read(lookup) if unique else set()
+
     async def get_documents_by_source_uuid(self, source_uuid: str) -> List[IDoc]:
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT * FROM documents WHERE source_uuid = ?', (source_uuid,))
-        results = cursor.fetchall()
+        return await self.get_documents({'source_uuid': source_uuid})
+
+    async def get_documents(self, filters: Optional[Dict[str, Any]] = None, limit: Optional[int] = None) -> List[IDoc]:
+        # Filters on uuid, source_uuid, chunk_index, mime_type and conversation_uuid use indexed columns,
+        # other metadata keys are matched with json_extract in SQL
+        where, params = build_filters(filters)
+        query = f'SELECT text, metadata FROM documents WHERE {where} ORDER BY id'
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        results = await self.db.fetchall(query, params)
 
         return [
             IDoc(
@@ -202,11 +280,74 @@ class DatabaseService:
             for result in results
         ]
 
-    async def get_all_documents(self) -> List[IDoc]:
+    async def iter_documents(
+        self,
+        filters: Optional[Dict[str, Any]] = None,
+        page_size: int = DOCUMENT_PAGE_SIZE
+    ) -> AsyncIterator[LazyDoc]:
+        # Streams documents in id order, one page per query: each page starts after the last id
+        # of the previous one, so memory stays at one page and late pages cost the same as the first.
+        # Takes the same filters as get_documents, metadata is decoded on first access.
+        where, params = build_filters(filters)
+        query = f'SELECT id, uuid, text, metadata FROM documents WHERE id > ? AND {where} ORDER BY id LIMIT ?'
+        last_id = 0
+        while True:
+            rows = await self.db.fetchall(query, [last_id, *params, page_size])
+            for row in rows:
+                yield LazyDoc(row['text'], row['metadata'], row['uuid'])
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1]['id']
+
+    async def reindex_vectors(self, collection_name: str = 'documents', page_size: int = DOCUMENT_PAGE_SIZE) -> int:
+        # Rebuilds the vector store from the documents table: stored embeddings are reused and only
+        # documents without one (or whose text changed since) are embedded
+        if not self.vector_service:
+            return 0
+        print(f'Reindexing vectors into {collection_name}')
+        reused, embedded = self.embedding_store.reused, self.embedding_store.embedded
+        count = 0
+        page: List[LazyDoc] = []
+        async for document in self.iter_documents(page_size=page_size):
+            page.append(document)
+            if len(page) == page_size:
+                count += await self._reindex_page(collection_name, page)
+                page = []
+        if page:
+            count += await self._reindex_page(collection_name, page)
+        print(
+            f'Reindexed {count} documents, {self.embedding_store.reused - reused} stored embeddings reused, '
+            f'{self.embedding_store.embedded - embedded} created'
+        )
+        return count
+
+    async def _reindex_page(self, collection_name: str, page: List[LazyDoc]) -> int:
+        embeddings = await self.embedding_store.embed([(document.uuid, document.text) for document in page])
+        await self.vector_service.add_points(collection_name, [
+            {
+                'id': document.uuid,
+                'text': document.text,
+                'metadata': {'text': document.text, **document.metadata, 'uuid': document.uuid},
+                'embedding': embedding
+            }
+            for document, embedding in zip(page, embeddings)
+        ])
+        return len(page)
+
+    async def get_all_documents(self, compact: bool = False) -> List[Union[IDoc, CompactDoc]]:
         print('Fetching all documents')
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT * FROM documents')
-        results = cursor.fetchall()
+        if compact:
+            # Rows are converted as they are read, chunks of a source share one metadata copy
+            def read_compact(conn) -> List[CompactDoc]:
+                interner = DocInterner()
+                cursor = conn.execute('SELECT text, metadata FROM documents')
+                return [interner.compact(result['text'], json.loads(result['metadata'])) for result in cursor]
+
+            documents = await self.db.read(read_compact)
+            print(f"Found {len(documents)} documents")
+            return documents
+
+        results = await self.db.fetchall('SELECT * FROM documents')
         print(f"Found {len(results)} documents")
 
         return [
@@ -222,21 +363,41 @@ class DatabaseService:
         vector_search: Dict[str, Any],
         fulltext_search: Dict[str, Any]
     ) -> List[Dict[str, Any]]:
-        # Perform vector search
-        vector_results = await self.vector_service.perform_search(
-            'documents',
-            vector_search['query'],
-            vector_search.get('filter'),
-            15
-        )
+        return (await self.hybrid_search_many([(vector_search, fulltext_search)]))[0]
 
-        # Perform full-text search (Algolia)
-        algolia_results = await self.search_service.search_single_index(
-            'documents',
-            fulltext_search['query'],
-            fulltext_search.get('filter')
+    async def hybrid_search_many(
+        self,
+        searches: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+        concurrency: int = HYBRID_SEARCH_CONCURRENCY
+    ) -> List[List[Dict[str, Any]]]:
+        # All vector queries are embedded with one request, then the vector and full-text
+        # legs of every search run concurrently with at most `concurrency` in flight
+        if not searches:
+            return []
+        embeddings = await self.vector_service.openai_service.create_embeddings(
+            [vector_search['query'] for vector_search, _ in searches]
         )
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def bounded(awaitable):
+            async with semaphore:
+                return await awaitable
+
+        async def search(vector_search: Dict[str, Any], fulltext_search: Dict[str, Any], embedding: List[float]) -> List[Dict[str, Any]]:
+            vector_results, algolia_results = await asyncio.gather(
+                # Perform vector search
+                bounded(self.vector_service.search_by_vector('documents', embedding, vector_search.get('filter'), 15)),
+                # Perform full-text search (Algolia or local FTS5)
+                bounded(self.fulltext_backend.search('documents', fulltext_search['query'], fulltext_search.get('filter')))
+            )
+            return self._merge_results(vector_results, algolia_results)
+
+        return list(await asyncio.gather(*[
+            search(vector_search, fulltext_search, embedding)
+            for (vector_search, fulltext_search), embedding in zip(searches, embeddings)
+        ]))
 
+    def _merge_results(self, vector_results: List[Dict[str, Any]], algolia_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         # Calculate RRF scores
         rrf = self._calculate_rrf(vector_results, algolia_results)
         avg_score = sum(item['score'] for item in rrf) / len(rrf) if rrf else 0
@@ -0,0 +1,118 @@
+import os
+import re
+import json
+import hashlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from text_service import IDoc
+
+DEDUP_THRESHOLD = float(os.getenv('DEDUP_THRESHOLD', '0.9'))
+
+# Each indexed chunk costs one embedding request and a text-embedding-3-large vector (3072 float32) in Qdrant
+EMBEDDING_BYTES = 3072 * 4
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+WORD_PATTERN = re.compile(r'\w+')
+
+@dataclass
+class DedupReport:
+    total_chunks: int = 0
+    duplicate_chunks: int = 0
+    embedding_calls_saved: int = 0
+    index_bytes_saved: int = 0
+
+class ChunkDeduplicator:
+    # MinHash signatures of word shingles with LSH banding: chunks that share a band are
+    # candidates, and a candidate is a duplicate when the estimated Jaccard similarity of
+    # the two signatures reaches the threshold. The first chunk seen stays canonical.
+    def __init__(
+        self,
+        threshold: float = DEDUP_THRESHOLD,
+        num_perm: int = 128,
+        bands: int = 16,
+        shingle_size: int = 5,
+        seed: int = 1
+    ):
+        if num_perm % bands:
+            raise ValueError('num_perm must be divisible by bands')
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, int(MERSENNE_PRIME), num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, int(MERSENNE_PRIME), num_perm, dtype=np.uint64)
+
+        self.buckets: List[Dict[bytes, int]] = [{} for _ in range(bands)]
+        self.signatures: List[np.ndarray] = []
+        self.canonical_ids: List[str] = []
+
+    def signature(self, text: str) -> np.ndarray:
+        words = WORD_PATTERN.findall(text.lower())
+        size = min(self.shingle_size, len(words)) or 1
+        shingles = {' '.join(words[index:index + size]) for index in range(max(len(words) - size + 1, 1))}
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=4).digest(), 'little') for shingle in shingles],
+            dtype=np.uint64
+        )
+        # Universal hashing in wrapping uint64 arithmetic, one row per permutation
+        return ((np.outer(hashes, self.a) + self.b) % MERSENNE_PRIME).min(axis=0)
+
+    def find_duplicate(self, signature: np.ndarray) -> Optional[Tuple[int, float]]:
+        best = None
+        for band, bucket in enumerate(self.buckets):
+            candidate = bucket.get(signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            if candidate is None:
+                continue
+            similarity = float(np.mean(self.signatures[candidate] == signature))
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (candidate, similarity)
+        return best
+
+    def add(self, signature: np.ndarray, doc_id: str) -> None:
+        index = len(self.signatures)
+        self.signatures.append(signature)
+        self.canonical_ids.append(doc_id)
+        for band, bucket in enumerate(self.buckets):
+            bucket.setdefault(signature[band * self.rows:(band + 1) * self.rows].tobytes(), index)
+
+    def deduplicate(self, docs: List[IDoc], link: bool = True) -> Tuple[List[IDoc], DedupReport]:
+        # Linked duplicates are returned with duplicate_of set and should be stored without
+        # being embedded or indexed, dropped duplicates are left out of the result
+        report = DedupReport(total_chunks=len(docs))
+        result: List[IDoc] = []
+
+        for doc in docs:
+            signature = self.signature(doc.text)
+            duplicate = self.find_duplicate(signature)
+            if duplicate is None:
+                self.add(signature, doc.metadata.get('uuid', ''))
+                result.append(doc)
+                continue
+
+            canonical, similarity = duplicate
+            report.duplicate_chunks += 1
+            report.embedding_calls_saved += 1
+            report.index_bytes_saved += self._index_bytes(doc)
+            if link:
+                result.append(IDoc(text=doc.text, metadata={
+                    **doc.metadata,
+                    'duplicate_of': self.canonical_ids[canonical],
+                    'duplicate_similarity': round(similarity, 3)
+                }))
+
+        print(f"Deduplication: {report.duplicate_chunks}/{report.total_chunks} near-duplicate chunks, "
+              f"{report.embedding_calls_saved} embedding calls and {report.index_bytes_saved} index bytes saved")
+        return result, report
+
+    def _index_bytes(self, doc: IDoc) -> int:
+        # Algolia record plus Qdrant payload and vector, as insert_document would send them
+        record = json.dumps({'objectID': doc.metadata.get('uuid'), 'text': doc.text, **doc.metadata}, ensure_ascii=False)
+        payload = json.dumps({'text': doc.text, **doc.metadata}, ensure_ascii=False)
+        return len(record.encode('utf-8')) + len(payload.encode('utf-8')) + EMBEDDING_BYTES
+
+    def reset(self) -> None:
+        self.buckets = [{} for _ in range(self.bands)]
+        self.signatures = []
+        self.canonical_ids = []
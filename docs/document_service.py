@@ -1,6 +1,5 @@
 import os
 import json
-import asyncio
 from typing import List, Dict, Any, Optional
 from pathlib import Path
 from openai_service import OpenAIService
@@ -53,14 +52,15 @@ class DocumentService:
             source_uuids = {doc.metadata.get('source_uuid') for doc in documents}
 
             # Insert documents that DON'T exist in the database
-            insert_tasks = []
-            for doc in documents:
-                if not doc.metadata.get('uuid'):
-                    continue
-                existing_doc = await self.database_service.get_document_by_uuid(doc.metadata['uuid'])
-                if not existing_doc:
-                    insert_tasks.append(self.database_service.insert_document(doc, True))
-            await asyncio.gather(*insert_tasks)
+            existing_uuids = await self.database_service.get_existing_uuids(doc.metadata.get('uuid') for doc in documents)
+            missing_docs = {
+                doc.metadata['uuid']: doc
+                for doc in documents
+                if doc.metadata.get('uuid') and doc.metadata['uuid'] not in existing_uuids
+            }
+            await self.database_service.insert_documents(list(missing_docs.values()), True)
+            # The new documents have to be in Algolia and Qdrant before they can be searched
+            await self.database_service.flush_sync()
 
             # Prepare filters for hybrid search
             vector_filter = {
@@ -72,19 +72,22 @@ class DocumentService:
                 }
             }
 
-            # Gather hybrid search results for all queries
-            hybrid_results = []
-            for query_item in queries:
-                results = await self.database_service.hybrid_search(
+            # Gather hybrid search results for all queries in one concurrent round
+            results_per_query = await self.database_service.hybrid_search_many([
+                (
                     {'query': query_item['natural'], 'filter': vector_filter},
                     {'query': query_item['search'], 'filter': fulltext_filter}
                 )
+                for query_item in queries
+            ])
+            hybrid_results = []
+            for query_item, results in zip(queries, results_per_query):
                 hybrid_results.extend([
                     {**doc, 'metadata': {**doc['metadata'], 'query': query_item['natural']}}
                     for doc in results
                 ])
 
-            results = [self.text_service.restore_placeholders(doc) for doc in hybrid_results]
+            results = self.text_service.restore_many(hybrid_results)
 
             context = '\n'.join(
                 f'<doc uuid="{doc.metadata["uuid"]}" source-uuid="{doc.metadata["source_uuid"]}" '
@@ -112,7 +115,7 @@ class DocumentService:
             return "No documents found"
 
         try:
-            processed_docs = [self.text_service.restore_placeholders(doc) for doc in documents]
+            processed_docs = self.text_service.restore_many(documents)
             previous_answer = ""
 
             for doc in processed_docs:
@@ -169,15 +172,13 @@ class DocumentService:
                     compression_tasks.append('')
 
             # Process results while maintaining document order
-            processed_docs = []
-            for doc, compressed_text in zip(documents, compression_tasks):
-                processed_doc = self.text_service.restore_placeholders(
-                    IDoc(
-                        text=compressed_text or '',
-                        metadata=doc.metadata
-                    )
+            processed_docs = self.text_service.restore_many([
+                IDoc(
+                    text=compressed_text or '',
+                    metadata=doc.metadata
                 )
-                processed_docs.append(processed_doc)
+                for doc, compressed_text in zip(documents, compression_tasks)
+            ])
 
             # Merge all compressed content
             merged_content = '\n\n'.join(doc.text for doc in processed_docs if doc.text)
@@ -246,7 +247,7 @@ class DocumentService:
 
                 extracted_docs.extend(batch_tasks)
 
-            return [self.text_service.restore_placeholders(doc) for doc in extracted_docs]
+            return self.text_service.restore_many(extracted_docs)
         except Exception as error:
             print('Error in extract method:', error)
             return []
@@ -292,7 +293,7 @@ class DocumentService:
 
                 translated_docs.extend(batch_tasks)
 
-            return [self.text_service.restore_placeholders(doc) for doc in translated_docs]
+            return self.text_service.restore_many(translated_docs)
         except Exception as error:
             print('Error in translate method:', error)
             return []
@@ -0,0 +1,131 @@
+import os
+import sys
+import time
+import hashlib
+import sqlite3
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, List, Sequence, Tuple
+import numpy as np
+from sqlite_pool import AsyncSQLite, SQLITE_MAX_VARIABLES
+sys.path.append(str(Path(__file__).resolve().parents[1]))  # repository root with the shared package
+from shared.tokenizer_registry import get_encoding
+
+if TYPE_CHECKING:
+    from openai_service import OpenAIService
+
+# Storage type of new embeddings: 'float32' (12 KB per 3072-d vector) or 'float16' (6 KB, ~1e-3 relative error)
+EMBEDDING_DTYPE = os.getenv('EMBEDDING_DTYPE', 'float32')
+# Per-request limits of the embeddings API: number of inputs and tokens summed over all inputs
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '2048'))
+EMBEDDING_BATCH_TOKENS = int(os.getenv('EMBEDDING_BATCH_TOKENS', '300000'))
+# Encoding of the text-embedding-3 models
+EMBEDDING_ENCODING = 'cl100k_base'
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def encode_vector(embedding: Sequence[float], dtype: str = EMBEDDING_DTYPE) -> bytes:
+    return np.asarray(embedding, dtype=dtype).tobytes()
+
+def decode_vector(blob: bytes, dtype: str) -> List[float]:
+    return np.frombuffer(blob, dtype=dtype).astype(np.float32).tolist()
+
+def count_embedding_tokens(texts: List[str]) -> List[int]:
+    try:
+        return [len(tokens) for tokens in get_encoding(EMBEDDING_ENCODING).encode_ordinary_batch(texts)]
+    except Exception as error:
+        # Without the tokenizer the UTF-8 length is used, every token is at least one byte
+        print('Counting embedding tokens by bytes, tokenizer unavailable:', error)
+        return [len(text.encode('utf-8')) for text in texts]
+
+def embedding_batches(token_counts: List[int], max_items: int, max_tokens: int) -> List[range]:
+    # Consecutive index ranges within both limits, a text over max_tokens on its own gets a batch to itself
+    batches = []
+    start = tokens = 0
+    for index, count in enumerate(token_counts):
+        if index > start and (index - start == max_items or tokens + count > max_tokens):
+            batches.append(range(start, index))
+            start, tokens = index, 0
+        tokens += count
+    if start < len(token_counts):
+        batches.append(range(start, len(token_counts)))
+    return batches
+
+class EmbeddingStore:
+    # Embeddings of document texts kept in the document_embeddings table, keyed by document uuid
+    # together with the hash of the text they were computed from. A stored vector is reused while
+    # the text hash matches, only new or changed texts are sent to the embeddings API, in requests
+    # that stay within the API's input and token limits.
+    def __init__(
+        self,
+        db: AsyncSQLite,
+        openai_service: 'OpenAIService',
+        dtype: str = EMBEDDING_DTYPE,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        batch_tokens: int = EMBEDDING_BATCH_TOKENS,
+        count_tokens: Callable[[List[str]], List[int]] = count_embedding_tokens
+    ):
+        if dtype not in ('float32', 'float16'):
+            raise ValueError(f'Unsupported embedding dtype: {dtype}')
+        self.db = db
+        self.openai_service = openai_service
+        self.dtype = dtype
+        self.batch_size = batch_size
+        self.batch_tokens = batch_tokens
+        self.count_tokens = count_tokens
+        self.reused = 0
+        self.embedded = 0
+
+    @staticmethod
+    def _lookup(conn: sqlite3.Connection, uuids: List[str]) -> Dict[str, sqlite3.Row]:
+        stored = {}
+        for start in range(0, len(uuids), SQLITE_MAX_VARIABLES):
+            chunk = uuids[start:start + SQLITE_MAX_VARIABLES]
+            placeholders = ', '.join('?' * len(chunk))
+            for row in conn.execute(f'SELECT uuid, text_hash, dtype, vector FROM document_embeddings WHERE uuid IN ({placeholders})', chunk):
+                stored[row['uuid']] = row
+        return stored
+
+    def _save(self, conn: sqlite3.Connection, rows: List[Tuple[str, str, List[float]]]) -> None:
+        now = time.time()
+        conn.executemany('''
+            INSERT INTO document_embeddings (uuid, text_hash, dtype, vector, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(uuid) DO UPDATE SET
+                text_hash = excluded.text_hash,
+                dtype = excluded.dtype,
+                vector = excluded.vector,
+                updated_at = excluded.updated_at
+        ''', [(uuid, hash, self.dtype, encode_vector(embedding, self.dtype), now) for uuid, hash, embedding in rows])
+
+    async def embed(self, documents: List[Tuple[str, str]]) -> List[List[float]]:
+        # (uuid, text) pairs -> embeddings in the same order, missing ones are created in batched requests
+        if not documents:
+            return []
+        hashes = [text_hash(text) for _, text in documents]
+        stored = await self.db.read(self._lookup, [uuid for uuid, _ in documents])
+
+        embeddings: List[List[float]] = [None] * len(documents)
+        missing = []
+        for index, (uuid, _) in enumerate(documents):
+            row = stored.get(uuid)
+            if row is not None and row['text_hash'] == hashes[index]:
+                embeddings[index] = decode_vector(row['vector'], row['dtype'])
+            else:
+                missing.append(index)
+
+        if missing:
+            # Each batch is stored as soon as it is embedded, so a failed batch doesn't cost the earlier ones
+            texts = [documents[index][1] for index in missing]
+            for batch in embedding_batches(self.count_tokens(texts), self.batch_size, self.batch_tokens):
+                indexes = [missing[position] for position in batch]
+                created = await self.openai_service.create_embeddings([texts[position] for position in batch])
+                await self.db.write(self._save, [
+                    (documents[index][0], hashes[index], embedding) for index, embedding in zip(indexes, created)
+                ])
+                for index, embedding in zip(indexes, created):
+                    embeddings[index] = embedding
+
+        self.reused += len(documents) - len(missing)
+        self.embedded += len(missing)
+        return embeddings
@@ -16,13 +16,15 @@ from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaFileUpload
 from text_service import TextService, IDoc
+from chunk_cache import ChunkCache
 from audio_service import AudioService
 from openai_service import OpenAIService
 from web_search_service import WebSearchService
 
 class FileService:
     def __init__(self):
-        self.text_service = TextService()
+        # Re-ingesting an unchanged file reuses its chunks instead of tokenizing it again
+        self.text_service = TextService(cache=ChunkCache())
         self.audio_service = AudioService()
         self.openai_service = OpenAIService()
         self.web_search_service = WebSearchService()
@@ -86,6 +88,11 @@ class FileService:
         self.auth_client = None
         #self.initialize_google_auth()
 
+    def close(self) -> None:
+        self.text_service.close()
+        self.text_service.cache.close()
+        self.openai_service.close()
+
     def initialize_google_auth(self):
         try:
             credentials = {
@@ -321,6 +328,8 @@ class FileService:
                 storage_path = file_info['path']
 
             docs = []
+            # (text, metadata) of the texts that become a single document each
+            pending = []
             screenshot_paths = None
 
             mime_type = await self.get_mime_type(storage_path)
@@ -344,8 +353,7 @@ class FileService:
                         chunk_docs = await self.text_service.split(transcription.text, chunk_size, metadata)
                         docs.extend(chunk_docs)
                     else:
-                        doc = await self.text_service.document(transcription.text, None, metadata)
-                        docs.append(doc)
+                        pending.append((transcription.text, metadata))
 
                 # Clean up chunks
                 for chunk in chunks:
@@ -376,43 +384,29 @@ class FileService:
                         })
                         docs.append(doc)
                 else:
-                    doc = await self.text_service.document(text_content, None, {
+                    pending.append((text_content, {
                         **base_metadata,
                         'uuid': str(uuid.uuid4())
-                    })
-                    docs = [doc]
+                    }))
 
             elif file_type == 'document':
                 # Handle document processing
-                doc_content = await self.read_document_file(original_path, storage_path)
+                content, metadata = await self.read_document_content(original_path, storage_path)
 
                 if chunk_size:
-                    docs = await self.text_service.split(doc_content.text, chunk_size)
+                    docs = await self.text_service.split(content, chunk_size)
                 else:
-                    docs = [doc_content]
+                    pending.append((content, metadata))
 
                 # Take screenshots of the document
                 screenshot_paths = await self.take_screenshot(storage_path, os.path.basename(original_path))
                 print(f'Screenshots saved to: {screenshot_paths}')
 
-                # Add screenshot information to metadata
-                if screenshot_paths:
-                    for index, doc in enumerate(docs):
-                        doc.metadata = {
-                            **doc.metadata,
-                            'source_uuid': file_uuid,
-                            'uuid': str(uuid.uuid4()),
-                            'screenshots': screenshot_paths,
-                            'chunk_index': index,
-                            'total_chunks': len(docs)
-                        }
-
             elif file_type == 'image':
                 # Handle image processing
                 image_descriptions = await self.openai_service.process_images([storage_path])
-                doc = await self.text_service.document(
+                pending.append((
                     image_descriptions[0].description,
-                    None,
                     {
                         'source': original_path,
                         'path': storage_path,
@@ -421,12 +415,27 @@ class FileService:
                         'source_uuid': file_uuid,
                         'uuid': str(uuid.uuid4())
                     }
-                )
-                docs = [doc]
+                ))
 
             else:
                 raise ValueError(f'Unsupported file type: {file_type}')
 
+            # Texts kept whole are counted with one count_tokens_batch call for the whole file
+            if pending:
+                docs.extend(await self.text_service.documents(pending))
+
+            # Add screenshot information to metadata
+            if screenshot_paths:
+                for index, doc in enumerate(docs):
+                    doc.metadata = {
+                        **doc.metadata,
+                        'source_uuid': file_uuid,
+                        'uuid': str(uuid.uuid4()),
+                        'screenshots': screenshot_paths,
+                        'chunk_index': index,
+                        'total_chunks': len(docs)
+                    }
+
             return {'docs': docs}
 
         except Exception as error:
@@ -434,6 +443,10 @@ class FileService:
             raise error
 
     async def read_document_file(self, original_path: str, storage_path: str) -> IDoc:
+        content, additional_metadata = await self.read_document_content(original_path, storage_path)
+        return await self.text_service.document(content, None, additional_metadata)
+
+    async def read_document_content(self, original_path: str, storage_path: str) -> tuple[str, Dict[str, Any]]:
         try:
             mime_type = await self.get_mime_type(storage_path)
 
@@ -463,8 +476,7 @@ class FileService:
                 'mime_type': mime_type,
             }
 
-            doc = await self.text_service.document(content.strip(), None, additional_metadata)
-            return doc
+            return content.strip(), additional_metadata
         except Exception as error:
             print(f'Failed to read document file: {str(error)}')
             raise error
@@ -795,10 +807,7 @@ class FileService:
 
     async def save_docs_to_file(self, docs: List[IDoc], file_name: str) -> str:
         try:
-            full_content = ''
-            for doc in docs:
-                restored_doc = self.text_service.restore_placeholders(doc)
-                full_content += restored_doc.text + '\n\n'
+            full_content = ''.join(restored_doc.text + '\n\n' for restored_doc in self.text_service.restore_many(docs))
 
             file_uuid = str(uuid.uuid4())
             file_content = full_content.encode('utf-8')
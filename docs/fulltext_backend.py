@@ -0,0 +1,85 @@
+import re
+import json
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+from sqlite_pool import AsyncSQLite
+
+FILTER_PATTERN = re.compile(r'^\(?\s*([\w.]+)\s*:\s*"?([^")\s]+)"?\s*\)?$')
+WORD_PATTERN = re.compile(r'\w+')
+
+# Filter attributes stored as columns of the documents table, everything else is read from the metadata JSON
+FILTER_COLUMNS = {'uuid': 'd.uuid', 'source_uuid': 'd.source_uuid', 'objectID': 'd.uuid'}
+
+class FullTextBackend(ABC):
+    # Full-text side of hybrid_search. Results are dicts shaped like Algolia hits:
+    # objectID, text and the document metadata, best match first.
+    @abstractmethod
+    async def search(self, index_name: str, query: str, options: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        ...
+
+class FTS5Backend(FullTextBackend):
+    # Local search over the documents_search FTS5 table kept in sync by the documents triggers, ranked by bm25()
+    def __init__(self, db: AsyncSQLite, hits_per_page: int = 20):
+        self.db = db
+        self.hits_per_page = hits_per_page
+
+    @staticmethod
+    def match_expression(query: str) -> Optional[str]:
+        # Every word is optional and matches as a prefix, like Algolia's optionalWords and prefixAll
+        words = WORD_PATTERN.findall(query)
+        if not words:
+            return None
+        return 'text : (' + ' OR '.join(f'"{word}"*' for word in words) + ')'
+
+    @staticmethod
+    def translate_filters(filters: str) -> Tuple[str, List[Any]]:
+        # Algolia filter strings as built by DocumentService.answer: attribute:value terms joined by OR,
+        # groups of them joined by AND
+        clauses = []
+        params: List[Any] = []
+        for group in re.split(r'\s+AND\s+', filters.strip()):
+            if not group:
+                continue
+            terms = []
+            for term in re.split(r'\s+OR\s+', group.strip().strip('()')):
+                match = FILTER_PATTERN.match(term.strip())
+                if not match:
+                    raise ValueError(f'Unsupported full-text filter: {term}')
+                attribute, value = match.groups()
+                column = FILTER_COLUMNS.get(attribute)
+                if column is None:
+                    column = 'json_extract(d.metadata, ?)'
+                    params.append(f'$.{attribute}')
+                terms.append(f'{column} = ?')
+                params.append(value)
+            clauses.append('(' + ' OR '.join(terms) + ')')
+        return ' AND '.join(clauses), params
+
+    async def search(self, index_name: str, query: str, options: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        expression = self.match_expression(query)
+        if expression is None:
+            return []
+
+        query_parameters = (options or {}).get('queryParameters', {})
+        where = 'documents_search MATCH ?'
+        params: List[Any] = [expression]
+        if query_parameters.get('filters'):
+            clause, filter_params = self.translate_filters(query_parameters['filters'])
+            if clause:
+                where += f' AND {clause}'
+                params.extend(filter_params)
+        params.append(query_parameters.get('hitsPerPage', self.hits_per_page))
+
+        rows = await self.db.fetchall(f'''
+            SELECT d.uuid, d.text, d.metadata, bm25(documents_search) AS rank
+            FROM documents_search
+            JOIN documents d ON d.id = documents_search.rowid
+            WHERE {where}
+            ORDER BY rank
+            LIMIT ?
+        ''', params)
+
+        return [
+            {'objectID': row['uuid'], 'text': row['text'], **json.loads(row['metadata'])}
+            for row in rows
+        ]
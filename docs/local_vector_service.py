@@ -0,0 +1,330 @@
+import os
+import json
+import uuid
+import asyncio
+import threading
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+import numpy as np
+
+if TYPE_CHECKING:
+    from openai_service import OpenAIService
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+VECTOR_INDEX_PATH = os.getenv('VECTOR_INDEX_PATH', os.path.join(os.path.dirname(__file__), 'storage', 'vectors'))
+VECTOR_SIZE = 3072
+# HNSW is only used when hnswlib is installed and a search covers at least this many points
+HNSW_MIN_POINTS = int(os.getenv('HNSW_MIN_POINTS', '20000'))
+USE_HNSW = os.getenv('VECTOR_INDEX_HNSW', '1') == '1'
+
+def matches_filter(payload: Dict[str, Any], filter: Optional[Dict[str, Any]]) -> bool:
+    # Qdrant style filter: must / should / must_not lists of {'key', 'match': {'value' | 'any'}} conditions
+    if not filter:
+        return True
+
+    def condition(item: Dict[str, Any]) -> bool:
+        if any(key in item for key in ('must', 'should', 'must_not')):
+            return matches_filter(payload, item)
+        value = payload.get(item['key'])
+        match = item.get('match', {})
+        if 'value' in match:
+            return value == match['value']
+        if 'any' in match:
+            return value in match['any']
+        if 'except' in match:
+            return value not in match['except']
+        raise ValueError(f'Unsupported filter condition: {item}')
+
+    must = filter.get('must') or []
+    should = filter.get('should') or []
+    must_not = filter.get('must_not') or []
+    return (
+        all(condition(item) for item in must)
+        and (not should or any(condition(item) for item in should))
+        and not any(condition(item) for item in must_not)
+    )
+
+def _equals(column: np.ndarray, value: Any) -> np.ndarray:
+    # Elementwise payload == value, the value is wrapped so lists compare as a whole
+    target = np.empty((), dtype=object)
+    target[()] = value
+    return np.asarray(column == target, dtype=bool)
+
+class LocalCollection:
+    # Vectors are L2-normalized float32 rows appended to <name>.f32 and read through a memory map,
+    # the sidecar <name>.jsonl logs which row holds which point id and payload. Updating a point
+    # appends a new row, the old one stays in the file as dead space until compact().
+    # Filters are evaluated on per-key payload columns and the HNSW index, once built, is kept
+    # in step with writes instead of being rebuilt.
+    def __init__(self, directory: str, name: str, dimension: int):
+        self.dimension = dimension
+        self.vectors_path = os.path.join(directory, f'{name}.f32')
+        self.sidecar_path = os.path.join(directory, f'{name}.jsonl')
+        self.ids: List[Optional[str]] = []
+        self.payloads: List[Optional[Dict[str, Any]]] = []
+        self.rows: Dict[str, int] = {}
+        self.matrix = np.empty((0, dimension), dtype=np.float32)
+        self.alive = np.zeros(0, dtype=bool)
+        self.columns: Dict[str, np.ndarray] = {}
+        self.hnsw = None
+        self._lock = threading.Lock()
+
+        if os.path.exists(self.sidecar_path):
+            with open(self.sidecar_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    self._replay(json.loads(line))
+        self._remap()
+
+    def _replay(self, entry: Dict[str, Any]) -> None:
+        if 'deleted' in entry:
+            row = self.rows.pop(entry['deleted'], None)
+            if row is not None:
+                self.ids[row] = self.payloads[row] = None
+            return
+
+        row = entry['row']
+        while len(self.ids) <= row:
+            self.ids.append(None)
+            self.payloads.append(None)
+        previous = self.rows.get(entry['id'])
+        if previous is not None:
+            self.ids[previous] = self.payloads[previous] = None
+        self.ids[row] = entry['id']
+        self.payloads[row] = entry['payload']
+        self.rows[entry['id']] = row
+
+    def _remap(self) -> None:
+        # Rows written by an interrupted upsert without a sidecar entry are ignored
+        size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        count = min(size // (4 * self.dimension), len(self.ids))
+        if count:
+            self.matrix = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(count, self.dimension))
+        else:
+            self.matrix = np.empty((0, self.dimension), dtype=np.float32)
+        for point_id in self.ids[count:]:
+            if point_id is not None:
+                del self.rows[point_id]
+        del self.ids[count:], self.payloads[count:]
+        self.alive = np.array([point_id is not None for point_id in self.ids], dtype=bool)
+        self.columns = {}
+
+    def upsert(self, ids: List[str], vectors: np.ndarray, payloads: List[Dict[str, Any]]) -> None:
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dimension)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+
+        with self._lock:
+            first_row = len(self.ids)
+            replaced = [self.rows[point_id] for point_id in dict.fromkeys(ids) if point_id in self.rows]
+            with open(self.vectors_path, 'ab') as f:
+                f.seek(first_row * 4 * self.dimension)
+                f.truncate()
+                f.write(vectors.tobytes())
+            entries = [{'row': first_row + index, 'id': point_id, 'payload': payload} for index, (point_id, payload) in enumerate(zip(ids, payloads))]
+            with open(self.sidecar_path, 'a', encoding='utf-8') as f:
+                f.writelines(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries)
+            for entry in entries:
+                self._replay(entry)
+            self._remap()
+            self._hnsw_update([entry['row'] for entry in entries if self.ids[entry['row']] is not None], replaced)
+
+    def delete(self, point_id: str) -> None:
+        with self._lock:
+            row = self.rows.get(point_id)
+            if row is None:
+                return
+            with open(self.sidecar_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'deleted': point_id}) + '\n')
+            self._replay({'deleted': point_id})
+            self.alive[row] = False
+            self._hnsw_update([], [row])
+
+    def _hnsw_index(self) -> Any:
+        if self.hnsw is None:
+            alive = np.flatnonzero(self.alive)
+            index = hnswlib.Index(space='ip', dim=self.dimension)
+            index.init_index(max_elements=max(len(alive), 1), ef_construction=200, M=16)
+            if len(alive):
+                index.add_items(self.matrix[alive], alive)
+            index.set_ef(128)
+            self.hnsw = index
+        return self.hnsw
+
+    def _hnsw_update(self, added: List[int], removed: List[int]) -> None:
+        # Rows of a built index are labelled by their row number, replaced and deleted rows are
+        # only marked deleted and new rows are added, growing the index geometrically
+        if self.hnsw is None:
+            return
+        for row in removed:
+            self.hnsw.mark_deleted(row)
+        if added:
+            needed = self.hnsw.get_current_count() + len(added)
+            if needed > self.hnsw.get_max_elements():
+                self.hnsw.resize_index(max(needed, 2 * self.hnsw.get_max_elements()))
+            self.hnsw.add_items(self.matrix[added], added)
+
+    def _column(self, key: str) -> np.ndarray:
+        column = self.columns.get(key)
+        if column is None:
+            column = np.empty(len(self.payloads), dtype=object)
+            column[:] = [payload.get(key) if payload is not None else None for payload in self.payloads]
+            self.columns[key] = column
+        return column
+
+    def _filter_mask(self, filter: Dict[str, Any]) -> np.ndarray:
+        # Same semantics as matches_filter, evaluated on whole payload columns at once
+        def condition(item: Dict[str, Any]) -> np.ndarray:
+            if any(key in item for key in ('must', 'should', 'must_not')):
+                return self._filter_mask(item)
+            column = self._column(item['key'])
+            match = item.get('match', {})
+            if 'value' in match:
+                return _equals(column, match['value'])
+            if 'any' in match or 'except' in match:
+                values = match['any'] if 'any' in match else match['except']
+                mask = np.zeros(len(column), dtype=bool)
+                for value in values:
+                    mask |= _equals(column, value)
+                return mask if 'any' in match else ~mask
+            raise ValueError(f'Unsupported filter condition: {item}')
+
+        mask = np.ones(len(self.payloads), dtype=bool)
+        for item in filter.get('must') or []:
+            mask &= condition(item)
+        should = filter.get('should') or []
+        if should:
+            mask &= np.logical_or.reduce([condition(item) for item in should])
+        for item in filter.get('must_not') or []:
+            mask &= ~condition(item)
+        return mask
+
+    def search(self, query: np.ndarray, limit: int, filter: Optional[Dict[str, Any]] = None) -> List[tuple[int, float]]:
+        # CPU bound, LocalVectorService runs it in a worker thread
+        query = np.asarray(query, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+
+        with self._lock:
+            # Filtered rows are selected first, so the top-k always has limit hits when enough points match
+            mask = self.alive & self._filter_mask(filter) if filter else self.alive.copy()
+            count = int(mask.sum())
+            if not count:
+                return []
+
+            if hnswlib is not None and USE_HNSW and count >= HNSW_MIN_POINTS:
+                allowed = set(np.flatnonzero(mask).tolist()) if count < len(self.rows) else None
+                labels, distances = self._hnsw_index().knn_query(
+                    query, k=min(limit, count), filter=(lambda label: label in allowed) if allowed else None
+                )
+                return [(int(row), 1 - float(distance)) for row, distance in zip(labels[0], distances[0])]
+            matrix = self.matrix
+
+        # The whole contiguous matrix is scored and rows outside the mask are ruled out,
+        # instead of copying the candidate rows out of the memory map
+        scores = np.where(mask, matrix @ query, -np.inf)
+        limit = min(limit, count)
+        top = np.sort(np.argpartition(-scores, limit - 1)[:limit]) if len(scores) > limit else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(row), float(scores[row])) for row in top]
+
+    def compact(self) -> None:
+        # Rewrites both files with live rows only
+        with self._lock:
+            alive = sorted(self.rows.values())
+            vectors = np.array(self.matrix[alive]) if alive else np.empty((0, self.dimension), dtype=np.float32)
+            entries = [{'row': index, 'id': self.ids[row], 'payload': self.payloads[row]} for index, row in enumerate(alive)]
+            for path, data in ((self.vectors_path, vectors.tobytes()), (self.sidecar_path, ''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries).encode('utf-8'))):
+                with open(path + '.tmp', 'wb') as f:
+                    f.write(data)
+            self.matrix = np.empty((0, self.dimension), dtype=np.float32)
+            os.replace(self.vectors_path + '.tmp', self.vectors_path)
+            os.replace(self.sidecar_path + '.tmp', self.sidecar_path)
+            self.ids, self.payloads, self.rows = [], [], {}
+            for entry in entries:
+                self._replay(entry)
+            self._remap()
+            # Row numbers changed, the index is rebuilt on the next search that needs it
+            self.hnsw = None
+
+class LocalVectorService:
+    # Embedded replacement for VectorService with the same methods, collections live in VECTOR_INDEX_PATH.
+    # Collection loads, writes and searches run in worker threads so they never block the event loop.
+    def __init__(self, openai_service: 'OpenAIService', directory: str = VECTOR_INDEX_PATH, dimension: int = VECTOR_SIZE):
+        self.openai_service = openai_service
+        self.directory = directory
+        self.dimension = dimension
+        self.collections: Dict[str, LocalCollection] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    async def ensure_collection(self, name: str) -> LocalCollection:
+        collection = self.collections.get(name)
+        if collection is None:
+            collection = await asyncio.to_thread(LocalCollection, self.directory, name, self.dimension)
+            collection = self.collections.setdefault(name, collection)
+        return collection
+
+    async def add_points(self, collection_name: str, points: List[Dict[str, Any]]) -> None:
+        collection = await self.ensure_collection(collection_name)
+        if not points:
+            return
+        missing = [point for point in points if point.get('embedding') is None]
+        created = iter(await self.openai_service.create_embeddings([point['text'] for point in missing]))
+        embeddings = [point['embedding'] if point.get('embedding') is not None else next(created) for point in points]
+        await asyncio.to_thread(
+            collection.upsert,
+            [str(point.get('id') or uuid.uuid4()) for point in points],
+            np.array(embeddings, dtype=np.float32),
+            [{'text': point['text'], **(point.get('metadata', {}))} for point in points]
+        )
+
+    async def update_point(self, collection_name: str, point: Dict[str, Any]) -> None:
+        await self.add_points(collection_name, [point])
+
+    async def delete_point(self, collection_name: str, point_id: str) -> None:
+        collection = await self.ensure_collection(collection_name)
+        await asyncio.to_thread(collection.delete, str(point_id))
+
+    async def delete_points(self, collection_name: str, point_ids: List[str]) -> None:
+        collection = await self.ensure_collection(collection_name)
+
+        def delete() -> None:
+            for point_id in point_ids:
+                collection.delete(str(point_id))
+
+        await asyncio.to_thread(delete)
+
+    async def perform_search(
+        self,
+        collection_name: str,
+        query: str,
+        filter: Optional[Dict[str, Any]] = None,
+        limit: int = 5
+    ) -> List[Dict[str, Any]]:
+        query_embedding = await self.openai_service.create_embedding(query)
+        return await self.search_by_vector(collection_name, query_embedding, filter, limit)
+
+    async def search_by_vector(
+        self,
+        collection_name: str,
+        query_embedding: List[float],
+        filter: Optional[Dict[str, Any]] = None,
+        limit: int = 5
+    ) -> List[Dict[str, Any]]:
+        collection = await self.ensure_collection(collection_name)
+
+        def search() -> List[Dict[str, Any]]:
+            hits = collection.search(np.array(query_embedding, dtype=np.float32), limit, filter)
+            payloads = [collection.payloads[row] for row, _ in hits]
+            # A point deleted while the search ran is left out
+            return [{'text': payload.get('text'), 'metadata': payload} for payload in payloads if payload is not None]
+
+        return await asyncio.to_thread(search)
+
+    async def get_all_points(self, collection_name: str) -> List[Dict[str, Any]]:
+        collection = await self.ensure_collection(collection_name)
+        return [
+            {'id': collection.ids[row], 'payload': collection.payloads[row]}
+            for row in sorted(collection.rows.values())
+        ]
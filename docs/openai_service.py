@@ -19,6 +19,9 @@ class OpenAIService:
         self.openai = AsyncOpenAI()
         self.text_service = TextService()
 
+    def close(self) -> None:
+        self.text_service.close()
+
     async def completion(
         self,
         messages: Optional[List[Dict[str, str]]] = None,
@@ -151,6 +154,20 @@ class OpenAIService:
             print("Error creating embedding:", error)
             raise error
 
+    async def create_embeddings(self, texts: List[str]) -> List[List[float]]:
+        # One request for many texts, the embeddings come back in input order
+        if not texts:
+            return []
+        try:
+            response = await self.openai.embeddings.create(
+                model="text-embedding-3-large",
+                input=texts
+            )
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        except Exception as error:
+            print("Error creating embeddings:", error)
+            raise error
+
     async def create_jina_embedding(self, text: str) -> List[float]:
         try:
             async with aiohttp.ClientSession() as session:
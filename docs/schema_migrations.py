@@ -0,0 +1,124 @@
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+
+# Schema changes applied in order on top of the base documents tables. PRAGMA user_version holds
+# the number of migrations already applied, each one runs in its own transaction with the version bump.
+MIGRATIONS: List[List[str]] = [
+    # 1: index source_uuid and expose frequently filtered metadata as indexed generated columns
+    [
+        'CREATE INDEX IF NOT EXISTS documents_source_uuid ON documents(source_uuid)',
+        "ALTER TABLE documents ADD COLUMN chunk_index INTEGER GENERATED ALWAYS AS (json_extract(metadata, '$.chunk_index')) VIRTUAL",
+        "ALTER TABLE documents ADD COLUMN mime_type TEXT GENERATED ALWAYS AS (COALESCE(json_extract(metadata, '$.mime_type'), json_extract(metadata, '$.mimeType'))) VIRTUAL",
+        "ALTER TABLE documents ADD COLUMN conversation_uuid TEXT GENERATED ALWAYS AS (json_extract(metadata, '$.conversation_uuid')) VIRTUAL",
+        'CREATE INDEX IF NOT EXISTS documents_source_uuid_chunk_index ON documents(source_uuid, chunk_index)',
+        'CREATE INDEX IF NOT EXISTS documents_mime_type ON documents(mime_type)',
+        'CREATE INDEX IF NOT EXISTS documents_conversation_uuid ON documents(conversation_uuid)'
+    ],
+    # 2: outbox of document changes still to be synced to Algolia and Qdrant
+    [
+        '''
+            CREATE TABLE IF NOT EXISTS sync_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                uuid TEXT NOT NULL,
+                operation TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                available_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT
+            )
+        ''',
+        'CREATE INDEX IF NOT EXISTS sync_outbox_available_at ON sync_outbox(available_at, id)'
+    ],
+    # 3: embeddings by document uuid and text hash, they follow uuid changes and go away with the document
+    [
+        '''
+            CREATE TABLE IF NOT EXISTS document_embeddings (
+                uuid TEXT PRIMARY KEY,
+                text_hash TEXT NOT NULL,
+                dtype TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS documents_embeddings_ad AFTER DELETE ON documents BEGIN
+                DELETE FROM document_embeddings WHERE uuid = old.uuid;
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS documents_embeddings_au AFTER UPDATE OF uuid ON documents
+            WHEN new.uuid != old.uuid BEGIN
+                UPDATE document_embeddings SET uuid = new.uuid WHERE uuid = old.uuid;
+            END
+        '''
+    ],
+    # 4: outbox entries parked after too many failed attempts, kept for inspection and requeueing
+    [
+        '''
+            CREATE TABLE IF NOT EXISTS sync_outbox_parked (
+                id INTEGER PRIMARY KEY,
+                uuid TEXT NOT NULL,
+                operation TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                attempts INTEGER NOT NULL,
+                last_error TEXT,
+                parked_at REAL NOT NULL
+            )
+        '''
+    ],
+    # 5: targets (Algolia, Qdrant) an outbox entry was already synced to, so a retry skips them
+    [
+        'ALTER TABLE sync_outbox ADD COLUMN synced_targets INTEGER NOT NULL DEFAULT 0'
+    ],
+    # 6: outbox and parked entries by uuid, a uuid is always synced together with its older entries
+    [
+        'CREATE INDEX IF NOT EXISTS sync_outbox_uuid ON sync_outbox(uuid, id)',
+        'CREATE INDEX IF NOT EXISTS sync_outbox_parked_uuid ON sync_outbox_parked(uuid, id)'
+    ]
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# Metadata keys with their own indexed column, other keys are filtered with json_extract
+FILTER_COLUMNS = {'uuid', 'source_uuid', 'chunk_index', 'mime_type', 'conversation_uuid'}
+
+def migrate(conn: sqlite3.Connection) -> int:
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+        print(f'Applying schema migration {number}')
+        conn.execute('BEGIN')
+        try:
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {number}')
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+    return max(version, SCHEMA_VERSION)
+
+def build_filters(filters: Optional[Dict[str, Any]], table: str = 'documents') -> Tuple[str, List[Any]]:
+    # {'source_uuid': 'a', 'chunk_index': [0, 1], 'name': 'x.md'} -> SQL condition and parameters,
+    # a list matches any of its values and None matches a missing value
+    clauses = []
+    params: List[Any] = []
+    for key, value in (filters or {}).items():
+        if isinstance(value, (list, tuple, set)) and not value:
+            clauses.append('0')
+            continue
+
+        if key in FILTER_COLUMNS:
+            column = f'{table}.{key}'
+        else:
+            column = f'json_extract({table}.metadata, ?)'
+            params.append(f'$.{key}')
+
+        if value is None:
+            clauses.append(f'{column} IS NULL')
+        elif isinstance(value, (list, tuple, set)):
+            clauses.append(f"{column} IN ({', '.join('?' * len(value))})")
+            params.extend(value)
+        else:
+            clauses.append(f'{column} = ?')
+            params.append(value)
+    return ' AND '.join(clauses) or '1', params
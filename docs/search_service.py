@@ -2,11 +2,15 @@ import os
 from typing import Dict, List, Any, Optional, Union
 from algoliasearch.search.client import SearchClient
 from vector_service import VectorService
+from fulltext_backend import FullTextBackend
 
-class SearchService:
+class SearchService(FullTextBackend):
     def __init__(self, application_id: str, api_key: str):
         self.client = SearchClient(application_id, api_key)
 
+    async def search(self, index_name: str, query: str, options: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return await self.search_single_index(index_name, query, options)
+
     async def search_single_index(
         self,
         index_name: str,
@@ -64,7 +68,7 @@ class SearchService:
 
     async def save_objects(self, index_name: str, objects: List[Dict[str, Any]]) -> Any:
         objects_with_id = [{**obj, 'objectID': obj['uuid']} for obj in objects]
-        return await self.client.save_objects(index_name, {'objects': objects_with_id})
+        return await self.client.save_objects(index_name, objects_with_id)
 
     async def get_object(
         self,
@@ -93,6 +97,9 @@ class SearchService:
     async def delete_object(self, index_name: str, object_id: str) -> Any:
         return await self.client.delete_object(index_name, object_id)
 
+    async def delete_objects(self, index_name: str, object_ids: List[str]) -> Any:
+        return await self.client.delete_objects(index_name, object_ids)
+
     async def delete_by(self, index_name: str, filters: str) -> Any:
         return await self.client.delete_by(index_name, delete_by_params={'filters': filters})
 
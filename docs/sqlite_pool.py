@@ -0,0 +1,77 @@
+import os
+import asyncio
+import sqlite3
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, Optional, Sequence, TypeVar
+
+SQLITE_READERS = int(os.getenv('SQLITE_READERS', '4'))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+# Bound parameters per statement, SQLite builds before 3.32 allow at most 999
+SQLITE_MAX_VARIABLES = 999
+
+T = TypeVar('T')
+
+class AsyncSQLite:
+    # SQLite in WAL mode behind the event loop: one writer connection on its own thread and a pool
+    # of read connections, one per reader thread. WAL lets the readers run while a write is in progress.
+    def __init__(self, db_path: str, readers: int = SQLITE_READERS):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self.writer = ThreadPoolExecutor(1, thread_name_prefix='sqlite-writer', initializer=self._open)
+        self.readers = ThreadPoolExecutor(max(1, readers), thread_name_prefix='sqlite-reader', initializer=self._open)
+
+        # WAL is a property of the database file, set once before any reader opens it
+        self.writer.submit(lambda: self._local.conn.execute('PRAGMA journal_mode=WAL')).result()
+
+    def _open(self) -> None:
+        conn = sqlite3.connect(self.db_path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f'PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        self._local.conn = conn
+        with self._lock:
+            self._connections.append(conn)
+
+    def _call(self, fn: Callable[..., T], *args: Any) -> T:
+        return fn(self._local.conn, *args)
+
+    def _transaction(self, fn: Callable[..., T], *args: Any) -> T:
+        conn = self._local.conn
+        with conn:
+            return fn(conn, *args)
+
+    async def read(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run fn(conn, *args) on a read connection"""
+        return await asyncio.get_running_loop().run_in_executor(self.readers, partial(self._call, fn, *args))
+
+    async def write(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run fn(conn, *args) in a transaction on the writer connection"""
+        return await asyncio.get_running_loop().run_in_executor(self.writer, partial(self._transaction, fn, *args))
+
+    def write_sync(self, fn: Callable[..., T], *args: Any) -> T:
+        """Blocking write for setup code that runs outside the event loop"""
+        return self.writer.submit(self._transaction, fn, *args).result()
+
+    async def fetchone(self, sql: str, params: Sequence[Any] = ()) -> Optional[sqlite3.Row]:
+        return await self.read(lambda conn: conn.execute(sql, params).fetchone())
+
+    async def fetchall(self, sql: str, params: Sequence[Any] = ()) -> List[sqlite3.Row]:
+        return await self.read(lambda conn: conn.execute(sql, params).fetchall())
+
+    async def execute(self, sql: str, params: Sequence[Any] = ()) -> sqlite3.Cursor:
+        return await self.write(lambda conn: conn.execute(sql, params))
+
+    async def executemany(self, sql: str, params: Iterable[Sequence[Any]]) -> sqlite3.Cursor:
+        return await self.write(lambda conn: conn.executemany(sql, params))
+
+    def close(self) -> None:
+        self.writer.shutdown()
+        self.readers.shutdown()
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
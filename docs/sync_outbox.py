@@ -0,0 +1,260 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
+from sqlite_pool import AsyncSQLite
+
+if TYPE_CHECKING:
+    from embedding_store import EmbeddingStore
+
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '100'))
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', '1'))
+OUTBOX_BACKOFF_BASE = float(os.getenv('OUTBOX_BACKOFF_BASE', '2'))
+OUTBOX_BACKOFF_MAX = float(os.getenv('OUTBOX_BACKOFF_MAX', '300'))
+# Failed attempts after which an entry is parked in sync_outbox_parked instead of retried again
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '10'))
+
+UPSERT = 'upsert'
+DELETE = 'delete'
+
+# Bits of sync_outbox.synced_targets, every target is synced and retried on its own
+SEARCH_TARGET = 1
+VECTOR_TARGET = 2
+
+def enqueue(conn: sqlite3.Connection, operations: Iterable[Tuple[str, str]]) -> None:
+    # Called inside the transaction that changes the documents, so the outbox never misses a change
+    now = time.time()
+    conn.executemany(
+        'INSERT INTO sync_outbox (uuid, operation, created_at, available_at) VALUES (?, ?, ?, ?)',
+        [(uuid, operation, now, now) for uuid, operation in operations]
+    )
+
+class OutboxWorker:
+    # Drains sync_outbox into Algolia and Qdrant in the background. Entries for the same uuid are
+    # coalesced into the last operation and upserts send the row as it is when the batch runs.
+    # Algolia and Qdrant are synced independently: when one of them fails, the entries remember the
+    # targets that succeeded and only the failed one is retried, with exponential backoff. Entries
+    # stay in the outbox until synced to both or, after max_attempts failed batches, are parked in
+    # sync_outbox_parked until requeue_parked(). A uuid is never synced out of order: a due entry
+    # takes every other pending entry of its uuid with it, a uuid is parked as a whole and parked
+    # entries go away once a newer entry of their uuid is synced, or come back with their old ids.
+    def __init__(
+        self,
+        db: AsyncSQLite,
+        search_service: Any,
+        vector_service: Any,
+        embedding_store: Optional['EmbeddingStore'] = None,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        poll_interval: float = OUTBOX_POLL_INTERVAL,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS
+    ):
+        self.db = db
+        self.search_service = search_service
+        self.vector_service = vector_service
+        self.embedding_store = embedding_store
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.task: Optional[asyncio.Task] = None
+        # The background loop and explicit flushes never take the same entries at once
+        self._drain_lock = asyncio.Lock()
+        self.synced = 0
+        self.coalesced = 0
+        self.failed_batches = 0
+        self.parked = 0
+        self.last_error: Optional[str] = None
+        self.last_sync_at: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    async def drain_once(self) -> int:
+        """Sync one batch of due entries, returning how many entries were taken"""
+        async with self._drain_lock:
+            return await self._drain()
+
+    async def _drain(self) -> int:
+        now = time.time()
+        # Entries of the same uuid still waiting for their backoff are coalesced with the due one,
+        # so an older failed operation can never be retried after a newer one was synced
+        entries = await self.db.fetchall('''
+            SELECT id, uuid, operation, attempts, synced_targets FROM sync_outbox
+            WHERE uuid IN (SELECT uuid FROM sync_outbox WHERE available_at <= ? ORDER BY id LIMIT ?)
+            ORDER BY id
+        ''', (now, self.batch_size))
+        if not entries:
+            return 0
+
+        # The last entry of a uuid decides its operation and the targets it still needs
+        operations: Dict[str, Tuple[str, int]] = {}
+        for entry in entries:
+            operations.pop(entry['uuid'], None)
+            operations[entry['uuid']] = (entry['operation'], entry['synced_targets'])
+        self.coalesced += len(entries) - len(operations)
+        ids = [entry['id'] for entry in entries]
+
+        synced, errors = await self._sync(operations)
+
+        if errors:
+            error = '; '.join(errors)
+            self.failed_batches += 1
+            self.last_error = error
+            parked = await self.db.write(self._reschedule, entries, error, self.max_attempts, synced)
+            self.parked += parked
+            print(f"Outbox sync failed, retrying {len(ids) - parked} entries later{f' and parking {parked}' if parked else ''}:", error)
+            return len(entries)
+
+        def delete_synced(conn: sqlite3.Connection) -> None:
+            conn.executemany('DELETE FROM sync_outbox WHERE id = ?', [(id,) for id in ids])
+            # Parked entries of a uuid are superseded by the newer entry just synced
+            conn.executemany('DELETE FROM sync_outbox_parked WHERE uuid = ? AND id < ?', [(entry['uuid'], entry['id']) for entry in entries])
+
+        await self.db.write(delete_synced)
+        self.synced += len(operations)
+        self.last_sync_at = time.time()
+        return len(entries)
+
+    async def _sync(self, operations: Dict[str, Tuple[str, int]]) -> Tuple[int, List[str]]:
+        # Syncs every target that still misses some of the operations, returns the targets that
+        # succeeded as synced_targets bits and the errors of the ones that failed
+        upserts = [uuid for uuid, (operation, _) in operations.items() if operation == UPSERT]
+        rows = []
+        if upserts:
+            placeholders = ', '.join('?' * len(upserts))
+            rows = await self.db.fetchall(f'SELECT uuid, text, metadata FROM documents WHERE uuid IN ({placeholders})', upserts)
+        documents = {row['uuid']: (row['text'], json.loads(row['metadata'])) for row in rows}
+
+        synced = 0
+        errors = []
+        for target, sync in ((SEARCH_TARGET, self._sync_search), (VECTOR_TARGET, self._sync_vectors)):
+            pending = {uuid: operation for uuid, (operation, targets) in operations.items() if not targets & target}
+            try:
+                await sync(
+                    [(uuid, *documents[uuid]) for uuid, operation in pending.items() if operation == UPSERT and uuid in documents],
+                    [uuid for uuid, operation in pending.items() if operation == DELETE]
+                )
+                synced |= target
+            except Exception as error:
+                errors.append(str(error))
+        return synced, errors
+
+    async def _sync_search(self, documents: List[Tuple[str, str, Dict[str, Any]]], deletes: List[str]) -> None:
+        if documents:
+            await self.search_service.save_objects('documents', [
+                {'objectID': uuid, 'text': text, **metadata, 'uuid': uuid}
+                for uuid, text, metadata in documents
+            ])
+        if deletes:
+            await self.search_service.delete_objects('documents', deletes)
+
+    async def _sync_vectors(self, documents: List[Tuple[str, str, Dict[str, Any]]], deletes: List[str]) -> None:
+        # Stored embeddings are reused for unchanged texts
+        if documents:
+            points = [
+                {'id': uuid, 'text': text, 'metadata': {'text': text, **metadata, 'uuid': uuid}}
+                for uuid, text, metadata in documents
+            ]
+            if self.embedding_store:
+                embeddings = await self.embedding_store.embed([(uuid, text) for uuid, text, _ in documents])
+                for point, embedding in zip(points, embeddings):
+                    point['embedding'] = embedding
+            await self.vector_service.add_points('documents', points)
+        if deletes:
+            await self.vector_service.delete_points('documents', deletes)
+
+    @staticmethod
+    def _reschedule(
+        conn: sqlite3.Connection,
+        entries: List[sqlite3.Row],
+        error: str,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+        synced_targets: int = 0
+    ) -> int:
+        # Entries remember the targets synced in this batch, those out of attempts move to
+        # sync_outbox_parked, returns how many were parked
+        now = time.time()
+        conn.executemany(
+            'UPDATE sync_outbox SET attempts = ?, available_at = ?, last_error = ?, synced_targets = synced_targets | ? WHERE id = ?',
+            [
+                (
+                    entry['attempts'] + 1,
+                    now + min(OUTBOX_BACKOFF_BASE ** (entry['attempts'] + 1), OUTBOX_BACKOFF_MAX),
+                    error,
+                    synced_targets,
+                    entry['id']
+                )
+                for entry in entries
+            ]
+        )
+        # A uuid is parked with all its entries, so none of them can be synced ahead of the others
+        exhausted = {entry['uuid'] for entry in entries if entry['attempts'] + 1 >= max_attempts}
+        parked = [(now, entry['id']) for entry in entries if entry['uuid'] in exhausted]
+        if parked:
+            conn.executemany('''
+                INSERT INTO sync_outbox_parked (id, uuid, operation, created_at, attempts, last_error, parked_at)
+                SELECT id, uuid, operation, created_at, attempts, last_error, ? FROM sync_outbox WHERE id = ?
+            ''', parked)
+            conn.executemany('DELETE FROM sync_outbox WHERE id = ?', [(id,) for _, id in parked])
+        return len(parked)
+
+    async def requeue_parked(self) -> int:
+        """Move every parked entry back into the outbox with a fresh attempt count"""
+        def requeue(conn: sqlite3.Connection) -> int:
+            # Entries keep their ids, so they stay ordered before newer entries of the same uuid
+            conn.execute(
+                'INSERT INTO sync_outbox (id, uuid, operation, created_at, available_at) '
+                'SELECT id, uuid, operation, created_at, ? FROM sync_outbox_parked',
+                (time.time(),)
+            )
+            return conn.execute('DELETE FROM sync_outbox_parked').rowcount
+
+        return await self.db.write(requeue)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                taken = await self.drain_once()
+            except Exception as error:
+                print('Outbox worker error:', error)
+                taken = 0
+            if taken < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    def start(self) -> asyncio.Task:
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+        return self.task
+
+    async def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def flush(self) -> None:
+        """Sync every entry that is due now, e.g. before a short-lived script exits"""
+        while await self.drain_once():
+            pass
+
+    async def metrics(self) -> Dict[str, Any]:
+        row = await self.db.fetchone(
+            'SELECT COUNT(*) AS pending, MIN(created_at) AS oldest, SUM(attempts > 0) AS retrying, '
+            '(SELECT COUNT(*) FROM sync_outbox_parked) AS parked FROM sync_outbox'
+        )
+        return {
+            'pending': row['pending'],
+            'retrying': row['retrying'] or 0,
+            'parked': row['parked'],
+            'lag_seconds': round(time.time() - row['oldest'], 3) if row['oldest'] is not None else 0.0,
+            'synced': self.synced,
+            'coalesced': self.coalesced,
+            'failed_batches': self.failed_batches,
+            'last_error': self.last_error,
+            'last_sync_at': self.last_sync_at
+        }
@@ -0,0 +1,80 @@
+import json
+import pytest
+from text_service import IDoc
+from compact_doc import DocInterner, LazyDoc, metadata_to_dict
+
+def make_doc(chunk_index: int) -> IDoc:
+    return IDoc(text=f'chunk {chunk_index}', metadata={
+        'tokens': 10 + chunk_index,
+        'headers': {'h1': ['Title'], 'h2': ['Section']},
+        'urls': [],
+        'images': [],
+        'source': 'article.md',
+        'source_uuid': 'source-1',
+        'screenshots': ['a.png'],
+        'uuid': f'uuid-{chunk_index}',
+        'chunk_index': chunk_index
+    })
+
+def test_compact_docs_share_source_metadata_and_headers():
+    interner = DocInterner()
+    docs = [make_doc(index) for index in range(3)]
+    compact = interner.compact_many(docs)
+
+    assert compact == docs
+    assert [doc.to_idoc() for doc in compact] == docs
+    assert compact[0].metadata.shared is compact[2].metadata.shared
+    assert compact[0].metadata.fields['headers'] is compact[1].metadata.fields['headers']
+    assert json.loads(json.dumps(compact[1].metadata.to_dict())) == docs[1].metadata
+    with pytest.raises(AttributeError):
+        compact[0].extra = 'value'
+
+def test_compact_metadata_writes_stay_in_the_chunk():
+    first, second = DocInterner().compact_many([make_doc(0), make_doc(1)])
+
+    first.metadata['source'] = 'renamed.md'
+    del first.metadata['screenshots']
+    del first.metadata['uuid']
+
+    assert first['metadata']['source'] == 'renamed.md'
+    assert 'screenshots' not in first.metadata and 'uuid' not in first.metadata
+    assert first.metadata.get('source_uuid') == 'source-1'
+    assert second.metadata['source'] == 'article.md'
+    assert second.metadata['screenshots'] == ['a.png']
+    assert len(first.metadata) == len(second.metadata) - 2
+    with pytest.raises(KeyError):
+        del first.metadata['uuid']
+
+def test_mutating_a_chunk_leaves_its_siblings_unchanged():
+    first, second = DocInterner().compact_many([make_doc(0), make_doc(1)])
+
+    first.metadata['screenshots'].append('b.png')
+    first.metadata['headers']['h2'].append('Subsection')
+    first.metadata['headers']['h3'] = ['Details']
+
+    assert first.metadata['screenshots'] == ['a.png', 'b.png']
+    assert first.metadata['headers'] == {'h1': ['Title'], 'h2': ['Section', 'Subsection'], 'h3': ['Details']}
+    assert second.metadata['screenshots'] == ['a.png']
+    assert second.metadata['headers'] == {'h1': ['Title'], 'h2': ['Section']}
+    assert second.to_dict() == {'text': 'chunk 1', 'metadata': make_doc(1).metadata}
+
+def test_compact_docs_serialize_through_to_dict():
+    doc = make_doc(0)
+    compact = DocInterner().compact_doc(doc)
+
+    assert json.loads(json.dumps(compact.metadata['headers'])) == doc.metadata['headers']
+    assert json.loads(json.dumps(dict(compact.metadata))) == doc.metadata
+    assert json.loads(json.dumps(compact.to_dict())) == {'text': doc.text, 'metadata': doc.metadata}
+    assert json.loads(json.dumps(metadata_to_dict(compact.metadata))) == doc.metadata
+    assert metadata_to_dict(doc.metadata) is doc.metadata
+
+def test_lazy_doc_decodes_metadata_on_first_access():
+    doc = LazyDoc('text', json.dumps({'uuid': 'a', 'chunk_index': 0}))
+    assert doc._metadata is None
+    assert doc['text'] == 'text'
+    assert doc.metadata['uuid'] == 'a'
+    assert doc.metadata is doc.metadata
+    assert doc.to_idoc() == IDoc(text='text', metadata={'uuid': 'a', 'chunk_index': 0})
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,34 @@
+import pytest
+from text_service import IDoc
+from dedup_service import ChunkDeduplicator, EMBEDDING_BYTES
+
+FOOTER = ' '.join(f'Footer line {index} with navigation links, contact details and copyright notice.' for index in range(12))
+
+def make_docs():
+    docs = [IDoc(text=f'Section {index}. ' + ' '.join(f'topic{index}-{word}' for word in range(80)), metadata={'uuid': f'section-{index}'}) for index in range(5)]
+    docs.append(IDoc(text=FOOTER, metadata={'uuid': 'footer-1'}))
+    docs.append(IDoc(text=FOOTER.replace('copyright notice', 'copyright notices', 1), metadata={'uuid': 'footer-2'}))
+    docs.append(IDoc(text=FOOTER, metadata={'uuid': 'footer-3'}))
+    return docs
+
+def test_deduplicate_links_near_duplicates_to_first_copy():
+    docs, report = ChunkDeduplicator(threshold=0.8).deduplicate(make_docs())
+
+    assert len(docs) == 8
+    assert [doc.metadata.get('duplicate_of') for doc in docs[-3:]] == [None, 'footer-1', 'footer-1']
+    assert docs[-1].metadata['duplicate_similarity'] == 1.0
+    assert all('duplicate_of' not in doc.metadata for doc in docs[:5])
+    assert report.duplicate_chunks == report.embedding_calls_saved == 2
+    assert report.index_bytes_saved > 2 * EMBEDDING_BYTES
+
+def test_deduplicate_drops_duplicates_across_calls():
+    deduplicator = ChunkDeduplicator(threshold=0.8)
+    first, _ = deduplicator.deduplicate(make_docs()[:6], link=False)
+    second, report = deduplicator.deduplicate(make_docs()[6:], link=False)
+
+    assert len(first) == 6
+    assert second == []
+    assert report.total_chunks == report.duplicate_chunks == 2
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,105 @@
+import json
+import numpy as np
+import pytest
+from embedding_store import EmbeddingStore, embedding_batches
+from text_service import IDoc
+from database_service import DatabaseService
+
+DIMENSION = 8
+
+class FakeOpenAIService:
+    def __init__(self):
+        self.embedded = []
+        self.requests = []
+
+    async def create_embeddings(self, texts):
+        self.embedded.extend(texts)
+        self.requests.append(list(texts))
+        return [np.random.default_rng(len(text)).normal(0, 1, DIMENSION).tolist() for text in texts]
+
+class FakeVectorService:
+    def __init__(self):
+        self.openai_service = FakeOpenAIService()
+        self.points = {}
+
+    async def add_points(self, collection_name, points):
+        for point in points:
+            self.points[point['id']] = point
+
+def count_words(texts):
+    return [len(text.split()) for text in texts]
+
+@pytest.mark.asyncio
+async def test_embeddings_are_reused_until_the_text_changes(db):
+    openai_service = FakeOpenAIService()
+    store = EmbeddingStore(db, openai_service)
+
+    first = await store.embed([('a', 'alpha'), ('b', 'beta')])
+    again = await store.embed([('a', 'alpha'), ('b', 'beta changed')])
+
+    assert openai_service.embedded == ['alpha', 'beta', 'beta changed']
+    assert np.allclose(again[0], first[0])
+    assert store.reused == 1
+    assert store.embedded == 3
+    row = await db.fetchone("SELECT LENGTH(vector) AS size FROM document_embeddings WHERE uuid = 'a'")
+    assert row['size'] == DIMENSION * 4
+
+@pytest.mark.asyncio
+async def test_float16_embeddings_take_half_the_space(db):
+    store = EmbeddingStore(db, FakeOpenAIService(), dtype='float16')
+    [created] = await store.embed([('a', 'alpha')])
+    [stored] = await store.embed([('a', 'alpha')])
+
+    assert np.allclose(stored, created, rtol=1e-3, atol=1e-3)
+    row = await db.fetchone("SELECT LENGTH(vector) AS size FROM document_embeddings WHERE uuid = 'a'")
+    assert row['size'] == DIMENSION * 2
+
+@pytest.mark.asyncio
+async def test_embeddings_follow_document_uuid_changes_and_deletes(db):
+    openai_service = FakeOpenAIService()
+    store = EmbeddingStore(db, openai_service)
+    await db.execute('INSERT INTO documents (uuid, text, metadata) VALUES (?, ?, ?)', ('a', 'alpha', json.dumps({})))
+    await store.embed([('a', 'alpha')])
+
+    await db.execute("UPDATE documents SET uuid = 'b' WHERE uuid = 'a'")
+    await store.embed([('b', 'alpha')])
+    assert openai_service.embedded == ['alpha']
+
+    await db.execute("DELETE FROM documents WHERE uuid = 'b'")
+    assert (await db.fetchone('SELECT COUNT(*) AS count FROM document_embeddings'))['count'] == 0
+
+def test_embedding_batches_respect_item_and_token_caps():
+    assert embedding_batches([1, 1, 1, 1, 1], 2, 100) == [range(0, 2), range(2, 4), range(4, 5)]
+    assert embedding_batches([4, 4, 9, 1, 1], 10, 8) == [range(0, 2), range(2, 3), range(3, 5)]
+    assert embedding_batches([], 2, 8) == []
+
+@pytest.mark.asyncio
+async def test_missing_embeddings_are_requested_in_capped_batches(db):
+    openai_service = FakeOpenAIService()
+    store = EmbeddingStore(db, openai_service, batch_size=4, batch_tokens=6, count_tokens=count_words)
+    documents = [(f'uuid-{index}', ' '.join(['word'] * (1 + index % 3)) + f' {index}') for index in range(10)]
+
+    embeddings = await store.embed(documents)
+
+    assert len(openai_service.requests) > 2
+    assert all(len(request) <= 4 and sum(count_words(request)) <= 6 for request in openai_service.requests)
+    assert openai_service.embedded == [text for _, text in documents]
+    reopened = FakeOpenAIService()
+    assert np.allclose(await EmbeddingStore(db, reopened).embed(documents), embeddings)
+    assert reopened.requests == []
+
+@pytest.mark.asyncio
+async def test_reindex_splits_a_page_larger_than_the_batch_cap(tmp_path):
+    vector_service = FakeVectorService()
+    service = DatabaseService(str(tmp_path / 'documents.db'), vector_service=vector_service)
+    service.embedding_store.batch_size = 3
+    await service.insert_documents([IDoc(text=f'text {index}', metadata={'uuid': f'uuid-{index}', 'source_uuid': 's'}) for index in range(10)])
+
+    assert await service.reindex_vectors(page_size=8) == 10
+    requests = vector_service.openai_service.requests
+    assert [len(request) for request in requests] == [3, 3, 2, 2]
+    assert set(vector_service.points) == {f'uuid-{index}' for index in range(10)}
+    service.db.close()
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,69 @@
+import json
+import pytest
+from sqlite_pool import AsyncSQLite
+from fulltext_backend import FullTextBackend, FTS5Backend
+
+def create_schema(conn):
+    # Same tables and insert trigger as DatabaseService
+    conn.execute('''
+        CREATE TABLE documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            uuid TEXT NOT NULL UNIQUE,
+            source_uuid TEXT NOT NULL,
+            text TEXT NOT NULL,
+            metadata TEXT NOT NULL
+        )
+    ''')
+    conn.execute("CREATE VIRTUAL TABLE documents_search USING fts5(text, metadata, tokenize='porter unicode61')")
+    conn.execute('''
+        CREATE TRIGGER documents_ai AFTER INSERT ON documents BEGIN
+            INSERT INTO documents_search(rowid, text, metadata) VALUES (new.id, new.text, new.metadata);
+        END
+    ''')
+
+@pytest.fixture
+def backend(tmp_path):
+    db = AsyncSQLite(str(tmp_path / 'search.db'))
+    db.write_sync(create_schema)
+    documents = [
+        ('a1', 'source-a', 'Vector databases store embeddings for semantic search.', 'text/markdown'),
+        ('a2', 'source-a', 'Full-text search ranks documents with BM25.', 'text/markdown'),
+        ('b1', 'source-b', 'Search search search: BM25 ranking in SQLite FTS5.', 'text/plain'),
+        ('b2', 'source-b', 'Cooking pasta takes ten minutes.', 'text/plain')
+    ]
+    db.write_sync(lambda conn: conn.executemany(
+        'INSERT INTO documents (uuid, source_uuid, text, metadata) VALUES (?, ?, ?, ?)',
+        [(uuid, source, text, json.dumps({'uuid': uuid, 'source_uuid': source, 'mime_type': mime_type})) for uuid, source, text, mime_type in documents]
+    ))
+    yield FTS5Backend(db)
+    db.close()
+
+@pytest.mark.asyncio
+async def test_fts5_search_ranks_with_bm25(backend):
+    hits = await backend.search('documents', 'search ranking')
+
+    assert [hit['objectID'] for hit in hits] == ['b1', 'a2', 'a1']
+    assert hits[0]['source_uuid'] == 'source-b'
+    assert hits[0]['text'].startswith('Search search')
+
+@pytest.mark.asyncio
+async def test_fts5_search_applies_source_uuid_filter(backend):
+    options = {'queryParameters': {'filters': 'source_uuid:source-a OR source_uuid:source-c'}}
+    hits = await backend.search('documents', 'search', options)
+    metadata_filter = {'queryParameters': {'filters': '(source_uuid:source-b) AND mime_type:text/plain'}}
+
+    assert sorted(hit['objectID'] for hit in hits) == ['a1', 'a2']
+    assert [hit['objectID'] for hit in await backend.search('documents', 'search', metadata_filter)] == ['b1']
+    assert await backend.search('documents', '!!!') == []
+    with pytest.raises(ValueError):
+        FTS5Backend.translate_filters('tokens > 10')
+
+def test_backend_without_search_fails_on_instantiation():
+    class Incomplete(FullTextBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+import local_vector_service
+from local_vector_service import LocalCollection, LocalVectorService, matches_filter
+
+DIMENSION = 8
+
+class FakeEmbeddings:
+    # Deterministic embeddings, texts sharing a first word get nearby vectors
+    def _embed(self, text: str):
+        rng = np.random.default_rng(sum(map(ord, text.split()[0])))
+        noise = np.random.default_rng(sum(map(ord, text))).normal(0, 0.05, DIMENSION)
+        return (rng.normal(0, 1, DIMENSION) + noise).tolist()
+
+    async def create_embedding(self, text: str):
+        return self._embed(text)
+
+    async def create_embeddings(self, texts):
+        return [self._embed(text) for text in texts]
+
+def brute_force(vectors, query, limit):
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = normalized @ (query / np.linalg.norm(query))
+    return list(np.argsort(-scores, kind='stable')[:limit])
+
+def test_collection_search_matches_brute_force_and_survives_reopen(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(0, 1, (200, DIMENSION)).astype(np.float32)
+    payloads = [{'source_uuid': f'source-{index % 3}', 'index': index} for index in range(200)]
+    collection = LocalCollection(str(tmp_path), 'documents', DIMENSION)
+    collection.upsert([f'id-{index}' for index in range(200)], vectors, payloads)
+    query = rng.normal(0, 1, DIMENSION)
+
+    assert [row for row, _ in collection.search(query, 10)] == brute_force(vectors, query, 10)
+
+    source_filter = {'should': [{'key': 'source_uuid', 'match': {'value': 'source-1'}}]}
+    rows = [row for row, _ in collection.search(query, 5, source_filter)]
+    subset = [index for index in range(200) if index % 3 == 1]
+    assert rows == [subset[index] for index in brute_force(vectors[subset], query, 5)]
+
+    collection.upsert(['id-0'], vectors[1:2], [{'source_uuid': 'source-0', 'index': 'updated'}])
+    collection.delete('id-2')
+    reopened = LocalCollection(str(tmp_path), 'documents', DIMENSION)
+    assert len(reopened.rows) == 199 and 'id-2' not in reopened.rows
+    assert reopened.payloads[reopened.rows['id-0']]['index'] == 'updated'
+
+    reopened.compact()
+    assert reopened.matrix.shape == (199, DIMENSION)
+    assert [reopened.ids[row] for row, _ in reopened.search(vectors[1], 2)] == ['id-1', 'id-0']
+
+def test_filter_mask_matches_payload_filter(tmp_path):
+    rng = np.random.default_rng(1)
+    payloads = [{'source_uuid': f'source-{index % 4}', 'tags': ['a'] if index % 2 else ['b'], 'index': index} for index in range(40)]
+    payloads[5] = {'index': 5}
+    collection = LocalCollection(str(tmp_path), 'documents', DIMENSION)
+    collection.upsert([f'id-{index}' for index in range(40)], rng.normal(0, 1, (40, DIMENSION)), payloads)
+    collection.delete('id-7')
+    filters = [
+        {'must': [{'key': 'source_uuid', 'match': {'any': ['source-1', 'source-2']}}]},
+        {'must_not': [{'key': 'source_uuid', 'match': {'value': 'source-0'}}]},
+        {'must': [{'key': 'source_uuid', 'match': {'except': ['source-3']}}], 'should': [{'key': 'tags', 'match': {'value': ['a']}}]},
+        {'should': [{'must': [{'key': 'index', 'match': {'value': 4}}]}, {'key': 'source_uuid', 'match': {'value': None}}]}
+    ]
+
+    for filter in filters:
+        expected = [row for row in sorted(collection.rows.values()) if matches_filter(collection.payloads[row], filter)]
+        assert sorted(row for row, _ in collection.search(rng.normal(0, 1, DIMENSION), 40, filter)) == expected
+    with pytest.raises(ValueError):
+        collection.search(rng.normal(0, 1, DIMENSION), 5, {'must': [{'key': 'index', 'match': {'range': 1}}]})
+
+def test_hnsw_index_is_updated_in_place(tmp_path, monkeypatch):
+    if local_vector_service.hnswlib is None:
+        pytest.skip('hnswlib is not installed')
+    monkeypatch.setattr(local_vector_service, 'HNSW_MIN_POINTS', 1)
+    rng = np.random.default_rng(2)
+    vectors = rng.normal(0, 1, (60, DIMENSION)).astype(np.float32)
+    collection = LocalCollection(str(tmp_path), 'documents', DIMENSION)
+    collection.upsert([f'id-{index}' for index in range(50)], vectors[:50], [{'index': index} for index in range(50)])
+
+    assert collection.search(vectors[3], 1)[0][0] == collection.rows['id-3']
+    index = collection.hnsw
+    collection.upsert([f'id-{index}' for index in range(50, 60)], vectors[50:], [{'index': index} for index in range(50, 60)])
+    collection.upsert(['id-3'], vectors[55:56], [{'index': 'moved'}])
+    collection.delete('id-4')
+
+    assert collection.hnsw is index
+    assert collection.search(vectors[57], 1)[0][0] == collection.rows['id-57']
+    assert {collection.ids[row] for row, _ in collection.search(vectors[55], 2)} == {'id-55', 'id-3'}
+    assert 'id-4' not in {collection.ids[row] for row, _ in collection.search(vectors[4], 59)}
+    assert len(collection.search(vectors[0], 100)) == 59
+
+@pytest.mark.asyncio
+async def test_local_vector_service_surface(tmp_path):
+    service = LocalVectorService(FakeEmbeddings(), str(tmp_path), DIMENSION)
+    await service.add_points('documents', [
+        {'id': 'a', 'text': 'apple pie recipe', 'metadata': {'source_uuid': 's1'}},
+        {'id': 'b', 'text': 'apple tart recipe', 'metadata': {'source_uuid': 's2'}},
+        {'id': 'c', 'text': 'rocket engines', 'metadata': {'source_uuid': 's1'}}
+    ])
+
+    results = await service.perform_search('documents', 'apple crumble', limit=2)
+    filtered = await service.perform_search('documents', 'apple crumble', {'must': [{'key': 'source_uuid', 'match': {'any': ['s2']}}]})
+    await service.delete_point('documents', 'a')
+
+    assert {result['metadata']['source_uuid'] for result in results} == {'s1', 's2'}
+    assert results[0]['text'].startswith('apple')
+    assert [result['text'] for result in filtered] == ['apple tart recipe']
+    assert [point['id'] for point in await service.get_all_points('documents')] == ['b', 'c']
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,56 @@
+import json
+import sqlite3
+import pytest
+from schema_migrations import SCHEMA_VERSION, build_filters, migrate
+
+@pytest.fixture
+def conn():
+    connection = sqlite3.connect(':memory:')
+    # Base documents table as created by DatabaseService before any migration
+    connection.execute('''
+        CREATE TABLE documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            uuid TEXT NOT NULL UNIQUE,
+            source_uuid TEXT NOT NULL,
+            text TEXT NOT NULL,
+            metadata TEXT NOT NULL
+        )
+    ''')
+    rows = [
+        ('a0', 'a', {'chunk_index': 0, 'mime_type': 'text/markdown', 'name': 'a.md'}),
+        ('a1', 'a', {'chunk_index': 1, 'mime_type': 'text/markdown', 'name': 'a.md'}),
+        ('b0', 'b', {'chunk_index': 0, 'mimeType': 'audio/mpeg', 'conversation_uuid': 'c1'})
+    ]
+    connection.executemany(
+        'INSERT INTO documents (uuid, source_uuid, text, metadata) VALUES (?, ?, ?, ?)',
+        [(uuid, source, uuid, json.dumps(metadata)) for uuid, source, metadata in rows]
+    )
+    connection.commit()
+    yield connection
+    connection.close()
+
+def select_uuids(conn, filters):
+    where, params = build_filters(filters)
+    return [row[0] for row in conn.execute(f'SELECT uuid FROM documents WHERE {where} ORDER BY id', params)]
+
+def test_migrate_adds_indexed_generated_columns_once(conn):
+    assert migrate(conn) == SCHEMA_VERSION
+    assert migrate(conn) == SCHEMA_VERSION
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+
+    assert conn.execute("SELECT chunk_index, mime_type, conversation_uuid FROM documents WHERE uuid = 'b0'").fetchone() == (0, 'audio/mpeg', 'c1')
+    for column in ('source_uuid', 'mime_type', 'conversation_uuid'):
+        plan = ' '.join(row[-1] for row in conn.execute(f'EXPLAIN QUERY PLAN SELECT * FROM documents WHERE {column} = ?', ('x',)))
+        assert 'USING INDEX' in plan
+
+def test_build_filters_pushes_metadata_filters_into_sql(conn):
+    migrate(conn)
+
+    assert select_uuids(conn, {'source_uuid': 'a', 'chunk_index': 1}) == ['a1']
+    assert select_uuids(conn, {'chunk_index': [0], 'mime_type': ['text/markdown', 'audio/mpeg']}) == ['a0', 'b0']
+    assert select_uuids(conn, {'name': 'a.md', 'conversation_uuid': None}) == ['a0', 'a1']
+    assert select_uuids(conn, {'name': []}) == []
+    assert select_uuids(conn, None) == ['a0', 'a1', 'b0']
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -1,5 +1,6 @@
 import pytest
 import os
+from algoliasearch.search.models import Action, BatchResponse
 from search_service import SearchService
 
 @pytest.fixture
@@ -71,5 +72,25 @@ async def test_search_single_index(search_service):
     except Exception as e:
         pytest.skip(f"Test skipped due to Algolia connection error: {str(e)}")
 
+@pytest.mark.asyncio
+async def test_save_objects_sends_every_object_in_one_batch(monkeypatch):
+    service = SearchService('test_app_id', 'test_api_key')
+    batches = []
+
+    async def batch(index_name, batch_write_params, request_options=None):
+        batches.append((index_name, batch_write_params))
+        return BatchResponse(task_id=1, object_ids=[request.body['objectID'] for request in batch_write_params.requests])
+
+    # The real SearchClient.save_objects chunks the objects, only the HTTP batch call is replaced
+    monkeypatch.setattr(service.client, 'batch', batch)
+    await service.save_objects('documents', [{'uuid': 'a', 'text': 'first'}, {'uuid': 'b', 'text': 'second'}])
+
+    assert [(index_name, [(request.action, request.body) for request in params.requests]) for index_name, params in batches] == [
+        ('documents', [
+            (Action.ADDOBJECT, {'uuid': 'a', 'text': 'first', 'objectID': 'a'}),
+            (Action.ADDOBJECT, {'uuid': 'b', 'text': 'second', 'objectID': 'b'})
+        ])
+    ]
+
 if __name__ == "__main__":
     pytest.main([__file__])
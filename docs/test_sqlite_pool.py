@@ -0,0 +1,45 @@
+import time
+import asyncio
+import pytest
+from sqlite_pool import AsyncSQLite
+
+@pytest.fixture
+def db(tmp_path):
+    database = AsyncSQLite(str(tmp_path / 'pool.db'), readers=2)
+    database.write_sync(lambda conn: conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)'))
+    yield database
+    database.close()
+
+@pytest.mark.asyncio
+async def test_reads_are_not_blocked_by_a_running_write(db):
+    await db.executemany('INSERT INTO items (name) VALUES (?)', [('a',), ('b',)])
+
+    def slow_write(conn):
+        conn.execute("INSERT INTO items (name) VALUES ('c')")
+        time.sleep(0.5)
+
+    write = asyncio.create_task(db.write(slow_write))
+    await asyncio.sleep(0.1)
+    started = time.perf_counter()
+    rows = await db.fetchall('SELECT name FROM items ORDER BY id')
+    elapsed = time.perf_counter() - started
+    await write
+
+    assert [row['name'] for row in rows] == ['a', 'b']
+    assert elapsed < 0.3
+    assert (await db.fetchone('SELECT COUNT(*) AS count FROM items'))['count'] == 3
+    assert (await db.fetchone('PRAGMA journal_mode'))[0] == 'wal'
+
+@pytest.mark.asyncio
+async def test_failed_write_rolls_back(db):
+    def failing_write(conn):
+        conn.execute("INSERT INTO items (name) VALUES ('a')")
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError):
+        await db.write(failing_write)
+
+    assert (await db.fetchone('SELECT COUNT(*) FROM items'))[0] == 0
+
+if __name__ == "__main__":
+    pytest.main([__file__])
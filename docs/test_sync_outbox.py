@@ -0,0 +1,238 @@
+import json
+import pytest
+from sync_outbox import OutboxWorker, enqueue, UPSERT, DELETE
+from text_service import IDoc
+from database_service import DatabaseService
+
+class FakeSearchService:
+    def __init__(self):
+        self.objects = {}
+        self.calls = 0
+        self.fail = False
+
+    async def save_objects(self, index_name, objects):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError('algolia is down')
+        for obj in objects:
+            self.objects[obj['objectID']] = obj
+
+    async def delete_objects(self, index_name, object_ids):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError('algolia is down')
+        for object_id in object_ids:
+            self.objects.pop(object_id, None)
+
+class FakeOpenAIService:
+    async def create_embeddings(self, texts):
+        return [[float(len(text)), 1.0] for text in texts]
+
+class FakeVectorService:
+    def __init__(self):
+        self.points = {}
+        self.openai_service = FakeOpenAIService()
+        self.calls = 0
+        self.fail = False
+
+    async def add_points(self, collection_name, points):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError('qdrant is down')
+        for point in points:
+            self.points[point['id']] = point
+
+    async def delete_points(self, collection_name, point_ids):
+        for point_id in point_ids:
+            self.points.pop(point_id, None)
+
+def write(conn, uuid, text, operation=UPSERT):
+    if operation == DELETE:
+        conn.execute('DELETE FROM documents WHERE uuid = ?', (uuid,))
+    else:
+        conn.execute(
+            'INSERT INTO documents (uuid, text, metadata) VALUES (?, ?, ?) ON CONFLICT(uuid) DO UPDATE SET text = excluded.text',
+            (uuid, text, json.dumps({'uuid': uuid}))
+        )
+    enqueue(conn, [(uuid, operation)])
+
+@pytest.mark.asyncio
+async def test_repeated_changes_are_coalesced_into_one_sync(db):
+    search, vectors = FakeSearchService(), FakeVectorService()
+    worker = OutboxWorker(db, search, vectors, batch_size=10)
+    for text in ('one', 'two', 'three'):
+        await db.write(write, 'a', text)
+    await db.write(write, 'b', 'keep')
+    await db.write(write, 'c', 'gone')
+    await db.write(write, 'c', None, DELETE)
+
+    assert (await worker.metrics())['pending'] == 6
+    await worker.flush()
+
+    assert search.objects['a']['text'] == 'three'
+    assert set(search.objects) == {'a', 'b'}
+    assert set(vectors.points) == {'a', 'b'}
+    # One save_objects and one delete_objects call for the whole batch
+    assert search.calls == 2
+    metrics = await worker.metrics()
+    assert metrics['pending'] == 0
+    assert metrics['synced'] == 3
+    assert metrics['coalesced'] == 3
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_retried_with_backoff(db):
+    search, vectors = FakeSearchService(), FakeVectorService()
+    worker = OutboxWorker(db, search, vectors)
+    await db.write(write, 'a', 'text')
+
+    search.fail = True
+    await worker.drain_once()
+    entry = await db.fetchone('SELECT attempts, available_at, created_at, last_error FROM sync_outbox')
+    assert entry['attempts'] == 1
+    assert entry['available_at'] > entry['created_at']
+    assert entry['last_error'] == 'algolia is down'
+
+    # Not due yet, so nothing is taken
+    search.fail = False
+    assert await worker.drain_once() == 0
+    metrics = await worker.metrics()
+    assert metrics['pending'] == 1
+    assert metrics['retrying'] == 1
+    assert metrics['failed_batches'] == 1
+    assert metrics['lag_seconds'] >= 0
+
+    await db.execute('UPDATE sync_outbox SET available_at = 0')
+    await worker.flush()
+    assert 'a' in search.objects
+    assert (await worker.metrics())['pending'] == 0
+
+@pytest.mark.asyncio
+async def test_targets_are_synced_and_retried_independently(db):
+    search, vectors = FakeSearchService(), FakeVectorService()
+    worker = OutboxWorker(db, search, vectors)
+    await db.write(write, 'a', 'text')
+
+    # Algolia being down does not keep the document out of Qdrant
+    search.fail = True
+    await worker.drain_once()
+    assert set(vectors.points) == {'a'}
+    entry = await db.fetchone('SELECT attempts, last_error FROM sync_outbox')
+    assert tuple(entry) == (1, 'algolia is down')
+
+    # The retry only goes to Algolia
+    search.fail = False
+    await db.execute('UPDATE sync_outbox SET available_at = 0')
+    await worker.flush()
+    assert set(search.objects) == {'a'}
+    assert vectors.calls == 1
+
+    # And the other way round
+    vectors.fail = True
+    await db.write(write, 'b', 'text')
+    await worker.drain_once()
+    assert set(search.objects) == {'a', 'b'}
+    vectors.fail = False
+    await db.execute('UPDATE sync_outbox SET available_at = 0')
+    await worker.flush()
+    assert set(vectors.points) == {'a', 'b'}
+    assert search.calls == 3
+    assert (await worker.metrics())['pending'] == 0
+
+@pytest.mark.asyncio
+async def test_outbox_is_rolled_back_with_the_row_change(db):
+    def failing_write(conn):
+        write(conn, 'a', 'text')
+        raise RuntimeError('rollback')
+
+    with pytest.raises(RuntimeError):
+        await db.write(failing_write)
+    assert (await db.fetchone('SELECT COUNT(*) AS count FROM sync_outbox'))['count'] == 0
+
+@pytest.mark.asyncio
+async def test_entries_are_parked_after_max_attempts_and_can_be_requeued(db):
+    search, vectors = FakeSearchService(), FakeVectorService()
+    worker = OutboxWorker(db, search, vectors, max_attempts=2)
+    await db.write(write, 'a', 'text')
+
+    search.fail = True
+    for _ in range(2):
+        await db.execute('UPDATE sync_outbox SET available_at = 0')
+        await worker.drain_once()
+    assert await worker.drain_once() == 0
+    parked = await db.fetchone('SELECT uuid, operation, attempts, last_error FROM sync_outbox_parked')
+    assert tuple(parked) == ('a', UPSERT, 2, 'algolia is down')
+    metrics = await worker.metrics()
+    assert (metrics['pending'], metrics['parked']) == (0, 1)
+
+    search.fail = False
+    assert await worker.requeue_parked() == 1
+    await worker.flush()
+    assert 'a' in search.objects
+    metrics = await worker.metrics()
+    assert (metrics['pending'], metrics['parked']) == (0, 0)
+
+@pytest.mark.asyncio
+async def test_failed_older_entries_never_run_after_newer_ones(db):
+    search, vectors = FakeSearchService(), FakeVectorService()
+    worker = OutboxWorker(db, search, vectors, max_attempts=2)
+    await db.write(write, 'a', 'first')
+    await worker.flush()
+
+    # The delete fails and waits for its backoff while the document is written again
+    search.fail = True
+    await db.write(write, 'a', None, DELETE)
+    await worker.drain_once()
+    await db.write(write, 'a', 'second')
+    search.fail = False
+
+    # The due upsert takes the delete with it instead of leaving it to run later
+    await worker.drain_once()
+    assert search.objects['a']['text'] == 'second'
+    assert vectors.points['a']['text'] == 'second'
+    assert (await worker.metrics())['pending'] == 0
+
+    # A parked delete is superseded by the newer upsert that gets synced
+    search.fail = True
+    await db.write(write, 'a', None, DELETE)
+    for _ in range(2):
+        await db.execute('UPDATE sync_outbox SET available_at = 0')
+        await worker.drain_once()
+    assert (await worker.metrics())['parked'] == 1
+    search.fail = False
+    await db.write(write, 'a', 'third')
+    await worker.flush()
+    metrics = await worker.metrics()
+    assert (metrics['pending'], metrics['parked']) == (0, 0)
+    assert search.objects['a']['text'] == 'third'
+
+    # Requeued entries keep their place before newer entries of the same uuid
+    search.fail = True
+    await db.write(write, 'b', 'first')
+    for _ in range(2):
+        await db.execute('UPDATE sync_outbox SET available_at = 0')
+        await worker.drain_once()
+    search.fail = False
+    await db.write(write, 'b', None, DELETE)
+    assert await worker.requeue_parked() == 1
+    await worker.flush()
+    assert 'b' not in search.objects and 'b' not in vectors.points
+    assert (await worker.metrics())['pending'] == 0
+
+@pytest.mark.asyncio
+async def test_database_service_warns_without_worker_and_flushes_on_demand(tmp_path, capsys):
+    search, vectors = FakeSearchService(), FakeVectorService()
+    service = DatabaseService(str(tmp_path / 'documents.db'), search, vectors)
+    documents = [IDoc(text=text, metadata={'uuid': text, 'source_uuid': 's'}) for text in ('a', 'b')]
+
+    await service.insert_documents(documents[:1], True)
+    await service.insert_documents(documents[1:], True)
+    assert capsys.readouterr().out.count('outbox worker is not running') == 1
+    assert search.objects == {}
+
+    await service.flush_sync()
+    assert set(search.objects) == {'a', 'b'}
+    assert set(vectors.points) == {'a', 'b'}
+    service.db.close()
+
+if __name__ == "__main__":
+    pytest.main([__file__])
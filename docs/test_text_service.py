@@ -0,0 +1,214 @@
+import io
+import os
+import mmap
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from text_service import IDoc, TextService, TokenOffsetMap
+from chunk_cache import ChunkCache
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), '..', 'text-splitter')
+
+def load_corpus(file_name: str) -> str:
+    with open(os.path.join(CORPUS_DIR, file_name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+@pytest.fixture
+def text_service():
+    service = TextService()
+    try:
+        service._initialize_tokenizer()
+    except Exception as e:
+        pytest.skip(f"Test skipped because the tokenizer could not be loaded: {str(e)}")
+    return service
+
+def legacy_split(service: TextService, text: str, limit: int):
+    # Reference chunking that re-encodes every candidate slice, as split did before TokenOffsetMap
+    chunks = []
+    position = 0
+    overhead = service._count_tokens(service._format_for_tokenization('')) - service._count_tokens('')
+
+    while position < len(text):
+        end = min(position + int((len(text) - position) * limit / service._count_tokens(text[position:])), len(text))
+        tokens = service._count_tokens(text[position:end])
+        while tokens + overhead > limit and end > position:
+            end = service._find_new_chunk_end(text, position, end)
+            tokens = service._count_tokens(text[position:end])
+
+        adjusted_end = end
+        next_newline = text.find('\n', end)
+        prev_newline = text.rfind('\n', position, end)
+        for candidate, allowed in ((next_newline + 1, next_newline != -1), (prev_newline + 1, prev_newline > position)):
+            if allowed:
+                candidate_tokens = service._count_tokens(text[position:candidate])
+                if int(limit * 0.8) <= candidate_tokens <= limit:
+                    adjusted_end = candidate
+                    break
+
+        chunks.append((text[position:adjusted_end], service._count_tokens(text[position:adjusted_end])))
+        position = adjusted_end
+
+    return chunks
+
+@pytest.mark.parametrize('file_name', ['example_article.md', 'youtube_transcript.md'])
+def test_token_offset_map_counts_match_encoding(text_service, file_name):
+    text = load_corpus(file_name)
+    token_map = text_service._create_token_map(text)
+
+    for start in range(0, len(text), 997):
+        for end in (start + 1, start + 600, start + 4000, len(text)):
+            end = min(end, len(text))
+            assert token_map.count(start, end) == text_service._count_tokens(text[start:end])
+
+@pytest.mark.parametrize('segment_size', [1, 97, 4096])
+def test_parallel_token_map_matches_serial(text_service, segment_size):
+    text = load_corpus('example_article.md') + load_corpus('youtube_transcript.md') + '\n\n  indented\r\n\t\nżółw 😀\n'
+    serial = text_service._create_token_map(text)
+
+    with ThreadPoolExecutor(4) as executor:
+        parallel = TokenOffsetMap(text_service.tokenizer, text, serial.prefix, serial.suffix, executor, segment_size)
+
+    assert len(TokenOffsetMap._segments(text, segment_size)) > 1
+    assert parallel.offsets == serial.offsets
+    assert parallel.boundaries == serial.boundaries
+    assert parallel.token_index == serial.token_index
+
+def test_close_shuts_the_tokenize_executor_down(text_service):
+    text_service.tokenize_workers = 2
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr('text_service.TOKENIZE_SEGMENT_SIZE', 1)
+        text_service._create_token_map('first line\nsecond line\n')
+    executor = text_service.executor
+
+    text_service.close()
+
+    assert executor._shutdown
+    assert text_service.executor is None
+    text_service.close()
+
+def test_count_tokens_batch_matches_single_counts(text_service):
+    texts = [load_corpus('example_article.md')[:size] for size in (0, 1, 500, 5000)] + ['Zażółć gęślą jaźń']
+
+    assert text_service.count_tokens_batch(texts) == [text_service._count_tokens(text) for text in texts]
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('file_name', ['example_article.md', 'youtube_transcript.md'])
+@pytest.mark.parametrize('limit', [250, 1000, 2500])
+async def test_split_matches_legacy_chunking(text_service, file_name, limit):
+    text = load_corpus(file_name)
+
+    docs = await text_service.split(text, limit)
+    expected = legacy_split(text_service, text, limit)
+
+    assert [doc.metadata['tokens'] for doc in docs] == [tokens for _, tokens in expected]
+    assert [doc.text for doc in docs] == [
+        text_service._extract_urls_and_images(chunk)[0] for chunk, _ in expected
+    ]
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('file_name', ['example_article.md', 'youtube_transcript.md'])
+async def test_split_views_match_split(text_service, file_name):
+    text = load_corpus(file_name)
+
+    docs = await text_service.split(text, 250)
+    views = await text_service.split_views(text, 250)
+
+    assert [view.tokens for view in views] == [doc.metadata['tokens'] for doc in docs]
+    assert views[0].start == 0 and views[-1].end == len(text)
+    assert all(view.end == following.start for view, following in zip(views, views[1:]))
+    for view, doc in zip(views, docs):
+        headers = doc.metadata['headers']
+        assert view.header_path == tuple(headers[f'h{level}'][-1] for level in range(1, 7) if headers.get(f'h{level}'))
+        assert (view.text, view.urls, view.images) == (doc.text, doc.metadata['urls'], doc.metadata['images'])
+
+@pytest.mark.asyncio
+async def test_split_stream_matches_split_within_one_window(text_service):
+    text = load_corpus('example_article.md')
+
+    docs = await text_service.split(text, 1000, {'source': 'example_article.md'})
+    streamed = [doc async for doc in text_service.split_stream(io.StringIO(text), 1000, {'source': 'example_article.md'})]
+
+    assert streamed == docs
+
+@pytest.mark.asyncio
+async def test_split_stream_reads_mmap_in_bounded_windows(text_service, tmp_path):
+    text = load_corpus('youtube_transcript.md')
+    path = tmp_path / 'transcript.md'
+    path.write_text(text, encoding='utf-8')
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as source:
+        streamed = [doc async for doc in text_service.split_stream(source, 250, window_size=8192)]
+
+    assert all(doc.metadata['tokens'] <= 250 for doc in streamed)
+    assert ''.join(text_service.restore_placeholders(doc).text for doc in streamed) == text
+
+@pytest.mark.asyncio
+async def test_chunk_cache_returns_cached_chunks(text_service, tmp_path):
+    text = load_corpus('example_article.md')
+    text_service.cache = ChunkCache(str(tmp_path / 'chunk_cache.db'))
+
+    docs = await text_service.split(text, 250, {'source': 'a.md'})
+    cached = await text_service.split(text, 250, {'source': 'b.md'})
+    document = await text_service.document(text)
+    cached_document = await text_service.document(text, None, {'name': 'article'})
+
+    assert text_service.cache.hits == 2
+    assert [doc.text for doc in cached] == [doc.text for doc in docs]
+    assert [doc.metadata for doc in cached] == [{**doc.metadata, 'source': 'b.md'} for doc in docs]
+    assert cached_document == IDoc(text=document.text, metadata={**document.metadata, 'name': 'article'})
+
+    await text_service.split(text, 1000)
+    assert text_service.cache.misses == 3
+
+@pytest.mark.asyncio
+async def test_documents_count_only_uncached_texts_in_one_batch(text_service, tmp_path, monkeypatch):
+    texts = [load_corpus('example_article.md'), 'Zażółć gęślą jaźń', '# Title\n[link](https://example.com)']
+    text_service.cache = ChunkCache(str(tmp_path / 'chunk_cache.db'))
+    cached_document = await text_service.document(texts[0])
+    batches = []
+    count_tokens_batch = text_service.count_tokens_batch
+    monkeypatch.setattr(text_service, 'count_tokens_batch', lambda texts, model=None: batches.append(texts) or count_tokens_batch(texts, model))
+
+    docs = await text_service.documents([(text, {'index': index}) for index, text in enumerate(texts)])
+
+    assert batches == [texts[1:]]
+    assert docs[0] == IDoc(text=cached_document.text, metadata={**cached_document.metadata, 'index': 0})
+    assert [doc.metadata['tokens'] for doc in docs] == [text_service._count_tokens(text) for text in texts]
+
+def test_chunk_cache_evicts_least_recently_used(tmp_path):
+    cache = ChunkCache(str(tmp_path / 'chunk_cache.db'), max_bytes=250)
+    for key in ('a', 'b'):
+        cache.put(key, 'x' * 100)
+    cache.get('a')
+    cache.put('c', 'x' * 100)
+
+    assert cache.get('a') is not None
+    assert cache.get('b') is None
+    assert cache.get('c') is not None
+
+def test_restore_placeholders_resolves_every_placeholder_once(text_service):
+    urls = [f'https://example.com/{index}' for index in range(300)]
+    text = ' '.join(f'[link {index}]({{{{$url{index}}}}})' for index in range(300))
+    text += ' ![img]({{$img0}}) [missing]({{$url300}}) [padded]({{$url01}})'
+    doc = IDoc(text=text, metadata={'urls': urls, 'images': ['https://example.com/image.png']})
+
+    restored = text_service.restore_many([doc])[0]
+
+    assert '[link 0](https://example.com/0)' in restored.text
+    assert '[link 299](https://example.com/299)' in restored.text
+    assert '![img](https://example.com/image.png)' in restored.text
+    assert '[missing]({{$url300}})' in restored.text
+    assert '[padded]({{$url01}})' in restored.text
+    assert restored.metadata is doc.metadata
+
+def test_chunks_without_headers_get_their_own_headers_copy():
+    service = TextService()
+    first = service._chunk_headers({}, None, 0, 0, '# Title\n\nIntro')
+    second = service._chunk_headers(first, None, 0, 0, 'No headers here')
+
+    assert second == first == {'h1': ['Title']}
+    second['h1'].append('Edited')
+    second['h2'] = ['Added']
+    assert first == {'h1': ['Title']}
+
+if __name__ == "__main__":
+    pytest.main([__file__])
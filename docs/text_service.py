@@ -1,10 +1,35 @@
+import sys
+from pathlib import Path
 import os
 import re
 import json
-from typing import Dict, List, Optional, Any, TypedDict
+import codecs
+import inspect
+from bisect import bisect_left
+from itertools import accumulate, chain
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, AsyncIterator, Callable, TypedDict
+import regex
 import tiktoken
+sys.path.append(str(Path(__file__).resolve().parents[1]))  # repository root with the shared package
+from shared.tokenizer_registry import get_tokenizer
+from shared.markdown_outline import MarkdownOutline, HEADER_PATTERN, IMAGE_PATTERN, LINK_PATTERN
+from chunk_cache import ChunkCache
 from dataclasses import dataclass
 
+# Bump when a change to the chunking changes its output, so cached chunks from older versions are not reused
+SPLITTER_VERSION = '1'
+
+PLACEHOLDER_PATTERN = re.compile(r'\(\{\{\$(img|url)(\d+)\}\}\)')
+
+# Documents longer than TOKENIZE_SEGMENT_SIZE characters are tokenized in segments on
+# TOKENIZE_WORKERS threads, tiktoken and regex release the GIL while they work on a segment
+TOKENIZE_WORKERS = int(os.getenv('TOKENIZE_WORKERS', str(min(8, os.cpu_count() or 1))))
+TOKENIZE_SEGMENT_SIZE = int(os.getenv('TOKENIZE_SEGMENT_SIZE', str(4 * 1024 * 1024)))
+# A newline run ends the same regex piece with or without the text after it,
+# so the document can be cut after one that is followed by a non-space character
+SEGMENT_BOUNDARY_PATTERN = re.compile(r'\n(?=\S)')
+
 class Headers(TypedDict):
     __annotations__ = {
         'h1': List[str],
@@ -20,21 +45,179 @@ class IDoc:
     text: str
     metadata: Dict[str, Any]  # Will include: tokens, source, mimeType, name, source_uuid, conversation_uuid, uuid, duration, headers, urls, images, screenshots, chunk_index, total_chunks
 
+class TokenOffsetMap:
+    # Encodes a document once and counts the tokens of any formatted slice of it.
+    # Tokenizers split text into regex pieces before BPE, so a slice only differs
+    # from the document encoding around its edges: those few pieces are encoded
+    # again and the rest comes from the token offsets of the document encoding.
+    WINDOW = 256
+    SPACING = 32
+
+    def __init__(
+        self,
+        tokenizer: tiktoken.Encoding,
+        text: str,
+        prefix: str = '',
+        suffix: str = '',
+        executor: Optional[Executor] = None,
+        segment_size: int = TOKENIZE_SEGMENT_SIZE
+    ):
+        self.tokenizer = tokenizer
+        self.text = text
+        self.prefix = prefix
+        self.suffix = suffix
+        self.pattern = regex.compile(tokenizer._pat_str)
+
+        # Segments are cut between regex pieces, so their encodings joined together
+        # are the encoding of the whole document
+        segments = self._segments(text, segment_size) if executor else [(0, len(text))]
+        if len(segments) > 1:
+            scans = list(executor.map(self._scan, [text[start:end] for start, end in segments]))
+        else:
+            scans = [self._scan(text)]
+
+        # Byte offset of every token in the single encoding of the document
+        self.offsets = list(accumulate(chain.from_iterable(lengths for lengths, _ in scans), initial=0))
+        piece_ends = chain.from_iterable(
+            (segment_start + end for end in ends) for (segment_start, _), (_, ends) in zip(segments, scans)
+        )
+
+        # Piece boundaries right after a letter or digit, mapped to the index of the
+        # token that starts there. Cutting the text at such a boundary does not change
+        # how the pieces before it are split, so they are safe sync points.
+        self.boundaries: List[int] = []
+        self.token_index: Dict[int, int] = {}
+        is_ascii = text.isascii()
+        position = byte_position = index = 0
+        for end in piece_ends:
+            if end - position < self.SPACING or end == len(text) or not text[end - 1].isalnum():
+                continue
+            byte_position += end - position if is_ascii else len(text[position:end].encode('utf-8'))
+            position = end
+            index = bisect_left(self.offsets, byte_position, index)
+            self.boundaries.append(position)
+            self.token_index[position] = index
+
+        self.newlines = [match.start() for match in re.finditer('\n', text)]
+
+    def _scan(self, text: str) -> tuple[List[int], List[int]]:
+        # Byte length of every token and end of every regex piece of a segment
+        tokens = self.tokenizer.encode(text)
+        return list(map(len, self.tokenizer.decode_tokens_bytes(tokens))), [match.end() for match in self.pattern.finditer(text, concurrent=True)]
+
+    @staticmethod
+    def _segments(text: str, segment_size: int) -> List[tuple[int, int]]:
+        segments = []
+        start = 0
+        while len(text) - start > segment_size:
+            match = SEGMENT_BOUNDARY_PATTERN.search(text, start + segment_size)
+            if not match:
+                break
+            segments.append((start, match.end()))
+            start = match.end()
+        segments.append((start, len(text)))
+        return segments
+
+    def count(self, start: int, end: int) -> int:
+        if end - start > 2 * self.WINDOW:
+            head = self._head(start)
+            if head:
+                tail = self._tail(head[0], end)
+                if tail:
+                    return head[1] + self.token_index[tail[0]] - self.token_index[head[0]] + tail[1]
+        return len(self.tokenizer.encode(f"{self.prefix}{self.text[start:end]}{self.suffix}"))
+
+    def _head(self, start: int) -> Optional[tuple[int, int]]:
+        # Scan the prefixed window until its pieces line up with the document pieces
+        window = self.prefix + self.text[start:start + self.WINDOW]
+        shift = start - len(self.prefix)
+        for match in self.pattern.finditer(window):
+            if match.end() >= len(window):
+                break
+            position = shift + match.end()
+            if position > start and position in self.token_index:
+                return position, len(self.tokenizer.encode(window[:match.end()]))
+        return None
+
+    def _tail(self, start: int, end: int) -> Optional[tuple[int, int]]:
+        index = bisect_left(self.boundaries, end) - 1
+        if index < 0 or self.boundaries[index] < start:
+            return None
+        position = self.boundaries[index]
+        return position, len(self.tokenizer.encode(f"{self.text[position:end]}{self.suffix}"))
+
+    def find_newline(self, start: int) -> int:
+        index = bisect_left(self.newlines, start)
+        return self.newlines[index] if index < len(self.newlines) else -1
+
+    def rfind_newline(self, start: int, end: int) -> int:
+        index = bisect_left(self.newlines, end) - 1
+        return self.newlines[index] if index >= 0 and self.newlines[index] >= start else -1
+
+class ChunkView:
+    # A chunk as offsets into the document it was cut from. The placeholder text, urls and
+    # images are only built from the document when one of them is first accessed.
+    __slots__ = ('start', 'end', 'tokens', 'header_path', '_outline', '_extract', '_content')
+
+    def __init__(self, start: int, end: int, tokens: int, header_path: tuple[str, ...], outline: MarkdownOutline, extract: Callable[[str], tuple[str, List[str], List[str]]]):
+        self.start = start
+        self.end = end
+        self.tokens = tokens
+        self.header_path = header_path
+        self._outline = outline
+        self._extract = extract
+        self._content: Optional[tuple[str, List[str], List[str]]] = None
+
+    def _materialize(self) -> tuple[str, List[str], List[str]]:
+        if self._content is None:
+            placeholders = self._outline.placeholders(self.start, self.end)
+            self._content = placeholders or self._extract(self._outline.text[self.start:self.end])
+        return self._content
+
+    @property
+    def text(self) -> str:
+        return self._materialize()[0]
+
+    @property
+    def urls(self) -> List[str]:
+        return self._materialize()[1]
+
+    @property
+    def images(self) -> List[str]:
+        return self._materialize()[2]
+
+    def __iter__(self):
+        return iter((self.start, self.end, self.tokens, self.header_path))
+
+    def __repr__(self) -> str:
+        return f"ChunkView(start={self.start}, end={self.end}, tokens={self.tokens}, header_path={self.header_path!r})"
+
 class TextService:
     SPECIAL_TOKENS = {
         '<|im_start|>': 100264,
         '<|im_end|>': 100265,
         '<|im_sep|>': 100266
     }
+    TOKENIZATION_PREFIX = '<|im_start|>user\n'
+    TOKENIZATION_SUFFIX = '<|im_end|>\n<|im_start|>assistant<|im_end|>'
 
-    def __init__(self, model_name: str = 'gpt-4'):
+    def __init__(self, model_name: str = 'gpt-4', cache: Optional[ChunkCache] = None, tokenize_workers: int = TOKENIZE_WORKERS):
         self.model_name = model_name
         self.tokenizer = None
+        self.cache = cache
+        self.tokenize_workers = tokenize_workers
+        self.executor: Optional[ThreadPoolExecutor] = None
+
+    def close(self) -> None:
+        # Stops the tokenize threads, a later split starts a new pool when it needs one
+        if self.executor:
+            self.executor.shutdown()
+            self.executor = None
 
     def _initialize_tokenizer(self, model: Optional[str] = None) -> None:
         if not self.tokenizer or (model and model != self.model_name):
             self.model_name = model or self.model_name
-            self.tokenizer = tiktoken.encoding_for_model(self.model_name)
+            self.tokenizer = get_tokenizer(self.model_name)
 
     def _count_tokens(self, text: str) -> int:
         if not self.tokenizer:
@@ -43,83 +226,226 @@ class TextService:
         tokens = self.tokenizer.encode(formatted_content)
         return len(tokens)
 
+    def count_tokens_batch(self, texts: List[str], model: Optional[str] = None) -> List[int]:
+        # encode_batch releases the GIL and encodes the texts on tiktoken's own thread pool
+        self._initialize_tokenizer(model)
+        encoded = self.tokenizer.encode_batch([self._format_for_tokenization(text) for text in texts])
+        return [len(tokens) for tokens in encoded]
+
     def _format_for_tokenization(self, text: str) -> str:
-        return f"<|im_start|>user\n{text}<|im_end|>\n<|im_start|>assistant<|im_end|>"
+        return f"{self.TOKENIZATION_PREFIX}{text}{self.TOKENIZATION_SUFFIX}"
+
+    def _create_token_map(self, text: str) -> TokenOffsetMap:
+        if not self.tokenizer:
+            raise Exception('Tokenizer not initialized')
+        executor = None
+        if self.tokenize_workers > 1 and len(text) > TOKENIZE_SEGMENT_SIZE:
+            if not self.executor:
+                self.executor = ThreadPoolExecutor(self.tokenize_workers)
+            executor = self.executor
+        return TokenOffsetMap(self.tokenizer, text, self.TOKENIZATION_PREFIX, self.TOKENIZATION_SUFFIX, executor)
 
     async def split(self, text: str, limit: int, metadata: Optional[Dict[str, Any]] = None) -> List[IDoc]:
         print(f"Starting split process with limit: {limit} tokens")
         self._initialize_tokenizer()
+
+        cache_key = self.cache.make_key(text, 'split', self.model_name, SPLITTER_VERSION, limit) if self.cache else None
+        cached = self.cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            print(f"Chunk cache hit. Total chunks: {len(cached)}")
+            return [IDoc(text=chunk['text'], metadata={**chunk['metadata'], **(metadata or {})}) for chunk in cached]
+
         chunks: List[IDoc] = []
         position = 0
         total_length = len(text)
         current_headers: Headers = {}
+        token_map = self._create_token_map(text)
+        outline = self._create_outline(text)
+
+        # Account for token overhead due to formatting
+        overhead = self._count_tokens(self._format_for_tokenization('')) - self._count_tokens('')
 
         while position < total_length:
             print(f"Processing chunk starting at position: {position}")
-            chunk_text, chunk_end = self._get_chunk(text, position, limit)
-            tokens = self._count_tokens(chunk_text)
+            chunk_text, chunk_end, tokens = self._get_chunk(token_map, position, limit, overhead)
             print(f"Chunk tokens: {tokens}")
 
-            headers_in_chunk = self._extract_headers(chunk_text)
-            self._update_current_headers(current_headers, headers_in_chunk)
-
-            content, urls, images = self._extract_urls_and_images(chunk_text)
-
-            chunks.append(IDoc(
-                text=content,
-                metadata={
-                    'tokens': tokens,
-                    'headers': dict(current_headers),
-                    'urls': urls,
-                    'images': images,
-                    **(metadata or {})
-                }
-            ))
+            chunk = self._create_chunk(chunk_text, tokens, current_headers, None if cache_key else metadata, outline, position)
+            current_headers = chunk.metadata['headers']
+            chunks.append(chunk)
 
             print(f"Chunk processed. New position: {chunk_end}")
             position = chunk_end
 
         print(f"Split process completed. Total chunks: {len(chunks)}")
+        if cache_key:
+            # Cached without the caller's metadata, which differs between calls for the same text
+            self.cache.put(cache_key, [{'text': chunk.text, 'metadata': chunk.metadata} for chunk in chunks])
+            if metadata:
+                chunks = [IDoc(text=chunk.text, metadata={**chunk.metadata, **metadata}) for chunk in chunks]
         return chunks
 
-    def _get_chunk(self, text: str, start: int, limit: int) -> tuple[str, int]:
-        print(f"Getting chunk starting at {start} with limit {limit}")
+    async def split_views(self, text: str, limit: int) -> List[ChunkView]:
+        # Same chunk boundaries as split, without copying the chunk texts
+        self._initialize_tokenizer()
+        views: List[ChunkView] = []
+        position = 0
+        current_headers: Headers = {}
+        token_map = self._create_token_map(text)
+        outline = self._create_outline(text)
+
+        # Account for token overhead due to formatting
+        overhead = self._count_tokens(self._format_for_tokenization('')) - self._count_tokens('')
+
+        while position < len(text):
+            chunk_end, tokens = self._get_chunk_end(token_map, position, limit, overhead)
+            current_headers = self._chunk_headers(current_headers, outline, position, chunk_end)
+            header_path = tuple(current_headers[f'h{level}'][-1] for level in range(1, 7) if current_headers.get(f'h{level}'))
+            views.append(ChunkView(position, chunk_end, tokens, header_path, outline, self._extract_urls_and_images))
+            position = chunk_end
+
+        return views
+
+    async def split_stream(
+        self,
+        source: Any,
+        limit: int,
+        metadata: Optional[Dict[str, Any]] = None,
+        window_size: Optional[int] = None
+    ) -> AsyncIterator[IDoc]:
+        # Source is anything with read(size): a text or binary file handle, an aiofiles handle or an mmap of a UTF-8 file
+        print(f"Starting streaming split process with limit: {limit} tokens")
+        self._initialize_tokenizer()
+        window_size = window_size or max(limit * 64, 65536)
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        current_headers: Headers = {}
+        buffer = ''
+        finished = False
+        total_chunks = 0
 
         # Account for token overhead due to formatting
         overhead = self._count_tokens(self._format_for_tokenization('')) - self._count_tokens('')
 
+        while True:
+            while not finished and len(buffer) < window_size:
+                block = source.read(window_size)
+                if inspect.isawaitable(block):
+                    block = await block
+                if not block:
+                    finished = True
+                    buffer += decoder.decode(b'', final=True)
+                else:
+                    buffer += decoder.decode(block) if isinstance(block, (bytes, bytearray)) else block
+
+            if not buffer:
+                break
+
+            # Chunks are only finalized in the first half of the window, the rest is lookahead
+            token_map = self._create_token_map(buffer)
+            outline = self._create_outline(buffer)
+            stop = len(buffer) if finished else len(buffer) // 2
+            position = 0
+
+            while position < stop:
+                print(f"Processing chunk starting at position: {position}")
+                chunk_text, chunk_end, tokens = self._get_chunk(token_map, position, limit, overhead)
+                print(f"Chunk tokens: {tokens}")
+                total_chunks += 1
+                chunk = self._create_chunk(chunk_text, tokens, current_headers, metadata, outline, position)
+                current_headers = chunk.metadata['headers']
+                yield chunk
+                print(f"Chunk processed. New position: {chunk_end}")
+                position = chunk_end
+
+            buffer = buffer[position:]
+
+        print(f"Streaming split process completed. Total chunks: {total_chunks}")
+
+    def _create_outline(self, text: str) -> MarkdownOutline:
+        return MarkdownOutline(text, '{{{{$img{}}}}}', '{{{{$url{}}}}}', '{{$img')
+
+    def _create_chunk(
+        self,
+        chunk_text: str,
+        tokens: int,
+        current_headers: Headers,
+        metadata: Optional[Dict[str, Any]] = None,
+        outline: Optional[MarkdownOutline] = None,
+        start: int = 0
+    ) -> IDoc:
+        end = start + len(chunk_text)
+        headers = self._chunk_headers(current_headers, outline, start, end, chunk_text)
+        placeholders = outline.placeholders(start, end) if outline else None
+        content, urls, images = placeholders or self._extract_urls_and_images(chunk_text)
+
+        return IDoc(
+            text=content,
+            metadata={
+                'tokens': tokens,
+                'headers': headers,
+                'urls': urls,
+                'images': images,
+                **(metadata or {})
+            }
+        )
+
+    def _chunk_headers(
+        self,
+        current_headers: Headers,
+        outline: Optional[MarkdownOutline],
+        start: int,
+        end: int,
+        chunk_text: Optional[str] = None
+    ) -> Headers:
+        headers_in_chunk = outline.headers(start, end) if outline else None
+        if headers_in_chunk is None:
+            headers_in_chunk = self._extract_headers(outline.text[start:end] if chunk_text is None else chunk_text)
+
+        # Chunks without headers inherit the header context of the chunk before them, each chunk
+        # gets its own copy so editing one chunk's headers leaves its neighbours untouched
+        headers = {key: list(values) for key, values in current_headers.items()}
+        if headers_in_chunk:
+            self._update_current_headers(headers, headers_in_chunk)
+        return headers
+
+    def _get_chunk(self, token_map: TokenOffsetMap, start: int, limit: int, overhead: int) -> tuple[str, int, int]:
+        end, tokens = self._get_chunk_end(token_map, start, limit, overhead)
+        return token_map.text[start:end], end, tokens
+
+    def _get_chunk_end(self, token_map: TokenOffsetMap, start: int, limit: int, overhead: int) -> tuple[int, int]:
+        print(f"Getting chunk starting at {start} with limit {limit}")
+        text = token_map.text
+
         # Initial tentative end position
-        end = min(start + int((len(text) - start) * limit / self._count_tokens(text[start:])), len(text))
+        end = min(start + int((len(text) - start) * limit / token_map.count(start, len(text))), len(text))
 
         # Adjust end to avoid exceeding token limit
-        chunk_text = text[start:end]
-        tokens = self._count_tokens(chunk_text)
+        tokens = token_map.count(start, end)
 
         while tokens + overhead > limit and end > start:
             print(f"Chunk exceeds limit with {tokens + overhead} tokens. Adjusting end position...")
             end = self._find_new_chunk_end(text, start, end)
-            chunk_text = text[start:end]
-            tokens = self._count_tokens(chunk_text)
+            tokens = token_map.count(start, end)
 
         # Adjust chunk end to align with newlines without significantly reducing size
-        end = self._adjust_chunk_end(text, start, end, tokens + overhead, limit)
+        adjusted_end = self._adjust_chunk_end(token_map, start, end, tokens + overhead, limit)
+        if adjusted_end != end:
+            end = adjusted_end
+            tokens = token_map.count(start, end)
 
-        chunk_text = text[start:end]
-        tokens = self._count_tokens(chunk_text)
         print(f"Final chunk end: {end}")
-        return chunk_text, end
+        return end, tokens
 
-    def _adjust_chunk_end(self, text: str, start: int, end: int, current_tokens: int, limit: int) -> int:
+    def _adjust_chunk_end(self, token_map: TokenOffsetMap, start: int, end: int, current_tokens: int, limit: int) -> int:
         min_chunk_tokens = int(limit * 0.8)  # Minimum chunk size is 80% of limit
 
-        next_newline = text.find('\n', end)
-        prev_newline = text.rfind('\n', start, end)
+        next_newline = token_map.find_newline(end)
+        prev_newline = token_map.rfind_newline(start, end)
 
         # Try extending to next newline
-        if next_newline != -1 and next_newline < len(text):
+        if next_newline != -1:
             extended_end = next_newline + 1
-            chunk_text = text[start:extended_end]
-            tokens = self._count_tokens(chunk_text)
+            tokens = token_map.count(start, extended_end)
             if tokens <= limit and tokens >= min_chunk_tokens:
                 print(f"Extending chunk to next newline at position {extended_end}")
                 return extended_end
@@ -127,8 +453,7 @@ class TextService:
         # Try reducing to previous newline
         if prev_newline > start:
             reduced_end = prev_newline + 1
-            chunk_text = text[start:reduced_end]
-            tokens = self._count_tokens(chunk_text)
+            tokens = token_map.count(start, reduced_end)
             if tokens <= limit and tokens >= min_chunk_tokens:
                 print(f"Reducing chunk to previous newline at position {reduced_end}")
                 return reduced_end
@@ -145,9 +470,8 @@ class TextService:
 
     def _extract_headers(self, text: str) -> Headers:
         headers: Headers = {}
-        header_regex = re.compile(r'(^|\n)(#{1,6})\s+(.*)')
 
-        for match in header_regex.finditer(text):
+        for match in HEADER_PATTERN.finditer(text):
             level = len(match.group(2))
             content = match.group(3).strip()
             key = f'h{level}'
@@ -194,16 +518,32 @@ class TextService:
                 return result
             return match.group(0)
 
-        content = re.sub(r'!\[([^\]]*)\]\(([^)]+)\)', replace_image, text)
-        content = re.sub(r'\[([^\]]+)\]\(([^)]+)\)', replace_url, content)
+        content = IMAGE_PATTERN.sub(replace_image, text)
+        content = LINK_PATTERN.sub(replace_url, content)
 
         return content, urls, images
 
-    async def document(self, text: str, model: Optional[str] = None, additional_metadata: Optional[Dict[str, Any]] = None) -> IDoc:
+    async def document(
+        self,
+        text: str,
+        model: Optional[str] = None,
+        additional_metadata: Optional[Dict[str, Any]] = None,
+        tokens: Optional[int] = None
+    ) -> IDoc:
+        # Callers that counted a batch of texts with count_tokens_batch pass the count in
         self._initialize_tokenizer(model)
-        tokens = self._count_tokens(text)
-        headers = self._extract_headers(text)
-        content, urls, images = self._extract_urls_and_images(text)
+
+        cache_key = self.cache.make_key(text, 'document', self.model_name, SPLITTER_VERSION) if self.cache else None
+        cached = self.cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            tokens, headers, content, urls, images = cached
+        else:
+            if tokens is None:
+                tokens = self._count_tokens(text)
+            headers = self._extract_headers(text)
+            content, urls, images = self._extract_urls_and_images(text)
+            if cache_key:
+                self.cache.put(cache_key, [tokens, headers, content, urls, images])
 
         return IDoc(
             text=content,
@@ -217,20 +557,47 @@ class TextService:
             }
         )
 
+    async def documents(
+        self,
+        items: List[tuple[str, Optional[Dict[str, Any]]]],
+        model: Optional[str] = None
+    ) -> List[IDoc]:
+        # Builds a document per (text, metadata) pair, texts missing from the cache are counted in one batch
+        self._initialize_tokenizer(model)
+
+        missing = [
+            index for index, (text, _) in enumerate(items)
+            if not self.cache or self.cache.make_key(text, 'document', self.model_name, SPLITTER_VERSION) not in self.cache
+        ]
+        token_counts: List[Optional[int]] = [None] * len(items)
+        for index, tokens in zip(missing, self.count_tokens_batch([items[index][0] for index in missing], model)):
+            token_counts[index] = tokens
+
+        return [
+            await self.document(text, model, metadata, tokens)
+            for (text, metadata), tokens in zip(items, token_counts)
+        ]
+
     def restore_placeholders(self, idoc: IDoc) -> IDoc:
-        text = idoc.text
         metadata = idoc.metadata
+        text = idoc.text
 
-        # Replace image placeholders with actual URLs using regex
-        if 'images' in metadata:
-            for index, url in enumerate(metadata['images']):
-                pattern = rf'\(\{{{{\$img{index}\}}}}\)'
-                text = re.sub(pattern, f'({url})', text)
-
-        # Replace URL placeholders with actual URLs using regex
-        if 'urls' in metadata:
-            for index, url in enumerate(metadata['urls']):
-                pattern = rf'\(\{{{{\$url{index}\}}}}\)'
-                text = re.sub(pattern, f'({url})', text)
+        # Resolve every image and URL placeholder in a single pass over the text
+        targets = {
+            'img': metadata.get('images') or [],
+            'url': metadata.get('urls') or []
+        }
+        if (targets['img'] or targets['url']) and '{{$' in text:
+            def replace_placeholder(match: re.Match) -> str:
+                values = targets[match.group(1)]
+                index = int(match.group(2))
+                if index < len(values) and match.group(2) == str(index):
+                    return f'({values[index]})'
+                return match.group(0)
+
+            text = PLACEHOLDER_PATTERN.sub(replace_placeholder, text)
 
         return IDoc(text=text, metadata=metadata)
+
+    def restore_many(self, docs: List[IDoc]) -> List[IDoc]:
+        return [self.restore_placeholders(doc) for doc in docs]
@@ -9,6 +9,7 @@ class Point(TypedDict, total=False):
     id: str
     text: str
     metadata: Dict[str, Any]
+    embedding: List[float]
 
 class VectorService:
     def __init__(self, openai_service: OpenAIService):
@@ -17,8 +18,11 @@ class VectorService:
             api_key=os.getenv('QDRANT_API_KEY')
         )
         self.openai_service = openai_service
+        self.collections: set[str] = set()
 
     async def ensure_collection(self, name: str) -> None:
+        if name in self.collections:
+            return
         collections = await self.client.get_collections()
         if not any(c.name == name for c in collections.collections):
             await self.client.create_collection(
@@ -28,6 +32,7 @@ class VectorService:
                     distance=models.Distance.COSINE
                 )
             )
+        self.collections.add(name)
 
     async def add_points(
         self,
@@ -36,10 +41,12 @@ class VectorService:
     ) -> None:
         await self.ensure_collection(collection_name)
 
-        # Create embeddings in parallel for better performance
+        # Points without a precomputed embedding are embedded with a single request
+        missing = [point for point in points if point.get('embedding') is None]
+        created = iter(await self.openai_service.create_embeddings([point['text'] for point in missing]))
+        embeddings = [point['embedding'] if point.get('embedding') is not None else next(created) for point in points]
         points_to_upsert = []
-        for point in points:
-            embedding = await self.openai_service.create_embedding(point['text'])
+        for point, embedding in zip(points, embeddings):
             points_to_upsert.append(models.PointStruct(
                 id=point.get('id', str(uuid.uuid4())),
                 vector=embedding,
@@ -71,6 +78,15 @@ class VectorService:
             wait=True
         )
 
+    async def delete_points(self, collection_name: str, point_ids: List[str]) -> None:
+        await self.client.delete(
+            collection_name=collection_name,
+            points_selector=models.PointIdsList(
+                points=point_ids
+            ),
+            wait=True
+        )
+
     async def perform_search(
         self,
         collection_name: str,
@@ -79,6 +95,15 @@ class VectorService:
         limit: int = 5
     ) -> List[Dict[str, Any]]:
         query_embedding = await self.openai_service.create_embedding(query)
+        return await self.search_by_vector(collection_name, query_embedding, filter, limit)
+
+    async def search_by_vector(
+        self,
+        collection_name: str,
+        query_embedding: List[float],
+        filter: Optional[Dict[str, Any]] = None,
+        limit: int = 5
+    ) -> List[Dict[str, Any]]:
         results = await self.client.search(
             collection_name=collection_name,
             query_vector=query_embedding,
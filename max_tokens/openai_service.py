@@ -1,28 +1,44 @@
-import tiktoken
+import sys
+from pathlib import Path
 import openai
+sys.path.append(str(Path(__file__).resolve().parents[1]))  # repository root with the shared package
+from shared.tokenizer_registry import get_tokenizer
+from shared.message_tokens import MessageTokenCounter
 
 class OpenAIService:
     def __init__(self, api_key=None):
         self.api_key = api_key
         self.client = openai.OpenAI(api_key=self.api_key)
-        self.tokenizers = {}
         self.IM_START = "<|im_start|>"
         self.IM_END = "<|im_end|>"
         self.IM_SEP = "<|im_sep|>"
+        self.message_counters = {}
     
     def get_tokenizer(self, model_name):
         """Get or create a tokenizer for the specified model"""
-        if model_name not in self.tokenizers:
-            try:
-                self.tokenizers[model_name] = tiktoken.encoding_for_model(model_name)
-            except KeyError:
-                raise KeyError(f"Tokenizer for model {model_name} not found.")
-        return self.tokenizers[model_name]
+        return get_tokenizer(model_name)
+    
+    def get_message_counter(self, model_name):
+        """Get the per-message token counter shared by all models using the same tokenizer"""
+        tokenizer = self.get_tokenizer(model_name)
+        counter = self.message_counters.get(tokenizer.name)
+        if counter is None:
+            counter = self.message_counters[tokenizer.name] = MessageTokenCounter(tokenizer)
+        return counter
 
     def count_tokens(self, messages, model="gpt-4o"):
         """Count the number of tokens in the given messages for the specified model"""
+        # Only messages not seen before are encoded, the rest of the thread comes from the cache
+        return self.get_message_counter(model).count(messages)
+    
+    def count_tokens_batch(self, message_lists, model="gpt-4o"):
+        """Count the tokens of many message lists in one call, encoded on tiktoken's thread pool"""
         tokenizer = self.get_tokenizer(model)
-        
+        encoded = tokenizer.encode_batch([self._format_messages(messages) for messages in message_lists])
+        return [len(tokens) for tokens in encoded]
+    
+    def _format_messages(self, messages):
+        """Format messages with the chat markup the model sees"""
         formatted_content = ""
         for message in messages:
             role = message.get("role", "")
@@ -30,11 +46,7 @@ class OpenAIService:
             formatted_content += f"{self.IM_START}{role}{self.IM_SEP}{content}{self.IM_END}"
         
         formatted_content += f"{self.IM_START}assistant{self.IM_SEP}"
-        
-        # Encode the formatted content to count tokens
-        tokens = tokenizer.encode(formatted_content)
-        
-        return len(tokens)
+        return formatted_content
     
     def completion(self, messages, model="gpt-4", stream=False, json_mode=False, max_tokens=1024):
         """Create a completion with the OpenAI API"""
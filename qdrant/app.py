@@ -1,9 +1,13 @@
+import sys
+from pathlib import Path
 import uuid
 from flask import Flask, request, jsonify
 from langfuse_service import LangfuseService
 from openai_service import OpenAIService
 from assistant_service import AssistantService
 from vector_service import VectorService
+sys.path.append(str(Path(__file__).resolve().parents[1]))  # repository root with the shared package
+from shared.tokenizer_registry import preload
 
 app = Flask(__name__)
 
@@ -30,6 +34,7 @@ langfuse_service = LangfuseService()
 openai_service = OpenAIService()
 assistant_service = AssistantService(openai_service, langfuse_service)
 vector_service = VectorService(openai_service)
+preload()
 
 COLLECTION_NAME = "aidevs"
 
@@ -1,33 +1,41 @@
+import sys
+from pathlib import Path
 import json
 from typing import List, Dict, Any
 from openai import OpenAI
-import tiktoken
+sys.path.append(str(Path(__file__).resolve().parents[1]))  # repository root with the shared package
+from shared.tokenizer_registry import get_tokenizer
 
 class OpenAIService:
     def __init__(self):
         self.client = OpenAI()
-        self.tokenizers = {}
         
         self.IM_START = "<|im_start|>"
         self.IM_END = "<|im_end|>"
         self.IM_SEP = "<|im_sep|>"
     
     def get_tokenizer(self, model_name: str = "gpt-4o"):
-        if model_name not in self.tokenizers:
-            self.tokenizers[model_name] = tiktoken.encoding_for_model(model_name)
-        return self.tokenizers[model_name]
+        return get_tokenizer(model_name)
     
     def count_tokens(self, messages: List[Dict[str, Any]], model: str = "gpt-4o") -> int:
         tokenizer = self.get_tokenizer(model)
+        formatted_content = self._format_messages(messages)
+        tokens = tokenizer.encode(formatted_content)
+        return len(tokens)
+    
+    def count_tokens_batch(self, message_lists: List[List[Dict[str, Any]]], model: str = "gpt-4o") -> List[int]:
+        tokenizer = self.get_tokenizer(model)
+        encoded = tokenizer.encode_batch([self._format_messages(messages) for messages in message_lists])
+        return [len(tokens) for tokens in encoded]
+    
+    def _format_messages(self, messages: List[Dict[str, Any]]) -> str:
         formatted_content = ""
         
         for message in messages:
             formatted_content += f"{self.IM_START}{message['role']}{self.IM_SEP}{message.get('content', '')}{self.IM_END}"
         
         formatted_content += f"{self.IM_START}assistant{self.IM_SEP}"
-        
-        tokens = tokenizer.encode(formatted_content)
-        return len(tokens)
+        return formatted_content
     
     def completion(self, config: Dict[str, Any]) -> Dict[str, Any]:
         messages = config.get("messages", [])
@@ -1,9 +1,12 @@
+import sys
 import asyncio
 import os
 import base64
 from pathlib import Path
 from typing import Dict
 from openai_service import OpenAIService
+sys.path.append(str(Path(__file__).resolve().parents[1]))  # repository root with the shared package
+from shared.tokenizer_registry import preload
 
 async def process_avatar(file: str, appearance_description: str, openai_service: OpenAIService) -> Dict[str, str]:
     """Process a single avatar file and get AI response"""
@@ -60,6 +63,7 @@ async def process_avatars():
     """)
     
     openai_service = OpenAIService()
+    preload()
     
     # Process all files concurrently
     tasks = [process_avatar(file, appearance_description, openai_service) for file in files]
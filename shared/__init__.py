@@ -0,0 +1 @@
+# Modules shared by the lesson directories, which add the repository root to sys.path to import them
@@ -0,0 +1,111 @@
+import os
+import json
+import mmap
+from array import array
+from typing import Any, AsyncIterable, Dict, Iterable, Iterator, Optional, Union
+
+# Chunks are stored as JSON lines next to a sidecar with the byte offset of every line,
+# so a store is written one chunk at a time and any chunk can be read without parsing the rest
+INDEX_SUFFIX = '.idx'
+OFFSET_TYPE = 'Q'  # 8 bytes per chunk in native byte order
+
+class ChunkWriter:
+    """Append-only writer of a JSONL chunk store and its offsets sidecar"""
+
+    def __init__(self, path: str, append: bool = False):
+        self.path = path
+        mode = 'ab' if append else 'wb'
+        self.data = open(path, mode)
+        self.index = open(path + INDEX_SUFFIX, mode)
+        self.position = self.data.seek(0, os.SEEK_END)
+        self.count = self.index.seek(0, os.SEEK_END) // array(OFFSET_TYPE).itemsize
+        self.index.truncate(self.count * array(OFFSET_TYPE).itemsize)
+
+    def append(self, chunk: Dict[str, Any]) -> int:
+        """Write one chunk and return its index, docs with a to_dict() method are converted first"""
+        if not isinstance(chunk, dict):
+            chunk = chunk.to_dict()
+        line = json.dumps(chunk, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+        self.data.write(line)
+        # The offset goes in after the line, so a store cut short never points at a partial line
+        self.index.write(array(OFFSET_TYPE, [self.position]).tobytes())
+        self.position += len(line)
+        self.count += 1
+        return self.count - 1
+
+    def extend(self, chunks: Iterable[Dict[str, Any]]) -> int:
+        """Write many chunks and return how many were written"""
+        written = 0
+        for chunk in chunks:
+            self.append(chunk)
+            written += 1
+        return written
+
+    def flush(self) -> None:
+        self.data.flush()
+        self.index.flush()
+
+    def close(self) -> None:
+        self.data.close()
+        self.index.close()
+
+    def __enter__(self) -> 'ChunkWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+class ChunkReader:
+    """Random access to the chunks of a store through mmap"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.offsets = array(OFFSET_TYPE)
+        with open(path + INDEX_SUFFIX, 'rb') as f:
+            index = f.read()
+        self.offsets.frombytes(index[:len(index) - len(index) % self.offsets.itemsize])
+
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.data: Union[mmap.mmap, bytes] = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        if index < 0:
+            index += len(self.offsets)
+        if not 0 <= index < len(self.offsets):
+            raise IndexError('chunk index out of range')
+        start = self.offsets[index]
+        return json.loads(self.data[start:self.data.find(b'\n', start)])
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for index in range(len(self.offsets)):
+            yield self[index]
+
+    def close(self) -> None:
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def __enter__(self) -> 'ChunkReader':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+async def write_chunks(path: str, chunks: Union[Iterable[Dict[str, Any]], AsyncIterable[Dict[str, Any]]], append: bool = False) -> int:
+    """Write chunks from a list or an async generator as they arrive, returning the size of the store"""
+    with ChunkWriter(path, append) as writer:
+        if hasattr(chunks, '__aiter__'):
+            async for chunk in chunks:
+                writer.append(chunk)
+        else:
+            writer.extend(chunks)
+        return writer.count
+
+def read_chunk(path: str, index: int) -> Optional[Dict[str, Any]]:
+    """Read a single chunk of a store, None if it has fewer chunks"""
+    with ChunkReader(path) as reader:
+        return reader[index] if -len(reader) <= index < len(reader) else None
@@ -0,0 +1,141 @@
+import re
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Pattern
+
+HEADER_PATTERN = re.compile(r'(^|\n)(#{1,6})\s+(.*)')
+HEADER_START_PATTERN = re.compile(r'(#{1,6})\s+(.*)')
+IMAGE_PATTERN = re.compile(r'!\[([^\]]*)\]\(([^)]+)\)')
+LINK_PATTERN = re.compile(r'\[([^\]]+)\]\(([^)]+)\)')
+
+Headers = Dict[str, List[str]]
+
+class MarkdownOutline:
+    # Scans a document once for headers, images and links and answers per chunk from that index.
+    # None of the patterns can match differently once the text around a match is cut away, so a
+    # chunk holds exactly the matches that lie inside it. A chunk whose edge cuts through a match
+    # gets None and is scanned on its own. header_pattern is the pattern the owner
+    # scans chunks with, so both ways find the same headers.
+    def __init__(
+        self,
+        text: str,
+        image_placeholder: str,
+        url_placeholder: str,
+        skip_url_prefix: Optional[str] = None,
+        header_pattern: Pattern[str] = HEADER_PATTERN
+    ):
+        self.text = text
+        self.image_placeholder = image_placeholder
+        self.url_placeholder = url_placeholder
+        self.skip_url_prefix = skip_url_prefix
+
+        self.header_starts: List[int] = []
+        self.header_ends: List[int] = []
+        self.header_items: List[tuple[str, str]] = []
+        for match in header_pattern.finditer(text):
+            self.header_starts.append(match.start())
+            self.header_ends.append(match.end())
+            self.header_items.append((f'h{len(match.group(2))}', match.group(3).strip()))
+
+        self.image_starts: List[int] = []
+        self.image_ends: List[int] = []
+        self.image_urls: List[tuple[int, int]] = []
+        for match in IMAGE_PATTERN.finditer(text):
+            self.image_starts.append(match.start())
+            self.image_ends.append(match.end())
+            self.image_urls.append(match.span(2))
+
+        # Links are matched after images got their placeholders. Placeholders hold no brackets or
+        # parentheses, so masking the image urls keeps every link at its place in the document.
+        pieces = []
+        position = 0
+        for url_start, url_end in self.image_urls:
+            pieces.append(text[position:url_start])
+            pieces.append('x' * (url_end - url_start))
+            position = url_end
+        pieces.append(text[position:])
+
+        image_url_starts = [url_start for url_start, _ in self.image_urls]
+        self.link_starts: List[int] = []
+        self.link_ends: List[int] = []
+        self.link_urls: List[tuple[int, int]] = []
+        self.link_images: List[Optional[int]] = []  # Image whose placeholder the link points at, -1 if it spans part of one
+        for match in LINK_PATTERN.finditer(''.join(pieces)):
+            url_start, url_end = match.span(2)
+            image = bisect_right(image_url_starts, url_start) - 1
+            if image >= 0 and self.image_urls[image] == (url_start, url_end):
+                linked_image = image
+            elif (image >= 0 and self.image_urls[image][1] > url_start) or (image + 1 < len(self.image_urls) and self.image_urls[image + 1][0] < url_end):
+                linked_image = -1
+            else:
+                linked_image = None
+            self.link_starts.append(match.start())
+            self.link_ends.append(match.end())
+            self.link_urls.append((url_start, url_end))
+            self.link_images.append(linked_image)
+
+    def headers(self, start: int, end: int) -> Optional[Headers]:
+        first = bisect_left(self.header_starts, start)
+        if first and self.header_ends[first - 1] > start:
+            # A header line right after the previous chunk matched from its newline
+            if self.header_starts[first - 1] != start - 1 or self.text[start - 1] != '\n':
+                return None
+            first -= 1
+        elif start and self.text[start - 1] != '\n' and HEADER_START_PATTERN.match(self.text, start, end):
+            return None
+
+        last = bisect_left(self.header_starts, end)
+        if last > first and self.header_ends[last - 1] > end:
+            return None
+
+        headers: Headers = {}
+        for key, content in self.header_items[first:last]:
+            headers.setdefault(key, []).append(content)
+        return headers
+
+    def placeholders(self, start: int, end: int) -> Optional[tuple[str, List[str], List[str]]]:
+        images = self._inside(self.image_starts, self.image_ends, start, end)
+        links = self._inside(self.link_starts, self.link_ends, start, end)
+        if images is None or links is None:
+            return None
+
+        edits = {}
+        image_urls: List[str] = []
+        for image in images:
+            url_start, url_end = self.image_urls[image]
+            edits[url_start] = (url_end, self.image_placeholder.format(len(image_urls)))
+            image_urls.append(self.text[url_start:url_end])
+
+        urls: List[str] = []
+        for link in links:
+            url_start, url_end = self.link_urls[link]
+            linked_image = self.link_images[link]
+            if linked_image == -1:
+                return None
+            if linked_image is None:
+                url = self.text[url_start:url_end]
+            else:
+                url = self.image_placeholder.format(linked_image - images.start)
+            if self.skip_url_prefix and url.startswith(self.skip_url_prefix):
+                continue
+            edits[url_start] = (url_end, self.url_placeholder.format(len(urls)))
+            urls.append(url)
+
+        pieces = []
+        position = start
+        for url_start in sorted(edits):
+            url_end, placeholder = edits[url_start]
+            pieces.append(self.text[position:url_start])
+            pieces.append(placeholder)
+            position = url_end
+        pieces.append(self.text[position:end])
+
+        return ''.join(pieces), urls, image_urls
+
+    def _inside(self, starts: List[int], ends: List[int], start: int, end: int) -> Optional[range]:
+        first = bisect_left(starts, start)
+        if first and ends[first - 1] > start:
+            return None
+        last = bisect_left(starts, end)
+        if last > first and ends[last - 1] > end:
+            return None
+        return range(first, last)
@@ -0,0 +1,74 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List
+import tiktoken
+
+IM_START = "<|im_start|>"
+IM_END = "<|im_end|>"
+IM_SEP = "<|im_sep|>"
+
+# A conversation is formatted as <|im_start|>role<|im_sep|>content<|im_end|> for every message,
+# followed by <|im_start|>assistant<|im_sep|>. The tokenizer always keeps the "<|" before an
+# "im" in one regex piece with the punctuation in front of it, so cutting the formatted text right
+# before every "im_end" gives per-message segments whose token counts add up to the whole string.
+SEGMENT_HEAD = "im_end|>"
+SEGMENT_TAIL = "<|"
+
+class MessageTokenCounter:
+    """Counts conversation tokens from cached per-message counts, encoding only new messages"""
+
+    def __init__(self, tokenizer: tiktoken.Encoding, max_entries: int = 10000):
+        self.tokenizer = tokenizer
+        self.max_entries = max_entries
+        self.cache: OrderedDict[bytes, int] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        # Framing around the message segments: the reply header closes the last message, and the
+        # first message opens with "<|im_start|>" instead of the previous message's "<|im_end|>"
+        self.reply_tokens = self._encoded_length(f"{SEGMENT_HEAD}{IM_START}assistant{IM_SEP}")
+        self.first_message_tokens = self._encoded_length(SEGMENT_TAIL) - self._encoded_length(SEGMENT_HEAD + SEGMENT_TAIL)
+        self.empty_tokens = self._encoded_length(f"{IM_START}assistant{IM_SEP}")
+
+    def _encoded_length(self, text: str) -> int:
+        return len(self.tokenizer.encode(text))
+
+    def _segment(self, message: Dict[str, Any]) -> str:
+        role = message.get("role", "")
+        content = message.get("content", "") or ""
+        return f"{SEGMENT_HEAD}{IM_START}{role}{IM_SEP}{content}{SEGMENT_TAIL}"
+
+    def message_tokens(self, messages: List[Dict[str, Any]]) -> List[int]:
+        """Token count of every message segment, new segments are encoded in one batch"""
+        segments = [self._segment(message) for message in messages]
+        keys = [hashlib.sha256(segment.encode('utf-8')).digest() for segment in segments]
+
+        missing = {}
+        with self._lock:
+            for key, segment in zip(keys, segments):
+                if key in self.cache:
+                    self.cache.move_to_end(key)
+                    self.hits += 1
+                elif key not in missing:
+                    missing[key] = segment
+                    self.misses += 1
+
+        encoded = self.tokenizer.encode_batch(list(missing.values())) if missing else []
+
+        with self._lock:
+            for key, tokens in zip(missing, encoded):
+                self.cache[key] = len(tokens)
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+            counts = [self.cache.get(key) for key in keys]
+
+        # Entries evicted while adding this batch are counted again
+        return [count if count is not None else self._encoded_length(segment) for count, segment in zip(counts, segments)]
+
+    def count(self, messages: List[Dict[str, Any]]) -> int:
+        """Total tokens of the formatted conversation, equal to encoding it as one string"""
+        if not messages:
+            return self.empty_tokens
+        return sum(self.message_tokens(messages)) + self.first_message_tokens + self.reply_tokens
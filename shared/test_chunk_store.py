@@ -0,0 +1,87 @@
+import json
+import pytest
+from array import array
+from shared.chunk_store import ChunkWriter, ChunkReader, INDEX_SUFFIX, OFFSET_TYPE, read_chunk, write_chunks
+
+CHUNKS = [
+    {'text': 'first', 'metadata': {'tokens': 1, 'headers': {'h1': ['Title']}}},
+    {'text': 'żółw 😀\nsecond line', 'metadata': {'tokens': 7, 'headers': {}}},
+    {'text': '', 'metadata': {'tokens': 0, 'headers': {}}}
+]
+
+def read_offsets(path):
+    offsets = array(OFFSET_TYPE)
+    with open(path + INDEX_SUFFIX, 'rb') as f:
+        offsets.frombytes(f.read())
+    return list(offsets)
+
+def test_round_trip_with_line_offsets(tmp_path):
+    path = str(tmp_path / 'chunks.jsonl')
+    with ChunkWriter(path) as writer:
+        assert [writer.append(chunk) for chunk in CHUNKS] == [0, 1, 2]
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    lines = data.splitlines(keepends=True)
+    assert [json.loads(line) for line in lines] == CHUNKS
+    # Every offset points at the start of its line
+    assert read_offsets(path) == [0, len(lines[0]), len(lines[0]) + len(lines[1])]
+
+    with ChunkReader(path) as reader:
+        assert len(reader) == 3
+        assert list(reader) == CHUNKS
+        assert reader[-1] == CHUNKS[2]
+        with pytest.raises(IndexError):
+            reader[3]
+    assert read_chunk(path, 1) == CHUNKS[1]
+    assert read_chunk(path, 3) is None
+
+def test_append_continues_offsets(tmp_path):
+    path = str(tmp_path / 'chunks.jsonl')
+    with ChunkWriter(path) as writer:
+        writer.append(CHUNKS[0])
+    with ChunkWriter(path, append=True) as writer:
+        assert writer.extend(CHUNKS[1:]) == 2
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert [json.loads(data[offset:data.index(b'\n', offset)]) for offset in read_offsets(path)] == CHUNKS
+
+def test_partial_index_entry_is_ignored(tmp_path):
+    path = str(tmp_path / 'chunks.jsonl')
+    with ChunkWriter(path) as writer:
+        writer.extend(CHUNKS[:2])
+    with open(path + INDEX_SUFFIX, 'ab') as f:
+        f.write(b'\x01\x02')
+
+    with ChunkReader(path) as reader:
+        assert list(reader) == CHUNKS[:2]
+
+class Doc:
+    def __init__(self, chunk):
+        self.chunk = chunk
+
+    def to_dict(self):
+        return self.chunk
+
+def test_docs_are_written_through_to_dict(tmp_path):
+    path = str(tmp_path / 'chunks.jsonl')
+    with ChunkWriter(path) as writer:
+        writer.extend(Doc(chunk) for chunk in CHUNKS)
+
+    assert read_chunk(path, 1) == CHUNKS[1]
+
+@pytest.mark.asyncio
+async def test_write_chunks_from_async_generator(tmp_path):
+    path = str(tmp_path / 'chunks.jsonl')
+
+    async def generate():
+        for chunk in CHUNKS:
+            yield chunk
+
+    assert await write_chunks(path, generate()) == 3
+    assert await write_chunks(path, CHUNKS[:1], append=True) == 4
+    assert read_chunk(path, 3) == CHUNKS[0]
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,57 @@
+import re
+import pytest
+from pathlib import Path
+from shared.markdown_outline import MarkdownOutline, HEADER_PATTERN, IMAGE_PATTERN, LINK_PATTERN
+
+CORPUS = Path(__file__).resolve().parents[1] / 'text-splitter' / 'example_article.md'
+MULTILINE_HEADER_PATTERN = re.compile(HEADER_PATTERN.pattern, re.MULTILINE)
+
+def extract_headers(text, header_pattern):
+    # Chunk scanning as the text services do it
+    headers = {}
+    for match in header_pattern.finditer(text):
+        headers.setdefault(f'h{len(match.group(2))}', []).append(match.group(3).strip())
+    return headers
+
+def extract_urls_and_images(text, image_placeholder, url_placeholder, skip_url_prefix):
+    urls, images = [], []
+
+    def replace_image(match):
+        images.append(match.group(2))
+        return f'![{match.group(1)}]({image_placeholder.format(len(images) - 1)})'
+
+    def replace_url(match):
+        if skip_url_prefix and match.group(2).startswith(skip_url_prefix):
+            return match.group(0)
+        urls.append(match.group(2))
+        return f'[{match.group(1)}]({url_placeholder.format(len(urls) - 1)})'
+
+    content = LINK_PATTERN.sub(replace_url, IMAGE_PATTERN.sub(replace_image, text))
+    return content, urls, images
+
+@pytest.mark.parametrize('image_placeholder, url_placeholder, skip_url_prefix, header_pattern', [
+    # docs/text_service.py
+    ('{{{{$img{}}}}}', '{{{{$url{}}}}}', '{{$img', HEADER_PATTERN),
+    # text-splitter/text_splitter.py
+    ('{{$img{}}}', '{{$url{}}}', None, MULTILINE_HEADER_PATTERN)
+])
+def test_markdown_outline_matches_chunk_scanning(image_placeholder, url_placeholder, skip_url_prefix, header_pattern):
+    text = CORPUS.read_text(encoding='utf-8') + '\n## Links\n[![badge](b.svg)](https://ci)\n[a [b](c) ![](d)\n#\n\ntitle\n'
+    outline = MarkdownOutline(text, image_placeholder, url_placeholder, skip_url_prefix, header_pattern)
+    answered = 0
+
+    for start in range(0, len(text), 89):
+        for end in (start + 40, start + 700, text.find('\n', start + 300) + 1, len(text)):
+            end = min(max(end, start), len(text))
+            chunk = text[start:end]
+            headers = outline.headers(start, end)
+            placeholders = outline.placeholders(start, end)
+            if headers is not None:
+                assert headers == extract_headers(chunk, header_pattern)
+                answered += 1
+            if placeholders is not None:
+                assert placeholders == extract_urls_and_images(chunk, image_placeholder, url_placeholder, skip_url_prefix)
+    assert answered
+
+if __name__ == "__main__":
+    pytest.main([__file__])
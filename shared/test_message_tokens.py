@@ -0,0 +1,51 @@
+import random
+import pytest
+from shared.tokenizer_registry import get_encoding
+from shared.message_tokens import MessageTokenCounter, IM_START, IM_END, IM_SEP
+
+def format_messages(messages):
+    # Same formatting as OpenAIService._format_messages in max_tokens and tiktokenizer
+    formatted_content = ""
+    for message in messages:
+        formatted_content += f"{IM_START}{message.get('role', '')}{IM_SEP}{message.get('content', '') or ''}{IM_END}"
+    return formatted_content + f"{IM_START}assistant{IM_SEP}"
+
+@pytest.fixture(params=['cl100k_base', 'o200k_base'])
+def tokenizer(request):
+    try:
+        return get_encoding(request.param)
+    except Exception as e:
+        pytest.skip(f"Test skipped because the tokenizer could not be loaded: {str(e)}")
+
+def test_counts_match_encoding_the_whole_conversation(tokenizer):
+    counter = MessageTokenCounter(tokenizer, max_entries=64)
+    pieces = ['Hello', ' world', '!', '?', ' ', '\n', '\n\n', '<|', '|>', 'im_end', '<|im_end|>', "'s", '123', 'zażółć', '日本', '😀', '>>', '\r\n']
+    generator = random.Random(7)
+
+    for _ in range(500):
+        messages = [
+            {
+                'role': generator.choice(['system', 'user', 'assistant', '']),
+                'content': ''.join(generator.choice(pieces) for _ in range(generator.randint(0, 10)))
+            }
+            for _ in range(generator.randint(0, 6))
+        ]
+        assert counter.count(messages) == len(tokenizer.encode(format_messages(messages)))
+
+def test_only_new_messages_are_encoded(tokenizer):
+    counter = MessageTokenCounter(tokenizer)
+    thread = [{'role': 'system', 'content': 'You are a helpful assistant.'}]
+
+    for turn in range(10):
+        thread = thread + [
+            {'role': 'user', 'content': f'Question number {turn}?'},
+            {'role': 'assistant', 'content': f'Answer number {turn}.'}
+        ]
+        assert counter.count(thread) == len(tokenizer.encode(format_messages(thread)))
+
+    assert counter.misses == 21
+    assert counter.count([{'role': 'user', 'content': None}]) == len(tokenizer.encode(format_messages([{'role': 'user', 'content': None}])))
+    assert counter.count([]) == len(tokenizer.encode(format_messages([])))
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,70 @@
+import os
+import time
+import threading
+from typing import Dict, Iterable, List, Optional
+import tiktoken
+
+# tiktoken keeps downloaded BPE files in TIKTOKEN_CACHE_DIR, which defaults to a temp dir.
+# A stable directory lets every later run (and machines without network access) load them from disk.
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'tiktoken')
+
+DEFAULT_ENCODINGS = ['cl100k_base', 'o200k_base']
+
+# Newer model names tiktoken may not know yet, all of them use o200k_base
+O200K_MODEL_PREFIXES = ('gpt-4o', 'chatgpt-4o', 'gpt-4.1', 'gpt-4.5', 'gpt-5', 'o1', 'o3', 'o4')
+
+_encodings: Dict[str, tiktoken.Encoding] = {}
+_models: Dict[str, tiktoken.Encoding] = {}
+_lock = threading.Lock()
+
+# Seconds spent loading each encoding in this process
+load_times: Dict[str, float] = {}
+
+def configured_encodings() -> List[str]:
+    """Encodings to preload, from a comma separated TIKTOKEN_PRELOAD or the defaults"""
+    names = os.getenv('TIKTOKEN_PRELOAD', '')
+    return [name.strip() for name in names.split(',') if name.strip()] or DEFAULT_ENCODINGS
+
+def encoding_name_for_model(model_name: str) -> str:
+    """Resolve the encoding of a model, falling back to cl100k_base/o200k_base for unknown models"""
+    try:
+        return tiktoken.encoding_name_for_model(model_name)
+    except KeyError:
+        return 'o200k_base' if model_name.startswith(O200K_MODEL_PREFIXES) else 'cl100k_base'
+
+def configure_cache_dir() -> str:
+    """Point tiktoken at the stable cache dir unless TIKTOKEN_CACHE_DIR is already set"""
+    return os.environ.setdefault('TIKTOKEN_CACHE_DIR', DEFAULT_CACHE_DIR)
+
+def get_encoding(encoding_name: str) -> tiktoken.Encoding:
+    """Get an encoding by name, loading it once per process"""
+    encoding = _encodings.get(encoding_name)
+    if encoding is None:
+        with _lock:
+            encoding = _encodings.get(encoding_name)
+            if encoding is None:
+                configure_cache_dir()
+                start_time = time.perf_counter()
+                encoding = tiktoken.get_encoding(encoding_name)
+                load_times[encoding_name] = time.perf_counter() - start_time
+                _encodings[encoding_name] = encoding
+    return encoding
+
+def get_tokenizer(model_name: str) -> tiktoken.Encoding:
+    """Get the shared tokenizer for the specified model"""
+    encoding = _models.get(model_name)
+    if encoding is None:
+        encoding = get_encoding(encoding_name_for_model(model_name))
+        _models[model_name] = encoding
+    return encoding
+
+def preload(encoding_names: Optional[Iterable[str]] = None) -> Dict[str, float]:
+    """Load encodings at startup instead of in the middle of the first request"""
+    names = list(encoding_names or configured_encodings())
+    for name in names:
+        try:
+            get_encoding(name)
+            print(f"Tokenizer {name} ready in {load_times[name] * 1000:.1f}ms")
+        except Exception as error:
+            print(f"Failed to preload tokenizer {name}: {error}")
+    return {name: load_times[name] for name in names if name in load_times}
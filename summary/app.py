@@ -1,3 +1,4 @@
+import sys
 from dotenv import load_dotenv
 import os
 import asyncio
@@ -7,9 +8,12 @@ from typing import Optional, Dict
 import aiofiles
 from openai.types.chat import ChatCompletionMessageParam
 from openai_service import OpenAIService
+sys.path.append(str(Path(__file__).resolve().parents[1]))  # repository root with the shared package
+from shared.tokenizer_registry import preload
 
 load_dotenv()
 openai_service = OpenAIService(api_key=os.getenv('OPENAI_API_KEY'))
+preload()
 
 def get_result(content: str, tag_name: str) -> Optional[str]:
     """
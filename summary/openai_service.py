@@ -1,7 +1,11 @@
+import sys
+from pathlib import Path
 from typing import Dict, List, Optional, Union, AsyncIterator
 import openai
 from openai.types.chat import ChatCompletion, ChatCompletionMessageParam
 import tiktoken
+sys.path.append(str(Path(__file__).resolve().parents[1]))  # repository root with the shared package
+from shared.tokenizer_registry import get_tokenizer
 import math
 
 class OpenAIService:
@@ -10,19 +14,13 @@ class OpenAIService:
     def __init__(self, api_key: Optional[str] = None):
         """Initialize OpenAI client instance."""
         self.openai = openai.AsyncOpenAI(api_key=api_key)
-        self.tokenizers: Dict[str, tiktoken.Encoding] = {}
         self.IM_START = "<|im_start|>"
         self.IM_END = "<|im_end|>"
         self.IM_SEP = "<|im_sep|>"
     
     async def get_tokenizer(self, model_name: str) -> tiktoken.Encoding:
         """Get or create a tokenizer for the specified model"""
-        if model_name not in self.tokenizers:
-            try:
-                self.tokenizers[model_name] = tiktoken.encoding_for_model(model_name)
-            except KeyError:
-                raise KeyError(f"Tokenizer for model {model_name} not found.")
-        return self.tokenizers[model_name]
+        return get_tokenizer(model_name)
     
     async def count_tokens(
         self, 
@@ -31,7 +29,18 @@ class OpenAIService:
     ) -> int:
         """Count the number of tokens in the given messages for the specified model"""
         tokenizer = await self.get_tokenizer(model)
-        
+        formatted_content = self._format_messages(messages)
+        tokens = tokenizer.encode(formatted_content)
+        return len(tokens)
+    
+    async def count_tokens_batch(self, message_lists: List[List[ChatCompletionMessageParam]], model: str = 'gpt-4o') -> List[int]:
+        """Count the tokens of many message lists in one call, encoded on tiktoken's thread pool"""
+        tokenizer = await self.get_tokenizer(model)
+        encoded = tokenizer.encode_batch([self._format_messages(messages) for messages in message_lists])
+        return [len(tokens) for tokens in encoded]
+    
+    def _format_messages(self, messages: List[ChatCompletionMessageParam]) -> str:
+        """Format messages with the chat markup the model sees"""
         formatted_content = ""
         for message in messages:
             role = message.get("role", "")
@@ -39,8 +48,7 @@ class OpenAIService:
             formatted_content += f"{self.IM_START}{role}{self.IM_SEP}{content}{self.IM_END}"
         
         formatted_content += f"{self.IM_START}assistant{self.IM_SEP}"
-        tokens = tokenizer.encode(formatted_content)
-        return len(tokens)
+        return formatted_content
     
     async def completion(
         self,
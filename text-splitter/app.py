@@ -1,38 +1,61 @@
-from text_splitter import TextSplitter
+import sys
+from pathlib import Path
+from text_splitter import TextSplitter, IDoc
+sys.path.append(str(Path(__file__).resolve().parents[1]))  # repository root with the shared package
+from shared.tokenizer_registry import preload, encoding_name_for_model
+from shared.chunk_store import ChunkWriter
 import os
+import time
 import asyncio
-import json
-from typing import Dict, Any
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Optional
 
-async def process_file(file_path: str) -> Dict[str, Any]:
+CHUNK_SIZE = 1000
+MODEL_NAME = 'gpt-4'
+WORKERS = int(os.getenv('SPLITTER_WORKERS', os.cpu_count() or 1))
+
+# Splitter owned by a pool worker, created and warmed once per process
+worker_splitter: Optional[TextSplitter] = None
+
+def init_worker(model_name: str) -> None:
+    """Load the tokenizer once per worker so files don't pay for it"""
+    global worker_splitter
+    preload([encoding_name_for_model(model_name)])
+    worker_splitter = TextSplitter(model_name)
+    asyncio.run(worker_splitter._initialize_tokenizer())
+
+def process_file_in_worker(file_path: str) -> Dict[str, Any]:
+    """Entry point for pool workers"""
+    return asyncio.run(process_file(file_path, worker_splitter))
+
+def chunk_to_dict(doc: IDoc) -> Dict[str, Any]:
+    """Convert a chunk and its metadata dataclass to a JSON serializable dict"""
+    return {
+        'text': doc.text,
+        'metadata': {
+            'tokens': doc.metadata.tokens,
+            'headers': doc.metadata.headers,
+            'urls': doc.metadata.urls,
+            'images': doc.metadata.images
+        }
+    }
+
+async def process_file(file_path: str, splitter: Optional[TextSplitter] = None) -> Dict[str, Any]:
     """Process a markdown file, split it into chunks, and generate statistics"""
-    splitter = TextSplitter()
-    
-    with open(file_path, 'r', encoding='utf-8') as f:
-        text = f.read()
-    
-    docs = await splitter.split(text, 1000)
+    splitter = splitter or TextSplitter(MODEL_NAME)
     
-    # Save to JSON
-    json_file_path = os.path.splitext(file_path)[0] + '.json'
-    with open(json_file_path, 'w', encoding='utf-8') as f:
-        # Convert dataclasses to dict for JSON serialization
-        docs_dict = [
-            {
-                'text': doc.text,
-                'metadata': {
-                    'tokens': doc.metadata.tokens,
-                    'headers': doc.metadata.headers,
-                    'urls': doc.metadata.urls,
-                    'images': doc.metadata.images
-                }
-            }
-            for doc in docs
-        ]
-        json.dump(docs_dict, f, indent=2)
+    # Each chunk goes to a JSONL chunk store as soon as split_stream finalizes it,
+    # one line per chunk plus an offsets sidecar for random access
+    store_path = os.path.splitext(file_path)[0] + '.jsonl'
+    chunk_sizes = []
+    start_time = time.perf_counter()
+    with open(file_path, 'rb') as source, ChunkWriter(store_path) as writer:
+        async for doc in splitter.split_stream(source, CHUNK_SIZE):
+            writer.append(chunk_to_dict(doc))
+            chunk_sizes.append(doc.metadata.tokens)
+    elapsed = time.perf_counter() - start_time
     
     # Calculate statistics
-    chunk_sizes = [doc.metadata.tokens for doc in docs]
     avg_chunk_size = sum(chunk_sizes) / len(chunk_sizes)
     min_chunk_size = min(chunk_sizes)
     max_chunk_size = max(chunk_sizes)
@@ -44,20 +67,26 @@ async def process_file(file_path: str) -> Dict[str, Any]:
         'medianChunkSize': median_chunk_size,
         'minChunkSize': min_chunk_size,
         'maxChunkSize': max_chunk_size,
-        'totalChunks': len(chunk_sizes)
+        'totalChunks': len(chunk_sizes),
+        'totalTokens': sum(chunk_sizes),
+        'seconds': elapsed
     }
 
 
-async def main():
+async def main(workers: int = WORKERS):
     """Main function to process all markdown files in directory"""
     directory_path = os.path.join(os.getcwd(), 'text-splitter')
-    files = os.listdir(directory_path)
-    reports = []
+    files = sorted(file for file in os.listdir(directory_path) if file.endswith('.md'))
     
-    for file in files:
-        if file.endswith('.md'):
-            report = await process_file(os.path.join(directory_path, file))
-            reports.append(report)
+    # Files are split in parallel, gather keeps the reports in file order
+    start_time = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=max(1, workers), initializer=init_worker, initargs=(MODEL_NAME,)) as executor:
+        reports = await asyncio.gather(*[
+            loop.run_in_executor(executor, process_file_in_worker, os.path.join(directory_path, file))
+            for file in files
+        ])
+    elapsed = time.perf_counter() - start_time
     
     # Print table-like output
     if reports:
@@ -69,7 +98,13 @@ async def main():
             print(f"  Min Chunk Size: {report['minChunkSize']}")
             print(f"  Max Chunk Size: {report['maxChunkSize']}")
             print(f"  Total Chunks: {report['totalChunks']}")
+            print(f"  Throughput: {report['totalChunks'] / report['seconds']:.2f} chunks/s, {report['totalTokens'] / report['seconds']:.0f} tokens/s")
             print()
+        
+        total_chunks = sum(report['totalChunks'] for report in reports)
+        total_tokens = sum(report['totalTokens'] for report in reports)
+        print(f"Processed {len(reports)} files with {max(1, workers)} workers in {elapsed:.2f}s")
+        print(f"  Aggregate Throughput: {total_chunks / elapsed:.2f} chunks/s, {total_tokens / elapsed:.0f} tokens/s")
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,200 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import resource
+import platform
+import threading
+import itertools
+import subprocess
+import contextlib
+from multiprocessing import get_context
+from multiprocessing.connection import Connection
+from typing import Any, Dict, List, Optional
+
+# Offline splitter benchmarks. Every case runs in a fresh process so peak RSS is per case,
+# and results are appended as JSON lines tagged with the commit, one line per case.
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+DOCS_DIRECTORY = os.path.join(DIRECTORY, '..', 'docs')
+CORPUS_FILES = ['example_article.md', 'lorem_ipsum.md', 'youtube_transcript.md']
+LIMITS = [int(limit) for limit in os.getenv('BENCHMARK_LIMITS', '250,1000,2500').split(',')]
+SYNTHETIC_MB = [int(size) for size in os.getenv('BENCHMARK_SYNTHETIC_MB', '10,100').split(',') if size]
+# TextSplitter re-encodes the rest of the text for every chunk, larger synthetic inputs are skipped for it
+LEGACY_MAX_MB = int(os.getenv('BENCHMARK_LEGACY_MAX_MB', '1'))
+TIMEOUT = float(os.getenv('BENCHMARK_TIMEOUT', '900'))
+OUTPUT = os.getenv('BENCHMARK_OUTPUT', os.path.join(DIRECTORY, 'benchmark_results.jsonl'))
+MODEL_NAME = 'gpt-4'
+
+class CountingEncoding:
+    """Proxy around a tiktoken encoding that counts encode calls"""
+
+    COUNTED = ('encode', 'encode_ordinary', 'encode_batch', 'encode_ordinary_batch')
+
+    def __init__(self, encoding: Any):
+        self._encoding = encoding
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._encoding, name)
+        if name not in self.COUNTED:
+            return attribute
+
+        def counted(*args, **kwargs):
+            with self._lock:
+                self.calls += 1
+            return attribute(*args, **kwargs)
+        return counted
+
+def load_text(source: str) -> str:
+    """Read a bundled corpus file or build a synthetic input of the given size in MB"""
+    if source.endswith('.md'):
+        with open(os.path.join(DIRECTORY, source), 'r', encoding='utf-8') as f:
+            return f.read()
+
+    size = int(source.rstrip('MB')) * 1024 * 1024
+    corpus = [load_text(file_name) for file_name in CORPUS_FILES]
+    parts = []
+    length = 0
+    for copy in itertools.count():
+        for file_name, text in zip(CORPUS_FILES, corpus):
+            part = f"# Copy {copy} of {file_name}\n\n{text}\n\n"
+            parts.append(part)
+            length += len(part.encode('utf-8'))
+            if length >= size:
+                return ''.join(parts)
+
+def chunk_distribution(sizes: List[int]) -> Dict[str, Any]:
+    """Summary of chunk sizes in tokens"""
+    ordered = sorted(sizes)
+    def percentile(fraction: float) -> int:
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+    return {
+        'chunks': len(ordered),
+        'tokens': sum(ordered),
+        'min': ordered[0],
+        'p10': percentile(0.1),
+        'p50': percentile(0.5),
+        'p90': percentile(0.9),
+        'max': ordered[-1],
+        'mean': round(sum(ordered) / len(ordered), 2)
+    }
+
+async def run_splitter(target: str, text: str, limit: Optional[int]) -> tuple[List[int], int, float]:
+    """Run one target on a text, returning chunk sizes, encode calls and wall time"""
+    if target == 'TextSplitter.split':
+        from text_splitter import TextSplitter
+        splitter = TextSplitter(MODEL_NAME)
+        await splitter._initialize_tokenizer()
+        splitter.tokenizer = CountingEncoding(splitter.tokenizer)
+        start = time.perf_counter()
+        docs = await splitter.split(text, limit)
+        elapsed = time.perf_counter() - start
+        return [doc.metadata.tokens for doc in docs], splitter.tokenizer.calls, elapsed
+
+    sys.path.insert(0, DOCS_DIRECTORY)
+    from text_service import TextService
+    service = TextService(MODEL_NAME)
+    service._initialize_tokenizer()
+    service.tokenizer = CountingEncoding(service.tokenizer)
+    start = time.perf_counter()
+    try:
+        if target == 'TextService.split':
+            docs = await service.split(text, limit)
+        else:
+            docs = [await service.document(text)]
+        elapsed = time.perf_counter() - start
+    finally:
+        service.close()
+    return [doc.metadata['tokens'] for doc in docs], service.tokenizer.calls, elapsed
+
+def run_case(target: str, source: str, limit: Optional[int]) -> Dict[str, Any]:
+    """Run one case and measure it, called inside the per-case process"""
+    text = load_text(source)
+    # The splitters log every chunk, which would dominate the timings
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        sizes, encode_calls, elapsed = asyncio.run(run_splitter(target, text, limit))
+    return {
+        'seconds': round(elapsed, 4),
+        'encode_calls': encode_calls,
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'input_bytes': len(text.encode('utf-8')),
+        'chunk_sizes': chunk_distribution(sizes)
+    }
+
+def run_case_in_process(connection: Connection, target: str, source: str, limit: Optional[int]) -> None:
+    """Entry point of the per-case process, sends the result or the error back to main"""
+    try:
+        connection.send(('ok', run_case(target, source, limit)))
+    except Exception as error:
+        connection.send(('error', repr(error)))
+    finally:
+        connection.close()
+
+def cases() -> List[tuple[str, str, Optional[int]]]:
+    """Every target on every bundled corpus and synthetic size"""
+    sources = CORPUS_FILES + [f'{size}MB' for size in SYNTHETIC_MB]
+    result = []
+    for source in sources:
+        for limit in LIMITS:
+            if source in CORPUS_FILES or int(source.rstrip('MB')) <= LEGACY_MAX_MB:
+                result.append(('TextSplitter.split', source, limit))
+            result.append(('TextService.split', source, limit))
+        result.append(('TextService.document', source, None))
+    return result
+
+def git_commit() -> Optional[str]:
+    """Commit of the working tree, so results can be compared across commits"""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=DIRECTORY, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main() -> None:
+    """Run all cases and append their results to OUTPUT"""
+    run = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count()
+    }
+    context = get_context('spawn')
+
+    with open(OUTPUT, 'a', encoding='utf-8') as output:
+        for target, source, limit in cases():
+            result = {**run, 'target': target, 'source': source, 'limit': limit}
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=run_case_in_process, args=(sender, target, source, limit))
+            process.start()
+            sender.close()
+            try:
+                if receiver.poll(TIMEOUT):
+                    status, value = receiver.recv()
+                    if status == 'ok':
+                        result.update(status='ok', **value)
+                    else:
+                        result.update(status='error', error=value)
+                else:
+                    result['status'] = 'timeout'
+            except EOFError:
+                # The process exited without sending anything, e.g. killed for running out of memory
+                result['status'] = 'crashed'
+            finally:
+                receiver.close()
+                if process.is_alive():
+                    process.terminate()
+                process.join()
+            if result['status'] == 'crashed':
+                result['exitcode'] = process.exitcode
+
+            output.write(json.dumps(result) + '\n')
+            output.flush()
+            summary = f"{result['seconds']:.3f}s, {result['encode_calls']} encode calls, {result['peak_rss_mb']} MB" if result['status'] == 'ok' else result['status']
+            print(f"{target:<22} {source:<22} {str(limit):>5}  {summary}")
+
+    print(f"Results appended to {OUTPUT}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import io
+import os
+import re
+import asyncio
+import pytest
+from text_splitter import TextSplitter
+
+SAMPLE_FILES = ['example_article.md', 'lorem_ipsum.md', 'youtube_transcript.md']
+URL_PLACEHOLDER_PATTERN = re.compile(r'\{\{\$url(\d+)\}\}')
+IMAGE_PLACEHOLDER_PATTERN = re.compile(r'\{\{\$img(\d+)\}\}')
+
+def load_sample(file_name: str) -> str:
+    with open(os.path.join(os.path.dirname(__file__), file_name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+def restore(doc) -> str:
+    # Links around an image placeholder store that placeholder as their url, so urls go first
+    text = URL_PLACEHOLDER_PATTERN.sub(lambda match: doc.metadata.urls[int(match.group(1))], doc.text)
+    return IMAGE_PLACEHOLDER_PATTERN.sub(lambda match: doc.metadata.images[int(match.group(1))], text)
+
+@pytest.fixture
+def splitter():
+    splitter = TextSplitter()
+    try:
+        asyncio.run(splitter._initialize_tokenizer())
+    except Exception as e:
+        pytest.skip(f"Test skipped because the tokenizer could not be loaded: {str(e)}")
+    return splitter
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('file_name', SAMPLE_FILES)
+async def test_split_stream_matches_split_within_one_window(splitter, file_name):
+    text = load_sample(file_name)
+
+    docs = await splitter.split(text, 1000)
+    streamed = [doc async for doc in splitter.split_stream(io.BytesIO(text.encode('utf-8')), 1000, window_size=len(text) + 1)]
+
+    assert streamed == docs
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('file_name', SAMPLE_FILES)
+async def test_split_stream_keeps_text_and_limits_across_windows(splitter, file_name):
+    text = load_sample(file_name)
+
+    docs = await splitter.split(text, 1000)
+    streamed = [doc async for doc in splitter.split_stream(io.BytesIO(text.encode('utf-8')), 1000, window_size=16384)]
+
+    assert ''.join(restore(doc) for doc in streamed) == ''.join(restore(doc) for doc in docs) == text
+    assert all(doc.metadata.tokens <= 1000 for doc in streamed)
+
+if __name__ == "__main__":
+    pytest.main([__file__])
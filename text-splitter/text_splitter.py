@@ -1,7 +1,13 @@
+import sys
+from pathlib import Path
 import re
-from typing import Dict, List, Tuple
+import codecs
+import inspect
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from dataclasses import dataclass
-import tiktoken
+sys.path.append(str(Path(__file__).resolve().parents[1]))  # repository root with the shared package
+from shared.tokenizer_registry import get_tokenizer
+from shared.markdown_outline import MarkdownOutline, IMAGE_PATTERN, LINK_PATTERN
 
 @dataclass
 class IDoc:
@@ -17,6 +23,8 @@ class Metadata:
 
 Headers = Dict[str, List[str]]
 
+HEADER_PATTERN = re.compile(r'(^|\n)(#{1,6})\s+(.*)', re.MULTILINE)
+
 class TextSplitter:
     def __init__(self, model_name: str = 'gpt-4'):
         self.tokenizer = None
@@ -30,10 +38,7 @@ class TextSplitter:
     async def _initialize_tokenizer(self) -> None:
         """Get or create a tokenizer for the specified model"""
         if self.tokenizer is None:
-            try:
-                self.tokenizer = tiktoken.encoding_for_model(self.MODEL_NAME)
-            except KeyError:
-                raise KeyError(f"Tokenizer for model {self.MODEL_NAME} not found.")
+            self.tokenizer = get_tokenizer(self.MODEL_NAME)
     
     def _count_tokens(self, text: str) -> int:
         """Count the number of tokens in the given text"""
@@ -57,6 +62,7 @@ class TextSplitter:
         position = 0
         total_length = len(text)
         current_headers: Headers = {}
+        outline = self._create_outline(text)
         
         while position < total_length:
             print(f"Processing chunk starting at position: {position}")
@@ -64,20 +70,9 @@ class TextSplitter:
             tokens = self._count_tokens(chunk_text)
             print(f"Chunk tokens: {tokens}")
             
-            headers_in_chunk = self._extract_headers(chunk_text)
-            self._update_current_headers(current_headers, headers_in_chunk)
-            
-            content, urls, images = self._extract_urls_and_images(chunk_text)
-            
-            chunks.append(IDoc(
-                text=content,
-                metadata=Metadata(
-                    tokens=tokens,
-                    headers=current_headers.copy(),
-                    urls=urls,
-                    images=images
-                )
-            ))
+            chunk = self._create_chunk(chunk_text, tokens, current_headers, outline, position)
+            current_headers = chunk.metadata.headers
+            chunks.append(chunk)
             
             print(f"Chunk processed. New position: {chunk_end}")
             position = chunk_end
@@ -85,6 +80,89 @@ class TextSplitter:
         print(f"Split process completed. Total chunks: {len(chunks)}")
         return chunks
     
+    async def split_stream(self, source: Any, limit: int, window_size: Optional[int] = None) -> AsyncIterator[IDoc]:
+        """Split a text or binary file handle, aiofiles handle or mmap of a UTF-8 file
+        into chunks, yielding each chunk as soon as it is finalized.
+
+        The unfinished tail of every window is carried into the next one, but split()
+        estimates each chunk end from the token density of the whole remaining text
+        while split_stream only sees the window. Files that fit in one window are split
+        exactly like split(), longer ones may get other chunk boundaries within the
+        same token limit and with the same text, headers, urls and images overall."""
+        print(f"Starting streaming split process with limit: {limit} tokens")
+        await self._initialize_tokenizer()
+        
+        window_size = window_size or max(limit * 64, 65536)
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        current_headers: Headers = {}
+        buffer = ''
+        finished = False
+        total_chunks = 0
+        
+        while True:
+            while not finished and len(buffer) < window_size:
+                block = source.read(window_size)
+                if inspect.isawaitable(block):
+                    block = await block
+                if not block:
+                    finished = True
+                    buffer += decoder.decode(b'', final=True)
+                else:
+                    buffer += decoder.decode(block) if isinstance(block, (bytes, bytearray)) else block
+            
+            if not buffer:
+                break
+            
+            # Chunks are only finalized in the first half of the window, the rest is lookahead
+            stop = len(buffer) if finished else len(buffer) // 2
+            outline = self._create_outline(buffer)
+            position = 0
+            
+            while position < stop:
+                print(f"Processing chunk starting at position: {position}")
+                chunk_text, chunk_end = self._get_chunk(buffer, position, limit)
+                tokens = self._count_tokens(chunk_text)
+                print(f"Chunk tokens: {tokens}")
+                total_chunks += 1
+                chunk = self._create_chunk(chunk_text, tokens, current_headers, outline, position)
+                current_headers = chunk.metadata.headers
+                yield chunk
+                print(f"Chunk processed. New position: {chunk_end}")
+                position = chunk_end
+            
+            buffer = buffer[position:]
+        
+        print(f"Streaming split process completed. Total chunks: {total_chunks}")
+    
+    def _create_outline(self, text: str) -> MarkdownOutline:
+        """Index the headers, images and links of a text once for all its chunks"""
+        return MarkdownOutline(text, '{{$img{}}}', '{{$url{}}}', header_pattern=HEADER_PATTERN)
+    
+    def _create_chunk(self, chunk_text: str, tokens: int, current_headers: Headers, outline: Optional[MarkdownOutline] = None, start: int = 0) -> IDoc:
+        """Build a chunk document, chunks without headers inherit the header context of the chunk before them"""
+        end = start + len(chunk_text)
+        headers_in_chunk = outline.headers(start, end) if outline else None
+        if headers_in_chunk is None:
+            headers_in_chunk = self._extract_headers(chunk_text)
+        
+        # Every chunk gets its own copy, so later header updates never reach chunks already emitted
+        headers = {key: list(values) for key, values in current_headers.items()}
+        if headers_in_chunk:
+            self._update_current_headers(headers, headers_in_chunk)
+        
+        placeholders = outline.placeholders(start, end) if outline else None
+        content, urls, images = placeholders or self._extract_urls_and_images(chunk_text)
+        
+        return IDoc(
+            text=content,
+            metadata=Metadata(
+                tokens=tokens,
+                headers=headers,
+                urls=urls,
+                images=images
+            )
+        )
+    
     def _get_chunk(self, text: str, start: int, limit: int) -> Tuple[str, int]:
         """Extract a chunk of text starting from a position with token limit"""
         print(f"Getting chunk starting at {start} with limit {limit}")
@@ -158,9 +236,8 @@ class TextSplitter:
     def _extract_headers(self, text: str) -> Headers:
         """Extract markdown headers from text"""
         headers: Headers = {}
-        header_regex = re.compile(r'(^|\n)(#{1,6})\s+(.*)', re.MULTILINE)
         
-        for match in header_regex.finditer(text):
+        for match in HEADER_PATTERN.finditer(text):
             level = len(match.group(2))
             content = match.group(3).strip()
             key = f'h{level}'
@@ -211,8 +288,8 @@ class TextSplitter:
             return result
         
         # Process images first
-        content = re.sub(r'!\[([^\]]*)\]\(([^)]+)\)', replace_image, text)
+        content = IMAGE_PATTERN.sub(replace_image, text)
         # Then process URLs
-        content = re.sub(r'\[([^\]]+)\]\(([^)]+)\)', replace_url, content)
+        content = LINK_PATTERN.sub(replace_url, content)
         
         return content, urls, images
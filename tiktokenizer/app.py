@@ -1,7 +1,11 @@
+import sys
+from pathlib import Path
 from flask import Flask, request, jsonify
 import os
 from dotenv import load_dotenv
 from openai_service import OpenAIService
+sys.path.append(str(Path(__file__).resolve().parents[1]))  # repository root with the shared package
+from shared.tokenizer_registry import preload
 
 # Load environment variables
 load_dotenv()
@@ -12,6 +16,7 @@ port = 3000
 
 # Initialize OpenAI service
 openai_service = OpenAIService(api_key=os.getenv('OPENAI_API_KEY'))
+preload()
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
@@ -1,19 +1,23 @@
+import sys
 import os
-import json
 import asyncio
 from pathlib import Path
-from typing import List
+from typing import AsyncIterator
 
 from text_service import TextSplitter, IDoc
 from openai_service import OpenAIService
+sys.path.append(str(Path(__file__).resolve().parents[1]))  # repository root with the shared package
+from shared.tokenizer_registry import preload
+from shared.chunk_store import write_chunks
 
 # Initialize services
 splitter = TextSplitter()
 openai_service = OpenAIService()
+preload()
 
 # Constants
 SOURCE_FILE = 'source.md'
-OUTPUT_FILE = 'tools.json'
+OUTPUT_FILE = 'tools.jsonl'
 MAX_CHUNK_SIZE = 500
 
 async def main():
@@ -21,24 +25,21 @@ async def main():
     try:
         source_content = await load_source_file(os.path.dirname(__file__))
         extracted_tools = await extract_tools(source_content)
-        split_docs = await split_content(extracted_tools)
-        await save_output(split_docs)
-        print('Process completed successfully. Check tools.json for results.')
+        await save_output(split_content(extracted_tools))
+        print(f'Process completed successfully. Check {OUTPUT_FILE} for results.')
     except Exception as error:
         print(f'An error occurred: {error}')
 
-async def split_content(content: str) -> List[IDoc]:
-    """New splitContent function"""
+async def split_content(content: str) -> AsyncIterator[IDoc]:
+    """New splitContent function, yields each doc as soon as it is ready"""
     chunks = content.split('\n\n')
-    docs = []
     for chunk in chunks:
-        doc = await splitter.document(chunk)
-        docs.append(doc)
-    return docs
+        yield await splitter.document(chunk)
 
 # ALTERNATIVE SPLITTING
-# async def split_content(content: str) -> List[IDoc]:
-#     return await splitter.split(content, MAX_CHUNK_SIZE)
+# async def split_content(content: str) -> AsyncIterator[IDoc]:
+#     for doc in await splitter.split(content, MAX_CHUNK_SIZE):
+#         yield doc
 
 async def load_source_file(dirname: str) -> str:
     """Load the source file"""
@@ -61,10 +62,11 @@ Please extract all the information from the article's content related to tools,
     content = response.choices[0].message.content or ''
     return content
 
-async def save_output(docs: List[IDoc]):
-    """Save the output to a JSON file"""
+async def save_output(docs: AsyncIterator[IDoc]):
+    """Append each doc to a JSONL chunk store with an offsets sidecar as it arrives"""
     output_path = Path(__file__).parent / OUTPUT_FILE
-    output_path.write_text(json.dumps(docs, indent=2, ensure_ascii=False), encoding='utf-8')
+    count = await write_chunks(str(output_path), docs)
+    print(f'Saved {count} docs to {output_path}')
 
 # Run the main function
 if __name__ == '__main__':
@@ -1,32 +1,38 @@
+import sys
+from pathlib import Path
 import openai
 from typing import Dict, List, Any, Optional, Union, AsyncIterator
 import tiktoken
+sys.path.append(str(Path(__file__).resolve().parents[1]))  # repository root with the shared package
+from shared.tokenizer_registry import get_tokenizer
 import math
 
 class OpenAIService:
     def __init__(self):
         self.client = openai.AsyncOpenAI()
-        self.tokenizers: Dict[str, tiktoken.Encoding] = {}
         self.IM_START = "<|im_start|>"
         self.IM_END = "<|im_end|>"
         self.IM_SEP = "<|im_sep|>"
 
     def _get_tokenizer(self, model_name: str) -> tiktoken.Encoding:
         """Get or create tokenizer for the specified model"""
-        if model_name not in self.tokenizers:
-            try:
-                tokenizer = tiktoken.encoding_for_model(model_name)
-                self.tokenizers[model_name] = tokenizer
-            except KeyError:
-                # Fallback to cl100k_base for unknown models
-                tokenizer = tiktoken.get_encoding("cl100k_base")
-                self.tokenizers[model_name] = tokenizer
-        
-        return self.tokenizers[model_name]
+        return get_tokenizer(model_name)
 
     async def count_tokens(self, messages: List[Dict[str, Any]], model: str = 'gpt-4o') -> int:
         """Count tokens in chat completion messages using proper formatting"""
         tokenizer = self._get_tokenizer(model)
+        formatted_content = self._format_messages(messages)
+        tokens = tokenizer.encode(formatted_content)
+        return len(tokens)
+    
+    async def count_tokens_batch(self, message_lists: List[List[Dict[str, Any]]], model: str = 'gpt-4o') -> List[int]:
+        """Count the tokens of many message lists in one call, encoded on tiktoken's thread pool"""
+        tokenizer = self._get_tokenizer(model)
+        encoded = tokenizer.encode_batch([self._format_messages(messages) for messages in message_lists])
+        return [len(tokens) for tokens in encoded]
+    
+    def _format_messages(self, messages: List[Dict[str, Any]]) -> str:
+        """Format messages with the chat markup the model sees"""
         formatted_content = ''
         
         for message in messages:
@@ -42,8 +48,7 @@ class OpenAIService:
             formatted_content += f"{self.IM_START}{message['role']}{self.IM_SEP}{content}{self.IM_END}"
         
         formatted_content += f"{self.IM_START}assistant{self.IM_SEP}"
-        tokens = tokenizer.encode(formatted_content)
-        return len(tokens)
+        return formatted_content
 
     async def completion(
         self,
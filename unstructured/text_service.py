@@ -1,5 +1,9 @@
+import sys
+from pathlib import Path
 from typing import Dict, List, Optional, Any, TypedDict
 import tiktoken
+sys.path.append(str(Path(__file__).resolve().parents[1]))  # repository root with the shared package
+from shared.tokenizer_registry import get_tokenizer
 import re
 
 class IDoc(TypedDict):
@@ -27,7 +31,7 @@ class TextSplitter:
     def _initialize_tokenizer(self, model: Optional[str] = None) -> None:
         if not self.tokenizer or model != self.model_name:
             self.model_name = model or self.model_name
-            self.tokenizer = tiktoken.encoding_for_model(self.model_name)
+            self.tokenizer = get_tokenizer(self.model_name)
 
     def _count_tokens(self, text: str) -> int:
         if not self.tokenizer: